@@ -1,9 +1,14 @@
 import json
 import csv
+from urllib.parse import urljoin, urlsplit
 
 INPUT_FILE = "brookings_cdx_matches.txt"
 CSV_OUTPUT = "brookings_cdx_matches.csv"
 WORKING_SAMPLE_OUTPUT = "brookings_cdx_working_sample.csv"
+URL_MAP_OUTPUT = "brookings_url_digest_map.csv"  # Every sampled URL -> the digest it is fetched under
+UNRESOLVED_OUTPUT = "brookings_unresolved_redirects.csv"  # 301 rows whose target has no usable capture
+REDIRECT_LOOKUP_FILES = [INPUT_FILE]  # cdx lines searched for redirect targets (add more shards' matches here)
+MAX_REDIRECT_HOPS = 5
 
 def parse_line(line):
     # Each line: [SURT_URL] [timestamp] [JSON]
@@ -28,20 +33,157 @@ def get_all_json_fields(input_path):
                 fields.update(meta.keys())
     return sorted(fields)
 
+def is_sampled_200(row):
+    return row.get("status") == "200" and row.get("languages") == "eng"
+
+def surt_key(url):
+    """
+    Common Crawl style SURT key for a URL, e.g.
+    https://www.brookings.edu/articles/x/?b=2&a=1 -> edu,brookings)/articles/x?a=1&b=2
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parts.path.lower().rstrip("/") or ""
+    key = ",".join(reversed(host.split("."))) + ")" + (path or "/")
+    if parts.query:
+        key += "?" + "&".join(sorted(parts.query.lower().split("&")))
+    return key
+
+def load_captures(paths):
+    """Index the 200 and 3xx rows of cdx match files by SURT key, for redirect lookups."""
+    captures = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                parsed = parse_line(line)
+                if not parsed:
+                    continue
+                surt_url, timestamp, meta = parsed
+                status = str(meta.get("status", ""))
+                if status == "200" or status.startswith("3"):
+                    row = dict(meta, surt_url=surt_url, timestamp=timestamp)
+                    captures.setdefault(surt_url, []).append(row)
+    return captures
+
+def resolve_redirect(row, captures):
+    """
+    Follow a 301 row through the local cdx captures to a 200 capture.
+
+    Returns (200 row, None) or (None, reason). Only the index is consulted;
+    no redirect record is ever downloaded.
+    """
+    seen = set()
+    current = row
+    for _ in range(MAX_REDIRECT_HOPS):
+        location = current.get("redirect", "")
+        if not location:
+            return None, "no redirect target in index"
+        target = urljoin(current.get("url", ""), location)
+        key = surt_key(target)
+        if key in seen:
+            return None, "redirect loop"
+        seen.add(key)
+        candidates = captures.get(key, [])
+        ok = [c for c in candidates if c.get("status") == "200"]
+        if ok:
+            best = sorted(ok, key=capture_rank)[0]
+            if not is_sampled_200(best):
+                return None, f"target capture not sampled (languages={best.get('languages', '')})"
+            return best, None
+        redirects = [c for c in candidates if str(c.get("status", "")).startswith("3")]
+        if not redirects:
+            return None, f"target not in local index: {target}"
+        current = redirects[0]
+    return None, "too many redirects"
+
+def resolve_redirects(rows, captures):
+    """
+    Replace 301 rows by the 200 capture they point at.
+
+    Returns (rows, redirects, unresolved): rows has each resolvable 301
+    replaced in place by its target's row (dedupe_by_digest later drops it if
+    that digest is already queued); redirects is [(301 row, target row)];
+    unresolved is [(301 row, reason)].
+    """
+    out, redirects, unresolved = [], [], []
+    for row in rows:
+        if not str(row.get("status", "")).startswith("3"):
+            out.append(row)
+            continue
+        target, reason = resolve_redirect(row, captures)
+        if target is None:
+            unresolved.append((row, reason))
+            continue
+        target = {k: target.get(k, "") for k in row}
+        out.append(target)
+        redirects.append((row, target))
+    return out, redirects, unresolved
+
+def capture_rank(row):
+    """Sort key for picking the capture to fetch among rows with the same payload digest."""
+    url = row.get("url", "")
+    return (
+        row.get("status") != "200",
+        not url.startswith("https://"),
+        not url.split("?", 1)[0].endswith("/"),  # WordPress canonical URLs end in a slash
+        "?" in url,
+        len(url),
+        row.get("timestamp", ""),
+    )
+
+def dedupe_by_digest(rows):
+    """
+    Group 200 rows by payload digest and keep one canonical capture per digest.
+
+    Returns (work-list rows, URL map rows). Work-list rows keep the order in
+    which each digest first appeared (SURT order, so WARC locality is kept).
+    Any remaining redirect rows are passed through untouched: their digest is
+    that of the redirect body, which many unrelated URLs share.
+    """
+    groups = {}
+    order = []
+    for row in rows:
+        if row.get("status") == "200" and row.get("digest"):
+            if row["digest"] not in groups:
+                groups[row["digest"]] = []
+                order.append(("digest", row["digest"]))
+            groups[row["digest"]].append(row)
+        else:
+            order.append(("row", row))
+    work_list, url_map = [], []
+    for kind, value in order:
+        if kind == "row":
+            work_list.append(value)
+            continue
+        captures = sorted(groups[value], key=capture_rank)
+        work_list.append(captures[0])
+        # A resolved redirect can queue a capture that was also sampled itself.
+        unique = {(row["surt_url"], row["timestamp"], row.get("url", "")): row for row in reversed(captures)}
+        captures = sorted(unique.values(), key=capture_rank)
+        for i, row in enumerate(captures):
+            url_map.append({
+                "url": row.get("url", ""),
+                "surt_url": row["surt_url"],
+                "timestamp": row["timestamp"],
+                "digest": value,
+                "canonical": int(i == 0),
+                "redirects_to": "",
+            })
+    return work_list, url_map
+
 def main():
     json_fields = get_all_json_fields(INPUT_FILE)
     csv_fields = ["surt_url", "timestamp"] + json_fields
 
+    sample_rows = []
     with open(INPUT_FILE, "r", encoding="utf-8") as infile, \
-         open(CSV_OUTPUT, "w", newline="", encoding="utf-8") as csvfile, \
-         open(WORKING_SAMPLE_OUTPUT, "w", newline="", encoding="utf-8") as samplefile:
+         open(CSV_OUTPUT, "w", newline="", encoding="utf-8") as csvfile:
 
         writer = csv.DictWriter(csvfile, fieldnames=csv_fields)
         writer.writeheader()
 
-        sample_writer = csv.DictWriter(samplefile, fieldnames=csv_fields)
-        sample_writer.writeheader()
-
         for line in infile:
             parsed = parse_line(line)
             if not parsed:
@@ -59,10 +201,47 @@ def main():
             url = meta.get("url", "")
             languages = meta.get("languages", "")
             if (status == "200" and languages == "eng"):
-                sample_writer.writerow(row)
+                sample_rows.append(row)
             elif (status == "301" and languages == "eng" and url.startswith("https://www.brookings.edu/articles/")):
-                sample_writer.writerow(row)
+                sample_rows.append(row)
             # All others are excluded
 
+    # 301s are resolved against the index: fetch the page they point at (once),
+    # never the redirect record itself.
+    captures = load_captures(REDIRECT_LOOKUP_FILES)
+    sample_rows, redirects, unresolved = resolve_redirects(sample_rows, captures)
+
+    # One fetch per payload: URL variants (http/https, trailing slash, query
+    # strings) of the same page share a digest.
+    work_list, url_map = dedupe_by_digest(sample_rows)
+    for source, target in redirects:
+        url_map.append({
+            "url": source.get("url", ""),
+            "surt_url": source["surt_url"],
+            "timestamp": source["timestamp"],
+            "digest": target["digest"],
+            "canonical": 0,
+            "redirects_to": target.get("url", ""),
+        })
+    with open(WORKING_SAMPLE_OUTPUT, "w", newline="", encoding="utf-8") as samplefile:
+        sample_writer = csv.DictWriter(samplefile, fieldnames=csv_fields)
+        sample_writer.writeheader()
+        sample_writer.writerows(work_list)
+    with open(URL_MAP_OUTPUT, "w", newline="", encoding="utf-8") as mapfile:
+        map_writer = csv.DictWriter(
+            mapfile, fieldnames=["url", "surt_url", "timestamp", "digest", "canonical", "redirects_to"]
+        )
+        map_writer.writeheader()
+        map_writer.writerows(url_map)
+    with open(UNRESOLVED_OUTPUT, "w", newline="", encoding="utf-8") as unresolvedfile:
+        unresolved_writer = csv.writer(unresolvedfile)
+        unresolved_writer.writerow(["url", "timestamp", "redirect", "reason"])
+        for row, reason in unresolved:
+            unresolved_writer.writerow([row.get("url", ""), row["timestamp"], row.get("redirect", ""), reason])
+    print(f"Working sample: {len(work_list)} captures to fetch from {len(sample_rows)} sampled or redirect-target rows "
+          f"({len(sample_rows) - len(work_list)} duplicate payloads dropped); URL map in {URL_MAP_OUTPUT}")
+    print(f"Redirects: {len(redirects)} resolved to a 200 capture in the index, "
+          f"{len(unresolved)} unresolved (see {UNRESOLVED_OUTPUT})")
+
 if __name__ == "__main__":
     main()
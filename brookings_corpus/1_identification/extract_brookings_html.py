@@ -1,54 +1,60 @@
 import os
+import sys
 import csv
-import requests
+import argparse
 from warcio.archiveiterator import ArchiveIterator
 
-CC_INDEX_BASE = "https://data.commoncrawl.org/"
+# WARC byte-range access is shared with the extraction step
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "2_extraction"))
+from charset import decode_html
+from warc_payload import MAX_PAYLOAD_BYTES, PayloadTooLarge, iter_payload, record_content_type
+from warc_source import open_warc_source
 
-def download_warc_segment(warc_path, offset, length, local_path):
-    """Download a byte range from a WARC file."""
-    url = CC_INDEX_BASE + warc_path
-    headers = {"Range": f"bytes={offset}-{int(offset)+int(length)-1}"}
-    resp = requests.get(url, headers=headers, stream=True)
-    if resp.status_code not in (200, 206):
-        raise Exception(f"Failed to download WARC segment: {resp.status_code}")
-    with open(local_path, "wb") as f:
-        for chunk in resp.iter_content(chunk_size=8192):
-            f.write(chunk)
+WARC_SOURCE = "https"  # "https", "s3", s3://bucket/prefix, or a local mirror directory / file:// URL
 
-def extract_html_from_warc(warc_file, output_html):
-    """Extract HTML content from a WARC file segment."""
+def extract_html_from_warc(warc_file, output_html, charset_hint=None):
+    """Extract HTML content from a WARC file segment and save it as UTF-8."""
     with open(warc_file, "rb") as stream:
         for record in ArchiveIterator(stream):
             if record.rec_type == "response":
-                payload = record.content_stream().read()
-                # Try to decode as utf-8, fallback to latin1
                 try:
-                    html = payload.decode("utf-8")
-                except Exception:
-                    html = payload.decode("latin1", errors="replace")
+                    payload = b"".join(iter_payload(record, MAX_PAYLOAD_BYTES))
+                except PayloadTooLarge as e:
+                    print(f"Skipping {warc_file}: {e}")
+                    return False
+                # One decode, with the codec from the CDX charset, HTTP headers or <meta>
+                html, encoding = decode_html(payload, charset_hint, record_content_type(record))
+                print(f"  Encoding: {encoding}")
                 with open(output_html, "w", encoding="utf-8") as out:
                     out.write(html)
                 return True
     return False
 
 def main():
+    parser = argparse.ArgumentParser(description="Download and extract HTML for the sample metadata rows")
+    parser.add_argument("--source", default=WARC_SOURCE,
+                        help="WARC backend: https, s3, s3://bucket/prefix, or a local mirror path / file:// URL")
+    args = parser.parse_args()
+    source = open_warc_source(args.source)
+
     os.makedirs("brookings_corpus/sample_html", exist_ok=True)
     with open("brookings_corpus/raw/brookings_sample_metadata.csv", newline='', encoding="utf-8") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for i, row in enumerate(reader):
-            warc_path = row["filename"]
-            offset = row["offset"]
-            length = row["length"]
-            url = row["url"]
-            local_warc = f"brookings_corpus/sample_html/sample_{i+1}.warc.gz"
-            output_html = f"brookings_corpus/sample_html/sample_{i+1}.html"
-            print(f"Downloading WARC segment for: {url}")
-            download_warc_segment(warc_path, offset, length, local_warc)
-            print(f"Extracting HTML to: {output_html}")
-            success = extract_html_from_warc(local_warc, output_html)
-            if not success:
-                print(f"Failed to extract HTML for {url}")
+        rows = list(csv.DictReader(csvfile))
+    print(f"Downloading {len(rows)} WARC segments from {args.source}")
+    segments = source.read_ranges([(row["filename"], row["offset"], row["length"]) for row in rows])
+    for i, (row, segment) in enumerate(zip(rows, segments)):
+        url = row["url"]
+        if isinstance(segment, Exception):
+            print(f"Failed to download WARC segment for {url}: {segment}")
+            continue
+        local_warc = f"brookings_corpus/sample_html/sample_{i+1}.warc.gz"
+        output_html = f"brookings_corpus/sample_html/sample_{i+1}.html"
+        with open(local_warc, "wb") as f:
+            f.write(segment)
+        print(f"Extracting HTML to: {output_html}")
+        success = extract_html_from_warc(local_warc, output_html, row.get("charset"))
+        if not success:
+            print(f"Failed to extract HTML for {url}")
 
 if __name__ == "__main__":
     main()
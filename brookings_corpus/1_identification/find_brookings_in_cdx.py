@@ -1,12 +1,20 @@
 import os
+import sys
+import time
+import argparse
 import requests
 import gzip
 
+# Metrics are shared with the extraction step
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "2_extraction"))
+from metrics import METRICS, add_metrics_arguments, start_metrics_exporter
+
 CDX_WORK_DIR = "brookings_corpus/cdx_work"
 MATCHES_FILE = os.path.join(CDX_WORK_DIR, "brookings_cdx_matches.txt")
 BROOKINGS_SURT = "edu,brookings)/articles/"
 CDX_TARGET = "cdx-00173.gz"
 CDX_URL = f"https://data.commoncrawl.org/cc-index/collections/CC-MAIN-2025-18/indexes/{CDX_TARGET}"
+METRICS_EVERY = 100000  # Publish scan counters every this many lines
 
 def download_cdx_file():
     """Download the target cdx-*.gz file via HTTPS if not already present."""
@@ -21,22 +29,42 @@ def download_cdx_file():
         with open(local_path, "wb") as f:
             for chunk in r.iter_content(chunk_size=8192):
                 f.write(chunk)
+                METRICS.inc("cdx_download_bytes", len(chunk))
     return local_path
 
 def filter_brookings_in_cdx(local_path):
     """Decompress and filter for Brookings articles, saving to MATCHES_FILE."""
     matches = []
+    start = time.perf_counter()
+    lines = 0
     with gzip.open(local_path, "rt", encoding="utf-8", errors="replace") as f:
         for line in f:
             if line.startswith(BROOKINGS_SURT):
                 matches.append(line)
+            lines += 1
+            if lines == METRICS_EVERY:
+                METRICS.inc("cdx_lines_scanned", lines)
+                lines = 0
+    METRICS.inc("cdx_lines_scanned", lines)
+    METRICS.inc("cdx_matches", len(matches))
+    METRICS.inc("cdx_shards_scanned")
+    METRICS.inc("cdx_compressed_bytes_scanned", os.path.getsize(local_path))
+    METRICS.observe("cdx_shard_seconds", time.perf_counter() - start)
     with open(MATCHES_FILE, "w", encoding="utf-8") as out:
         out.writelines(matches)
     print(f"Saved {len(matches)} matches to {MATCHES_FILE}")
 
 def main():
-    local_path = download_cdx_file()
-    filter_brookings_in_cdx(local_path)
+    parser = argparse.ArgumentParser(description="Download one cdx shard and keep the Brookings article lines")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    exporter = start_metrics_exporter(args, job="find_brookings_in_cdx")
+    try:
+        local_path = download_cdx_file()
+        filter_brookings_in_cdx(local_path)
+    finally:
+        if exporter is not None:
+            exporter.stop()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,172 @@
+"""
+AIMD (additive-increase / multiplicative-decrease) concurrency control for
+Common Crawl requests.
+
+A fixed sleep between downloads is too slow when the endpoint is quiet and
+still triggers throttling when it is busy. AIMDController instead limits how
+many requests are in flight at once and tunes that limit from what it sees:
+
+- every healthy response raises the limit by roughly one per window of
+  requests (additive increase),
+- a throttling response (429/503, S3 SlowDown), a latency spike or a high
+  error rate cuts the limit by a constant factor (multiplicative decrease).
+
+Worker threads wrap each request in `controller.slot()`; the slot blocks while
+the limit is reached and reports the outcome when the request finishes.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from metrics import METRICS
+
+THROTTLE_STATUSES = (429, 503)
+
+
+class RequestOutcome:
+    """Filled in by the caller inside `slot()` to describe how a request went."""
+
+    def __init__(self):
+        self.status = None  # HTTP status code, None if the request raised
+        self.throttled = False  # set explicitly for non-HTTP throttle signals
+        self.cancelled = False  # abandoned by the caller (lost a hedge race); not counted
+
+
+class AIMDController:
+    """
+    Adaptive limit on in-flight requests to one endpoint.
+
+    Args:
+        name (str): Endpoint label used in metric names (e.g. "https", "s3")
+        initial_limit (int): Starting concurrency
+        min_limit (int): Floor the limit never drops below
+        max_limit (int): Ceiling the limit never grows above
+        decrease_factor (float): Multiplier applied on congestion
+        latency_spike_factor (float): A request slower than this multiple of
+            the smoothed latency counts as congestion
+        error_window (int): Number of recent requests used for the error rate
+        max_error_rate (float): Error rate in the window that counts as congestion
+        metrics (Metrics, optional): Registry to publish gauges/counters to
+    """
+
+    def __init__(
+        self,
+        name,
+        initial_limit=1,
+        min_limit=1,
+        max_limit=16,
+        decrease_factor=0.5,
+        latency_spike_factor=3.0,
+        error_window=20,
+        max_error_rate=0.2,
+        metrics=None,
+    ):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_spike_factor = latency_spike_factor
+        self.max_error_rate = max_error_rate
+        self.metrics = metrics or METRICS
+
+        self._limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self._in_flight = 0
+        self._latency_ewma = None
+        self._recent_errors = deque(maxlen=error_window)
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._publish()
+
+    @property
+    def limit(self):
+        """Current whole-number concurrency limit."""
+        with self._cond:
+            return int(self._limit)
+
+    @property
+    def in_flight(self):
+        with self._cond:
+            return self._in_flight
+
+    def acquire(self):
+        """Block until a request may start; return its start time."""
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+            self._publish()
+            return time.monotonic()
+
+    def release(self, started, outcome):
+        """Record the outcome of a request that started at `started`."""
+        latency = time.monotonic() - started
+        throttled = outcome.throttled or outcome.status in THROTTLE_STATUSES
+        failed = throttled or outcome.status is None or outcome.status >= 500
+
+        with self._cond:
+            self._in_flight -= 1
+            if outcome.cancelled:
+                self._publish()
+                self._cond.notify_all()
+                return
+            self._recent_errors.append(1 if failed else 0)
+
+            reason = None
+            if throttled:
+                reason = "throttled"
+            elif (
+                not failed
+                and self._latency_ewma is not None
+                and latency > self.latency_spike_factor * self._latency_ewma
+            ):
+                reason = "latency"
+            elif (
+                failed
+                and len(self._recent_errors) == self._recent_errors.maxlen
+                and sum(self._recent_errors) / len(self._recent_errors)
+                > self.max_error_rate
+            ):
+                reason = "errors"
+
+            if not failed:
+                if self._latency_ewma is None:
+                    self._latency_ewma = latency
+                else:
+                    self._latency_ewma = 0.9 * self._latency_ewma + 0.1 * latency
+
+            # Requests that were already in flight when we last backed off
+            # describe the old limit, so they must not trigger another cut.
+            if reason and started >= self._last_decrease:
+                self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+                self._last_decrease = time.monotonic()
+                self._recent_errors.clear()
+                self.metrics.inc(f"{self.name}_concurrency_decreases_{reason}")
+            elif reason is None and not failed:
+                self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+
+            if throttled:
+                self.metrics.inc(f"{self.name}_throttled_responses")
+            self._publish()
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """
+        Hold one unit of concurrency for the duration of a request.
+
+        Yields a RequestOutcome; set its `status` (and `throttled` if the
+        backend signals throttling some other way). An exception leaving the
+        block is recorded as a failed request and re-raised.
+        """
+        outcome = RequestOutcome()
+        started = self.acquire()
+        try:
+            yield outcome
+        finally:
+            self.release(started, outcome)
+
+    def _publish(self):
+        self.metrics.set_gauge(f"{self.name}_concurrency_limit", int(self._limit))
+        self.metrics.set_gauge(f"{self.name}_in_flight", self._in_flight)
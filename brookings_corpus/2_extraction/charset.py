@@ -0,0 +1,114 @@
+"""
+Pick the character encoding of an HTML payload without trial decodes.
+
+The codec is chosen once, from the cheapest reliable signal available:
+
+1. a byte-order mark at the start of the payload (unambiguous)
+2. the CDX row's `charset` field (Common Crawl's own detection)
+3. the charset parameter of the HTTP Content-Type header
+4. a <meta charset> / <meta http-equiv> declaration in the first SNIFF_BYTES
+5. DEFAULT_ENCODING
+
+and the payload is then decoded exactly once with that codec (undecodable
+bytes become U+FFFD instead of failing the page). Pages are stored as UTF-8
+whatever they were served in; the detected encoding is kept alongside.
+"""
+
+import codecs
+import re
+
+SNIFF_BYTES = 4096  # The HTML spec's prescan looks at the first 1024; pages with long <head> scripts need more
+DEFAULT_ENCODING = "utf-8"
+
+BOMS = [
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+# Browsers decode these labels as windows-1252 (WHATWG Encoding Standard);
+# pages that say latin-1 routinely contain 0x80-0x9F punctuation.
+WINDOWS_1252_ALIASES = {"ascii", "latin-1", "iso8859-1"}
+
+CONTENT_TYPE_CHARSET_RE = re.compile(r"""charset\s*=\s*["']?([\w.:-]+)""", re.IGNORECASE)
+META_CHARSET_RE = re.compile(
+    rb"""<meta[^>]+?charset\s*=\s*["']?\s*([\w.:-]+)""",
+    re.IGNORECASE,
+)
+
+
+def normalize_encoding(label):
+    """Return Python's codec name for an encoding label, or None if it is unknown."""
+    if not label:
+        return None
+    try:
+        name = codecs.lookup(label.strip().strip("\"'")).name
+    except LookupError:
+        return None
+    return "cp1252" if name in WINDOWS_1252_ALIASES else name
+
+
+def header_charset(content_type):
+    """Encoding named by a Content-Type header value, or None."""
+    match = CONTENT_TYPE_CHARSET_RE.search(content_type or "")
+    return normalize_encoding(match.group(1)) if match else None
+
+
+def sniff_charset(head):
+    """Encoding declared by a <meta> tag in the first SNIFF_BYTES of the payload, or None."""
+    match = META_CHARSET_RE.search(head[:SNIFF_BYTES])
+    if not match:
+        return None
+    encoding = normalize_encoding(match.group(1).decode("ascii", "ignore"))
+    # A page that declares UTF-16 in ASCII-compatible bytes is not UTF-16.
+    return "utf-8" if encoding and encoding.startswith("utf-16") else encoding
+
+
+def detect_encoding(head, charset_hint=None, content_type=None):
+    """
+    Choose the codec for a payload from its first bytes and the available hints.
+
+    Args:
+        head (bytes): Start of the payload (at least SNIFF_BYTES if available)
+        charset_hint (str, optional): CDX `charset` field
+        content_type (str, optional): HTTP Content-Type header value
+
+    Returns:
+        tuple: (encoding, source) where source is "bom", "cdx", "http",
+        "meta" or "default"
+    """
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding, "bom"
+    for encoding, source in (
+        (normalize_encoding(charset_hint), "cdx"),
+        (header_charset(content_type), "http"),
+    ):
+        if encoding:
+            return encoding, source
+    encoding = sniff_charset(head)
+    if encoding:
+        return encoding, "meta"
+    return DEFAULT_ENCODING, "default"
+
+
+def _decoder_codec(encoding):
+    # utf-8-sig drops a leading BOM and is otherwise identical to utf-8.
+    return "utf-8-sig" if encoding == "utf-8" else encoding
+
+
+def decode_html(payload, charset_hint=None, content_type=None):
+    """Decode a whole payload once; return (text, encoding)."""
+    encoding, _ = detect_encoding(payload[:SNIFF_BYTES], charset_hint, content_type)
+    return payload.decode(_decoder_codec(encoding), errors="replace"), encoding
+
+
+def iter_utf8(chunks, encoding):
+    """Re-encode a stream of byte chunks from `encoding` to UTF-8, one pass, chunk by chunk."""
+    decoder = codecs.getincrementaldecoder(_decoder_codec(encoding))(errors="replace")
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text.encode("utf-8")
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text.encode("utf-8")
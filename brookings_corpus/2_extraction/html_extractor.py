@@ -1,95 +1,344 @@
+import argparse
 import csv
 import os
 import time
-import requests
-from warcio.archiveiterator import ArchiveIterator
+from concurrent.futures import ProcessPoolExecutor
+
+from adaptive_concurrency import AIMDController
+from journal import RunJournal
+from metrics import METRICS, add_metrics_arguments, start_metrics_exporter
+from pipeline import Pipeline, Stage
+from scheduling import HedgePolicy, locality_order
+from warc_payload import PayloadTooLarge, normalize_digest, read_html_payload, write_html_payload
+from warc_source import open_warc_source
 
 # ========== USER CONFIGURATION ==========
 INPUT_CSV = "brookings_cdx_working_sample_truncated.csv"  # Replace with your chunked CSV filename
 HTML_OUT_DIR = "html_raw"
-TEMP_WARC = "temp_downloaded.warc.gz"
 LOG_CSV = "log_batch.csv"
-THROTTLE_SECONDS = 10  # Change this to increase/decrease wait time between downloads
+JOURNAL = "extraction_journal.jsonl"  # Per-record timings, appended by every run (read by plan.py)
+WARC_SOURCE = "https"  # "https", "s3", s3://bucket/prefix, or a local mirror directory / file:// URL
+INITIAL_CONCURRENCY = 1  # Requests in flight at start; adapts up/down from here
+MAX_CONCURRENCY = 8  # Ceiling for the adaptive limit (also the worker thread count)
+MAX_RETRIES = 3  # Attempts per record when the server throttles (429/503) or the connection drops
+DECODE_PROCESSES = max(1, (os.cpu_count() or 2) - 1)  # Worker processes decoding WARC records (0 = decode on threads)
+DECODE_BATCH_SIZE = 8  # Most records sent to a decode process in one round trip
+WRITE_BATCH_SIZE = 32  # Pages the writer saves per batch
+REPORT_INTERVAL = 10  # Seconds between pipeline status lines
+MAX_PAYLOAD_BYTES = 10 * 1024 * 1024  # Larger decompressed pages are dropped, never held in memory
+HEDGE_BUDGET = 0.05  # Extra requests allowed for hedging slow fetches (0.05 = 5%; 0 disables)
 # ========================================
 
 def ensure_dir(path):
     if not os.path.exists(path):
         os.makedirs(path)
 
-def download_warc_segment(filename, offset, length, out_path):
-    url = f"https://data.commoncrawl.org/{filename}"
-    headers = {"Range": f"bytes={offset}-{offset+length-1}"}
-    resp = requests.get(url, headers=headers, stream=True, timeout=120)
-    if resp.status_code == 206:
-        with open(out_path, "wb") as f:
-            for chunk in resp.iter_content(chunk_size=8192):
-                f.write(chunk)
-        return True
-    elif resp.status_code == 200:
-        # Sometimes the server ignores Range and returns the whole file
-        with open(out_path, "wb") as f:
-            for chunk in resp.iter_content(chunk_size=8192):
-                f.write(chunk)
-        return True
-    else:
-        return False
-
-def extract_html_from_warc(warc_path):
-    with open(warc_path, "rb") as stream:
-        for record in ArchiveIterator(stream):
-            if record.rec_type == "response":
-                http_headers = record.http_headers
-                content_type = http_headers.get_header("Content-Type") if http_headers else ""
-                if content_type and "html" in content_type:
-                    raw_html = record.content_stream().read()
-                    return raw_html
-    return None
+def extract_html_from_warc(warc_bytes, max_bytes=MAX_PAYLOAD_BYTES):
+    """Return the HTML payload of a WARC record as bytes (None if there is none)."""
+    return read_html_payload(warc_bytes, max_bytes)
 
-def main():
-    ensure_dir(HTML_OUT_DIR)
-    log_rows = []
-    with open(INPUT_CSV, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            digest = row.get("digest") or row.get("content_digest") or row.get("CYR4R4W5TTM4LDGVRROZH2KV3X5XVDIN")
-            filename = row["filename"]
-            offset = int(row["offset"])
-            length = int(row["length"])
-            url = row.get("url", "")
-            html_out_path = os.path.join(HTML_OUT_DIR, f"{digest}.html")
-            if os.path.exists(html_out_path):
-                log_rows.append({"digest": digest, "url": url, "status": "skipped (already exists)"})
-                continue
-            print(f"Processing {digest} ...")
+def decode_batch(tasks):
+    """
+    Decode worker: stream each task's HTML payload to its .part file as UTF-8.
+
+    `tasks` is a list of (warc bytes, out path, max payload bytes, CDX
+    charset) tuples. Runs in a decode process, so it never raises: each task
+    gets back write_html_payload()'s page metadata (None if there was no
+    HTML) plus decode_seconds, or an `error` string. Only this metadata goes
+    back through the pool; the page itself is already on disk.
+    """
+    results = []
+    for warc_bytes, out_path, max_bytes, charset_hint in tasks:
+        start = time.perf_counter()
+        try:
+            info = write_html_payload(warc_bytes, out_path, max_bytes, charset_hint)
+            result = {"page": info}
+        except PayloadTooLarge as e:
+            result = {"error": str(e), "too_large": True}
+        except Exception as e:
+            result = {"error": f"error: {e}"}
+        result["decode_seconds"] = time.perf_counter() - start
+        results.append(result)
+    return results
+
+def row_digest(row):
+    return row.get("digest") or row.get("content_digest") or row.get("CYR4R4W5TTM4LDGVRROZH2KV3X5XVDIN")
+
+def fetch_record(item, source):
+    """Fetch stage: download the WARC record for one item (or mark it skipped/failed)."""
+    if "outcome" in item:
+        return item
+    row = item["row"]
+    digest = item["log"]["digest"]
+    item["path"] = os.path.join(item["out_dir"], f"{digest}.html")
+    if os.path.exists(item["path"]):
+        print(f"[{item['counter']}] Skipped {digest} (already exists)")
+        item["log"]["status"], item["outcome"] = "skipped (already exists)", "skipped"
+        return item
+    print(f"[{item['counter']}] Processing {digest} ...")
+    try:
+        item["warc"] = source.read_range(row["filename"], int(row["offset"]), int(row["length"]))
+        item["fetch_seconds"] = source.last_request_seconds()
+    except Exception as e:
+        print(f"  Download failed for {digest}: {e}")
+        item["log"]["status"], item["outcome"] = "download failed", "failed"
+    return item
+
+def decode_records(items, pool):
+    """
+    Decode stage: stream the HTML payloads of a batch of items into .part
+    files next to their outputs, as UTF-8, with one round trip to `pool`
+    (in this thread if None). Pages are never held in memory as a whole.
+    The payload's SHA-1, computed while it streams, must match the row's
+    digest, or the page is dropped (a wrong offset or corrupted segment).
+    """
+    todo = [item for item in items if "outcome" not in item]
+    if not todo:
+        return items
+    tasks = [
+        (item.pop("warc"), item["path"] + ".part", item["max_bytes"], item["row"].get("charset"))
+        for item in todo
+    ]
+    try:
+        results = decode_batch(tasks) if pool is None else pool.submit(decode_batch, tasks).result()
+    except Exception as e:
+        # The worker process died (e.g. out of memory); fail the whole batch.
+        results = [{"error": f"error: {e}"} for _ in todo]
+    for item, result in zip(todo, results):
+        digest = item["log"]["digest"]
+        if "decode_seconds" in result:
+            item["decode_seconds"] = result["decode_seconds"]
+        if "error" in result:
+            print(f"  {'Skipped' if result.get('too_large') else 'Error for'} {digest}: {result['error']}")
+            if result.get("too_large"):
+                METRICS.inc("extract_payload_too_large")
+            item["log"]["status"], item["outcome"] = result["error"], "failed"
+            continue
+        page = result["page"]
+        if page is None:
+            print(f"  No HTML found for {digest}")
+            item["log"]["status"], item["outcome"] = "no html found", "failed"
+            continue
+        item["page"] = page
+        item["log"]["encoding"] = page["encoding"]
+        expected = normalize_digest(digest)
+        if expected:
+            item["digest_ok"] = page["payload_digest"] == expected
+            METRICS.inc("extract_digest_verified" if item["digest_ok"] else "extract_digest_mismatch")
+            if not item["digest_ok"]:
+                print(f"  Digest mismatch for {digest}: payload is {page['payload_digest']}")
+                os.remove(item["path"] + ".part")
+                item["log"]["status"], item["outcome"] = "digest mismatch", "failed"
+    return items
+
+def fail_record(item, error):
+    """on_error hook for the fetch and decode stages: mark the item failed so the writer journals it."""
+    print(f"  Error for {item['log']['digest']}: {error}")
+    item.pop("warc", None)
+    item["log"]["status"], item["outcome"] = f"error: {error}", "failed"
+    return item
+
+def write_records(items, journal=None):
+    """Write stage: publish a batch of decoded pages under their final names and journal every item."""
+    for item in items:
+        if "outcome" not in item:
+            digest = item["log"]["digest"]
             try:
-                ok = download_warc_segment(filename, offset, length, TEMP_WARC)
-                if not ok:
-                    log_rows.append({"digest": digest, "url": url, "status": f"download failed"})
-                    print(f"Download failed for {digest}")
-                    continue
-                html = extract_html_from_warc(TEMP_WARC)
-                if html:
-                    with open(html_out_path, "wb") as out_f:
-                        out_f.write(html)
-                    log_rows.append({"digest": digest, "url": url, "status": "success"})
-                    print(f"Extracted HTML for {digest}")
-                else:
-                    log_rows.append({"digest": digest, "url": url, "status": "no html found"})
-                    print(f"No HTML found for {digest}")
+                # The rename makes the page appear complete or not at all, so a
+                # resumed run never mistakes a half-written file for a done one.
+                os.replace(item["path"] + ".part", item["path"])
+                METRICS.inc("extract_html_bytes", item["page"]["html_bytes"])
+                METRICS.inc(f"extract_encoding_{item['log']['encoding']}")
+                print(f"  Extracted HTML for {digest}")
+                item["log"]["status"], item["outcome"] = "success", "success"
             except Exception as e:
-                log_rows.append({"digest": digest, "url": url, "status": f"error: {e}"})
-                print(f"Error for {digest}: {e}")
-            finally:
-                if os.path.exists(TEMP_WARC):
-                    os.remove(TEMP_WARC)
-            time.sleep(THROTTLE_SECONDS)
-    # Write log
-    with open(LOG_CSV, "w", newline='', encoding='utf-8') as logf:
-        writer = csv.DictWriter(logf, fieldnames=["digest", "url", "status"])
+                print(f"  Error for {digest}: {e}")
+                item["log"]["status"], item["outcome"] = f"error: {e}", "failed"
+        METRICS.inc(f"extract_records_{item['outcome']}")
+        if "decode_seconds" in item:
+            METRICS.observe("extract_decode_seconds", item["decode_seconds"])
+        if journal is not None:
+            row = item["row"]
+            page = item.get("page") or {}
+            journal.record(
+                digest=item["log"]["digest"],
+                filename=row["filename"],
+                offset=int(row["offset"]),
+                length=int(row["length"]),
+                status=item["log"]["status"],
+                bytes=int(row["length"]) if "fetch_seconds" in item else 0,
+                html_bytes=page.get("html_bytes"),
+                encoding=page.get("encoding"),
+                content_type=page.get("content_type"),
+                http_status=page.get("http_status"),
+                payload_digest=page.get("payload_digest"),
+                digest_ok=item.get("digest_ok"),
+                fetch_seconds=round(item["fetch_seconds"], 4) if "fetch_seconds" in item else None,
+                decode_seconds=round(item["decode_seconds"], 4) if "decode_seconds" in item else None,
+            )
+    return items
+
+def work_items(rows, html_out_dir, max_bytes=MAX_PAYLOAD_BYTES):
+    """
+    Yield pipeline items for rows; a digest already queued in this run and
+    redirect (3xx) rows are marked skipped so they are never fetched.
+    """
+    queued = set()
+    for counter, row in enumerate(rows, start=1):
+        digest = row_digest(row)
+        item = {"counter": counter, "row": row, "out_dir": html_out_dir, "max_bytes": max_bytes,
+                "log": {"digest": digest, "url": row.get("url", ""), "status": "", "encoding": ""}}
+        if digest in queued:
+            print(f"[{counter}] Skipped {digest} (duplicate digest)")
+            item["log"]["status"], item["outcome"] = "skipped (duplicate digest)", "skipped"
+        elif str(row.get("status", "")).startswith("3"):
+            # Redirect records hold no article; brookings_cdx_to_csv.py resolves them.
+            print(f"[{counter}] Skipped {digest} (redirect)")
+            item["log"]["status"], item["outcome"] = "skipped (redirect)", "skipped"
+        else:
+            queued.add(digest)
+        yield item
+
+def schedule_items(items):
+    """
+    Fetch order: items that need no fetch first, then the rest by WARC
+    locality and size (scheduling.locality_order).
+    """
+    items = list(items)
+    done = [item for item in items if "outcome" in item]
+    todo = [item for item in items if "outcome" not in item]
+    order = locality_order([(item["row"]["filename"], item["row"]["offset"], item["row"]["length"]) for item in todo])
+    return done + [todo[i] for i in order]
+
+def run_extraction(rows, source, html_out_dir, max_workers, decode_processes=DECODE_PROCESSES,
+                   report_interval=REPORT_INTERVAL, journal_path=JOURNAL, max_payload_bytes=MAX_PAYLOAD_BYTES,
+                   decode_batch_size=DECODE_BATCH_SIZE):
+    """
+    Run rows through fetch -> decode -> write stages; return [(log entry, outcome)] in input order.
+
+    Fetching uses `max_workers` threads (the adaptive controller decides how
+    many requests are really in flight). Decoding uses `decode_processes`
+    worker processes, sized independently of the fetch side (0 decodes on
+    threads in this process). Each round trip hands a process up to
+    `decode_batch_size` records; it streams each page to disk in chunks,
+    dropping pages over `max_payload_bytes`, and returns only metadata. One
+    writer publishes finished pages in batches. Bounded queues between the
+    stages keep memory flat when one stage falls behind. Records are fetched
+    in locality/size order (schedule_items), not input order. Every record
+    is appended to the journal at `journal_path` (None to skip it). An
+    unexpected error while fetching or decoding a record marks it failed;
+    one in the writer stops the run and is raised.
+    """
+    ensure_dir(html_out_dir)
+    journal = None
+    if journal_path:
+        journal = RunJournal(journal_path, source=source.name, max_concurrency=max_workers,
+                             decode_processes=decode_processes)
+    items = schedule_items(work_items(rows, html_out_dir, max_payload_bytes))
+    pool = ProcessPoolExecutor(max_workers=decode_processes) if decode_processes > 0 else None
+    if decode_batch_size > 1:
+        decode = lambda items: decode_records(items, pool)
+    else:
+        decode = lambda item: decode_records([item], pool)[0]
+    pipeline = Pipeline([
+        Stage("fetch", lambda item: fetch_record(item, source), workers=max_workers, on_error=fail_record),
+        Stage("decode", decode, workers=max(1, decode_processes), batch_size=decode_batch_size,
+              on_error=fail_record),
+        # No on_error: if the journal or metrics fail, the run stops and the error is raised.
+        Stage("write", lambda items: write_records(items, journal), batch_size=WRITE_BATCH_SIZE),
+    ], report_interval=report_interval)
+    error = None
+    try:
+        done = pipeline.run(items)
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if journal is not None:
+            # Also on failure, so the records written so far get their run line.
+            journal.close(
+                status="completed" if error is None else "failed",
+                error=None if error is None else f"{type(error).__name__}: {error}",
+                requests=METRICS.get(f"{source.name}_requests"),
+                concurrency_limit=METRICS.get(f"{source.name}_concurrency_limit", None),
+                stages=pipeline.stats(),
+            )
+    pipeline.print_report()
+    done.sort(key=lambda item: item["counter"])
+    return [(item["log"], item["outcome"]) for item in done]
+
+def write_log(results, log_csv):
+    with open(log_csv, "w", newline='', encoding='utf-8') as logf:
+        writer = csv.DictWriter(logf, fieldnames=["digest", "url", "status", "encoding"])
         writer.writeheader()
-        for row in log_rows:
+        for row, _ in results:
             writer.writerow(row)
-    print(f"Batch complete. Log written to {LOG_CSV}")
+
+def print_summary(results, source):
+    outcomes = [outcome for _, outcome in results]
+    print("Summary:")
+    print(f"  Total processed: {len(results)}")
+    print(f"  Success: {outcomes.count('success')}")
+    print(f"  Skipped (already exists, duplicate digest or redirect): {outcomes.count('skipped')}")
+    print(f"  Failed: {outcomes.count('failed')}")
+    print(f"  Digests verified: {METRICS.get('extract_digest_verified')}, "
+          f"mismatched: {METRICS.get('extract_digest_mismatch')}")
+    if source.controller is not None:
+        name = source.controller.name
+        print(f"  Final concurrency limit: {METRICS.get(f'{name}_concurrency_limit')}")
+        print(f"  Throttled responses: {METRICS.get(f'{name}_throttled_responses')}")
+    print(f"  Connection errors: {METRICS.get(f'{source.name}_connection_errors')}, "
+          f"retries: {METRICS.get(f'{source.name}_retries')}")
+    if source.hedge is not None:
+        print(f"  Hedged requests: {source.hedge.hedges} of {source.hedge.requests} "
+              f"(won {METRICS.get(f'{source.name}_hedge_wins')})")
+    ignored = METRICS.get(f'{source.name}_range_ignored') + METRICS.get(f'{source.name}_range_mismatch')
+    if ignored:
+        print(f"  Responses that ignored Range: {ignored} "
+              f"(salvaged {METRICS.get(f'{source.name}_range_salvaged')}, "
+              f"aborted {METRICS.get(f'{source.name}_range_aborted')}, "
+              f"{METRICS.get(f'{source.name}_range_discarded_bytes') / 1e6:.1f} MB discarded)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract raw HTML for CDX rows from Common Crawl WARC files")
+    parser.add_argument("--input", default=INPUT_CSV, help="CSV with filename, offset, length, digest, url")
+    parser.add_argument("--source", default=WARC_SOURCE,
+                        help="WARC backend: https, s3, s3://bucket/prefix, or a local mirror path / file:// URL")
+    parser.add_argument("--out-dir", default=HTML_OUT_DIR, help="Directory for {digest}.html files")
+    parser.add_argument("--log", default=LOG_CSV, help="Batch log CSV")
+    parser.add_argument("--journal", default=JOURNAL, help="Run journal (JSON lines) to append to")
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY,
+                        help="Ceiling for the adaptive concurrency limit")
+    parser.add_argument("--max-payload-bytes", type=int, default=MAX_PAYLOAD_BYTES,
+                        help="Drop pages whose decompressed HTML is larger than this")
+    parser.add_argument("--decode-processes", type=int, default=DECODE_PROCESSES,
+                        help="Worker processes for WARC decoding (0 = decode on threads)")
+    parser.add_argument("--decode-batch-size", type=int, default=DECODE_BATCH_SIZE,
+                        help="Most records sent to a decode process per round trip")
+    parser.add_argument("--hedge-budget", type=float, default=HEDGE_BUDGET,
+                        help="Share of extra requests allowed for hedging fetches slower than p95 (0 disables)")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    exporter = start_metrics_exporter(args, job="html_extractor")
+
+    source = open_warc_source(args.source, max_retries=MAX_RETRIES, max_concurrency=args.max_concurrency)
+    source.controller = AIMDController(
+        source.name, initial_limit=INITIAL_CONCURRENCY, max_limit=args.max_concurrency
+    )
+    source.hedge = HedgePolicy(source.name, budget=args.hedge_budget, max_workers=2 * args.max_concurrency)
+    with open(args.input, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    results = run_extraction(rows, source, args.out_dir, args.max_concurrency, args.decode_processes,
+                             journal_path=args.journal, max_payload_bytes=args.max_payload_bytes,
+                             decode_batch_size=args.decode_batch_size)
+    write_log(results, args.log)
+    print(f"Batch complete. Log written to {args.log}")
+    print_summary(results, source)
+    source.hedge.shutdown()
+    if exporter is not None:
+        exporter.stop()
 
 if __name__ == "__main__":
     main()
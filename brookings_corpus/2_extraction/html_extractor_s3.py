@@ -1,4 +1,6 @@
+import argparse
 import csv
+import importlib.util
 import os
 import sys
 
@@ -8,31 +10,33 @@ try:
 except ImportError:
     print("ERROR: The 'boto3' package is not installed. Please run: pip3 install boto3")
     sys.exit(1)
-try:
-    from warcio.archiveiterator import ArchiveIterator
-except ImportError:
+# warcio is used through warc_payload
+if importlib.util.find_spec("warcio") is None:
     print(
         "ERROR: The 'warcio' package is not installed. Please run: pip3 install warcio"
     )
     sys.exit(1)
 
+from adaptive_concurrency import AIMDController
+from html_extractor import ensure_dir, print_summary, run_extraction, write_log
+from metrics import add_metrics_arguments, start_metrics_exporter
+from scheduling import HedgePolicy
+from warc_source import open_warc_source
+
 # ========== USER CONFIGURATION ==========
 INPUT_CSV = "brookings_cdx_working_sample.csv"  # Your input CSV
 HTML_OUT_DIR = "html_raw"
-TEMP_WARC = "temp_downloaded.warc.gz"
 LOG_CSV = "log_batch.csv"
 COMMONCRAWL_BUCKET = "commoncrawl"
+INITIAL_CONCURRENCY = 4  # Requests in flight at start; adapts up/down from here
+MAX_CONCURRENCY = 64  # Ceiling for the adaptive limit (also the worker thread count)
+MAX_RETRIES = 3  # Attempts per record when S3 throttles (SlowDown/503) or the connection drops
+DECODE_PROCESSES = max(1, (os.cpu_count() or 2) - 1)  # Leave a core for the fetch threads
+HEDGE_BUDGET = 0.05  # Extra requests allowed for duplicating S3 reads slower than p95 (0 disables)
 # ========================================
 
 
-def ensure_dir(path):
-    if not os.path.exists(path):
-        os.makedirs(path)
-
-
 def check_aws_credentials():
-    import boto3
-
     session = boto3.Session()
     credentials = session.get_credentials()
     if not credentials or not credentials.access_key:
@@ -42,41 +46,19 @@ def check_aws_credentials():
         sys.exit(1)
 
 
-def download_warc_segment_s3(s3_client, filename, offset, length, out_path):
-    # Download a byte range from S3 and save to out_path
-    s3_key = filename
-    byte_range = f"bytes={offset}-{offset+length-1}"
-    try:
-        resp = s3_client.get_object(
-            Bucket=COMMONCRAWL_BUCKET, Key=s3_key, Range=byte_range
-        )
-        with open(out_path, "wb") as f:
-            for chunk in resp["Body"].iter_chunks(chunk_size=8192):
-                f.write(chunk)
-        return True
-    except Exception as e:
-        print(f"Error downloading {s3_key} [{byte_range}]: {e}")
-        return False
-
-
-def extract_html_from_warc(warc_path):
-    try:
-        with open(warc_path, "rb") as stream:
-            for record in ArchiveIterator(stream):
-                if record.rec_type == "response":
-                    http_headers = record.http_headers
-                    content_type = (
-                        http_headers.get_header("Content-Type") if http_headers else ""
-                    )
-                    if content_type and "html" in content_type:
-                        raw_html = record.content_stream().read()
-                        return raw_html
-    except Exception as e:
-        print(f"Error reading/parsing WARC file: {e}")
-    return None
-
-
 def main():
+    parser = argparse.ArgumentParser(
+        description="Extract raw HTML for CDX rows from Common Crawl via S3 (run on EC2 in us-east-1)"
+    )
+    parser.add_argument("--input", default=INPUT_CSV, help="Input CSV")
+    parser.add_argument(
+        "--source",
+        default=f"s3://{COMMONCRAWL_BUCKET}",
+        help="WARC backend (default: the Common Crawl bucket); see html_extractor.py",
+    )
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
     print("Brookings Common Crawl HTML Extraction")
     print("=====================================")
     print(
@@ -86,99 +68,41 @@ def main():
     input("Press Enter to continue...")
 
     ensure_dir(HTML_OUT_DIR)
-    check_aws_credentials()
-    log_rows = []
-    processed = 0
-    skipped = 0
-    failed = 0
-    success = 0
+    if args.source.startswith("s3"):
+        check_aws_credentials()
 
-    import boto3
-
-    s3_client = boto3.client("s3")
+    source = open_warc_source(
+        args.source, max_retries=MAX_RETRIES, max_concurrency=MAX_CONCURRENCY
+    )
+    source.controller = AIMDController(
+        source.name, initial_limit=INITIAL_CONCURRENCY, max_limit=MAX_CONCURRENCY
+    )
+    source.hedge = HedgePolicy(source.name, budget=HEDGE_BUDGET, max_workers=2 * MAX_CONCURRENCY)
     try:
-        with open(INPUT_CSV, newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                digest = (
-                    row.get("digest")
-                    or row.get("content_digest")
-                    or row.get("CYR4R4W5TTM4LDGVRROZH2KV3X5XVDIN")
-                )
-                filename = row["filename"]
-                offset = int(row["offset"])
-                length = int(row["length"])
-                url = row.get("url", "")
-                html_out_path = os.path.join(HTML_OUT_DIR, f"{digest}.html")
-                processed += 1
-                if os.path.exists(html_out_path):
-                    log_rows.append(
-                        {
-                            "digest": digest,
-                            "url": url,
-                            "status": "skipped (already exists)",
-                        }
-                    )
-                    skipped += 1
-                    print(f"[{processed}] Skipped {digest} (already exists)")
-                    continue
-                print(f"[{processed}] Processing {digest} ...")
-                try:
-                    ok = download_warc_segment_s3(
-                        s3_client, filename, offset, length, TEMP_WARC
-                    )
-                    if not ok:
-                        log_rows.append(
-                            {"digest": digest, "url": url, "status": f"download failed"}
-                        )
-                        failed += 1
-                        print(f"  Download failed for {digest}")
-                        continue
-                    html = extract_html_from_warc(TEMP_WARC)
-                    if html:
-                        with open(html_out_path, "wb") as out_f:
-                            out_f.write(html)
-                        log_rows.append(
-                            {"digest": digest, "url": url, "status": "success"}
-                        )
-                        success += 1
-                        print(f"  Extracted HTML for {digest}")
-                    else:
-                        log_rows.append(
-                            {"digest": digest, "url": url, "status": "no html found"}
-                        )
-                        failed += 1
-                        print(f"  No HTML found for {digest}")
-                except Exception as e:
-                    log_rows.append(
-                        {"digest": digest, "url": url, "status": f"error: {e}"}
-                    )
-                    failed += 1
-                    print(f"  Error for {digest}: {e}")
-                finally:
-                    if os.path.exists(TEMP_WARC):
-                        os.remove(TEMP_WARC)
+        with open(args.input, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
     except FileNotFoundError:
         print(
-            f"ERROR: Input CSV file '{INPUT_CSV}' not found. Please upload it to the instance."
+            f"ERROR: Input CSV file '{args.input}' not found. Please upload it to the instance."
         )
         sys.exit(1)
+
+    exporter = start_metrics_exporter(args, job="html_extractor_s3")
+    try:
+        results = run_extraction(
+            rows, source, HTML_OUT_DIR, MAX_CONCURRENCY, DECODE_PROCESSES
+        )
     except Exception as e:
         print(f"ERROR: {e}")
         sys.exit(1)
+    finally:
+        if exporter is not None:
+            exporter.stop()
 
-    # Write log
-    with open(LOG_CSV, "w", newline="", encoding="utf-8") as logf:
-        writer = csv.DictWriter(logf, fieldnames=["digest", "url", "status"])
-        writer.writeheader()
-        for row in log_rows:
-            writer.writerow(row)
+    write_log(results, LOG_CSV)
     print("\nBatch complete. Log written to", LOG_CSV)
-    print("Summary:")
-    print(f"  Total processed: {processed}")
-    print(f"  Success: {success}")
-    print(f"  Skipped (already exists): {skipped}")
-    print(f"  Failed: {failed}")
+    print_summary(results, source)
+    source.hedge.shutdown()
     print("All HTML files are in:", os.path.abspath(HTML_OUT_DIR))
 
 
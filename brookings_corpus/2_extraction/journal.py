@@ -0,0 +1,84 @@
+"""
+Append-only JSON-lines journal of extraction runs.
+
+Every run appends one line per record (what was fetched, how long it took,
+how it ended) followed by one summary line for the run. Runs accumulate in
+the same file, so later tools (plan.py) can learn request latency and
+throughput from real history.
+
+Record line:
+    {"type": "record", "run": ..., "digest": ..., "filename": ..., "offset": ...,
+     "length": ..., "status": ..., "bytes": ..., "html_bytes": ...,
+     "encoding": ..., "content_type": ..., "http_status": ...,
+     "payload_digest": ..., "digest_ok": ...,
+     "fetch_seconds": ..., "decode_seconds": ..., "time": ...}
+
+Run line:
+    {"type": "run", "run": ..., "source": ..., "max_concurrency": ...,
+     "started": ..., "seconds": ..., "records": ..., "bytes": ...,
+     "status": "completed" or "failed", "error": ..., ...}
+
+A run that fails still gets its run line, with the error that stopped it.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class RunJournal:
+    """
+    Writes one run's lines to a journal file, safe to call from worker threads.
+
+    Args:
+        path (str): Journal file (created if missing, appended to otherwise)
+        **run_info: Extra fields stored on the run summary line
+    """
+
+    def __init__(self, path, **run_info):
+        self.path = path
+        self.run_id = time.strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}"
+        self.run_info = run_info
+        self.started = time.time()
+        self.records = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def record(self, **fields):
+        line = {"type": "record", "run": self.run_id, "time": round(time.time(), 3), **fields}
+        with self._lock:
+            self.records += 1
+            self.bytes += int(fields.get("bytes") or 0)
+            self._file.write(json.dumps(line) + "\n")
+
+    def close(self, **summary):
+        """Write the run summary line and close the file."""
+        line = {
+            "type": "run",
+            "run": self.run_id,
+            "started": round(self.started, 3),
+            "seconds": round(time.time() - self.started, 3),
+            "records": self.records,
+            "bytes": self.bytes,
+            **self.run_info,
+            **summary,
+        }
+        with self._lock:
+            self._file.write(json.dumps(line) + "\n")
+            self._file.close()
+
+
+def read_journals(paths):
+    """Return (record lines, run lines) from one or more journal files."""
+    records, runs = [], []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # A run killed mid-write leaves a partial last line
+                (runs if entry.get("type") == "run" else records).append(entry)
+    return records, runs
@@ -0,0 +1,282 @@
+"""
+Small thread-safe metrics registry shared by the extraction scripts.
+
+Counters only go up (records fetched, throttled responses, ...), gauges hold
+the latest value of something that moves (current concurrency limit, requests
+in flight), histograms count observations (fetch latency, ...) into fixed
+buckets. Scripts use the module-level METRICS registry unless they are
+handed their own.
+
+MetricsExporter publishes a registry while a job runs:
+
+- Prometheus text format at http://127.0.0.1:PORT/metrics (JSON at /metrics.json)
+- a JSON line appended to a snapshot file every interval, with per-second
+  rates of every counter since the previous snapshot and the seconds since
+  any counter last moved (a stall shows up as that number growing)
+
+Scripts add the command-line flags with add_metrics_arguments(parser) and
+start the exporter with start_metrics_exporter(args).
+"""
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds; suits both local reads and cross-region requests.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRIC_PREFIX = "brookings_"
+SNAPSHOT_INTERVAL = 30  # Seconds between JSON snapshot lines
+
+
+class Histogram:
+    """Cumulative bucket counts plus count and sum, like a Prometheus histogram."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        cumulative, running = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            cumulative.append((bound, running))
+        return {"buckets": cumulative, "count": self.count, "sum": self.sum}
+
+
+class Metrics:
+    """Named counters, gauges and histograms, safe to update from worker threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1):
+        """Add value to counter name (created at zero on first use)."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        """Set gauge name to value."""
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS):
+        """Record value in histogram name (created with `buckets` on first use)."""
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(buckets)
+            histogram.observe(value)
+
+    def get(self, name, default=0):
+        """Return the current value of a counter or gauge."""
+        with self._lock:
+            if name in self.gauges:
+                return self.gauges[name]
+            return self.counters.get(name, default)
+
+    def merge(self, snapshot):
+        """
+        Add another registry's snapshot() into this one: counters and
+        histogram counts are summed, gauges take the other value. Used to
+        fold in metrics collected in worker processes.
+        """
+        with self._lock:
+            for name, value in snapshot["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            self.gauges.update(snapshot["gauges"])
+            for name, other in snapshot["histograms"].items():
+                bounds = [bound for bound, _ in other["buckets"]]
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = Histogram(bounds)
+                previous = 0
+                for i, (_, cumulative) in enumerate(other["buckets"]):
+                    histogram.counts[i] += cumulative - previous
+                    previous = cumulative
+                histogram.count += other["count"]
+                histogram.sum += other["sum"]
+
+    def snapshot(self):
+        """Return a plain-dict copy of all counters, gauges and histograms."""
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "histograms": {name: h.snapshot() for name, h in self.histograms.items()},
+            }
+
+
+def prometheus_name(name):
+    return METRIC_PREFIX + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def to_prometheus(snapshot):
+    """Render a Metrics.snapshot() in the Prometheus text exposition format."""
+    lines = []
+    for name, value in sorted(snapshot["counters"].items()):
+        metric = prometheus_name(name) + "_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    for name, value in sorted(snapshot["gauges"].items()):
+        if value is None:
+            continue
+        metric = prometheus_name(name)
+        lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+    for name, histogram in sorted(snapshot["histograms"].items()):
+        metric = prometheus_name(name)
+        lines.append(f"# TYPE {metric} histogram")
+        for bound, count in histogram["buckets"]:
+            lines.append(f'{metric}_bucket{{le="{bound}"}} {count}')
+        lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram["count"]}')
+        lines.append(f"{metric}_sum {histogram['sum']}")
+        lines.append(f"{metric}_count {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """
+    Serves a Metrics registry over HTTP and/or writes periodic JSON snapshots.
+
+    Args:
+        metrics (Metrics): Registry to publish
+        port (int, optional): Serve /metrics and /metrics.json on this port
+        host (str): Interface to bind (local only by default)
+        snapshot_path (str, optional): JSON-lines file to append snapshots to
+        interval (float): Seconds between snapshot lines
+        job (str): Name stored in each snapshot line
+    """
+
+    def __init__(self, metrics, port=None, host="127.0.0.1", snapshot_path=None,
+                 interval=SNAPSHOT_INTERVAL, job=""):
+        self.metrics = metrics
+        self.port = port
+        self.host = host
+        self.snapshot_path = snapshot_path
+        self.interval = interval
+        self.job = job
+        self.server = None
+        self._stopped = threading.Event()
+        self._thread = None
+        self._previous = None
+        self._last_change = time.time()
+
+    def start(self):
+        if self.port is not None:
+            exporter = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    snapshot = exporter.metrics.snapshot()
+                    if self.path.startswith("/metrics.json"):
+                        body = json.dumps(snapshot).encode()
+                        content_type = "application/json"
+                    elif self.path.startswith("/metrics"):
+                        body = to_prometheus(snapshot).encode()
+                        content_type = "text/plain; version=0.0.4"
+                    else:
+                        self.send_error(404)
+                        return
+                    self.send_response(200)
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+            self.server.daemon_threads = True
+            self.port = self.server.server_address[1]
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            print(f"Metrics at http://{self.host}:{self.port}/metrics")
+        if self.snapshot_path:
+            self._thread = threading.Thread(target=self._snapshot_loop, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and write a final snapshot line."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def snapshot(self):
+        """Registry snapshot plus counter rates since the previous call."""
+        now = time.time()
+        snapshot = self.metrics.snapshot()
+        rates = {}
+        if self._previous is not None:
+            then, counters = self._previous
+            elapsed = max(now - then, 1e-9)
+            rates = {
+                name: round((value - counters.get(name, 0)) / elapsed, 3)
+                for name, value in snapshot["counters"].items()
+            }
+            if any(rates.values()):
+                self._last_change = now
+        elif snapshot["counters"]:
+            self._last_change = now
+        self._previous = (now, snapshot["counters"])
+        for histogram in snapshot["histograms"].values():
+            del histogram["buckets"]
+            histogram["mean"] = histogram["sum"] / histogram["count"] if histogram["count"] else None
+        return {
+            "time": round(now, 3),
+            "job": self.job,
+            "seconds_since_progress": round(now - self._last_change, 1),
+            "rates": rates,
+            **snapshot,
+        }
+
+    def _snapshot_loop(self):
+        with open(self.snapshot_path, "a", encoding="utf-8") as f:
+            while True:
+                stopping = self._stopped.wait(self.interval)
+                f.write(json.dumps(self.snapshot()) + "\n")
+                f.flush()
+                if stopping:
+                    return
+
+
+def add_metrics_arguments(parser):
+    """Add --metrics-port, --metrics-snapshot and --metrics-interval to an argparse parser."""
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve live metrics in Prometheus format on this local port")
+    parser.add_argument("--metrics-snapshot", default=None,
+                        help="Append a JSON metrics snapshot to this file every --metrics-interval seconds")
+    parser.add_argument("--metrics-interval", type=float, default=SNAPSHOT_INTERVAL,
+                        help="Seconds between JSON metrics snapshots")
+
+
+def start_metrics_exporter(args, job="", metrics=None):
+    """Start a MetricsExporter from add_metrics_arguments() flags; returns None if none were given."""
+    if args.metrics_port is None and not args.metrics_snapshot:
+        return None
+    return MetricsExporter(
+        metrics or METRICS,
+        port=args.metrics_port,
+        snapshot_path=args.metrics_snapshot,
+        interval=args.metrics_interval,
+        job=job,
+    ).start()
+
+
+METRICS = Metrics()
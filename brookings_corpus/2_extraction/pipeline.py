@@ -0,0 +1,235 @@
+"""
+Staged pipeline with bounded queues between stages.
+
+Each Stage runs a pool of worker threads that take items from its own inbox
+queue and put results on the next stage's inbox. The queues are bounded, so
+a slow stage blocks the stages in front of it (backpressure) instead of
+letting finished work pile up in memory.
+
+For every stage the pipeline tracks:
+
+- queue depth: items waiting in the stage's inbox
+- utilization: share of worker time spent working (not waiting for input)
+- blocked: share of worker time spent waiting for room downstream
+
+The bottleneck is the stage with high utilization whose inbox is full while
+the stages after it sit idle. Both numbers are also published as METRICS
+gauges (pipeline_{stage}_queue_depth, pipeline_{stage}_utilization).
+"""
+
+import queue
+import threading
+import time
+
+from metrics import METRICS
+
+QUEUE_SIZE = 64  # Items buffered in front of each stage
+_DONE = object()  # End-of-input marker passed from stage to stage
+
+
+class Stage:
+    """
+    One pipeline stage.
+
+    Args:
+        name (str): Stage name used in reports and metric names
+        func (callable): Called as func(item) and returns the item to pass on.
+            With batch_size > 1 it is called as func(items) with a list of up
+            to batch_size items and returns a list. Expected failures should be
+            recorded on the item so later stages can pass it through.
+        workers (int): Worker threads
+        queue_size (int): Capacity of the stage's inbox
+        batch_size (int): Items handed to func per call
+        on_error (callable, optional): Called as on_error(item, exc) for each
+            item of a call to func that raised; returns the item to pass on.
+            Without it (or if it raises too) the stage records the error and
+            the pipeline stops: run() feeds no more items, every stage drops
+            what is still queued, and the error is raised once all stages
+            have shut down.
+    """
+
+    def __init__(self, name, func, workers=1, queue_size=QUEUE_SIZE, batch_size=1, on_error=None):
+        self.name = name
+        self.func = func
+        self.on_error = on_error
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.inbox = queue.Queue(maxsize=queue_size)
+        self.outbox = None
+        self.items = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.error = None
+        self._failed = None
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self, outbox, failed=None):
+        """Start the workers; `failed` is an Event set when any stage of the pipeline fails."""
+        self.outbox = outbox
+        self._failed = failed or threading.Event()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _next_batch(self):
+        """Block for one item, then take up to batch_size - 1 more without waiting."""
+        item = self.inbox.get()
+        if item is _DONE:
+            return None
+        batch = [item]
+        while len(batch) < self.batch_size:
+            try:
+                item = self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            if item is _DONE:
+                self.inbox.put(_DONE)
+                break
+            batch.append(item)
+        return batch
+
+    def _work(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                # Leave the marker for this stage's other workers.
+                self.inbox.put(_DONE)
+                return
+            if self._failed.is_set():
+                # Keep taking items so the stages in front never block on a full inbox.
+                continue
+            start = time.perf_counter()
+            try:
+                results = self._call(batch)
+            except Exception as e:
+                with self._lock:
+                    if self.error is None:
+                        self.error = e
+                self._failed.set()
+                continue
+            worked = time.perf_counter() - start
+            start = time.perf_counter()
+            for result in results:
+                self.outbox.put(result)
+            waited = time.perf_counter() - start
+            with self._lock:
+                self.items += len(batch)
+                self.busy += worked
+                self.blocked += waited
+
+    def _call(self, batch):
+        try:
+            if self.batch_size > 1:
+                return self.func(batch)
+            return [self.func(batch[0])]
+        except Exception as e:
+            if self.on_error is None:
+                raise
+            return [self.on_error(item, e) for item in batch]
+
+
+class Pipeline:
+    """
+    Runs items through a list of stages and collects what the last one returns.
+
+    Args:
+        stages (list): Stage objects, in order
+        report_interval (float, optional): Print a one-line status every this
+            many seconds while running
+    """
+
+    def __init__(self, stages, report_interval=None):
+        self.stages = stages
+        self.report_interval = report_interval
+        self.results = queue.Queue()
+        self._started = None
+        self._finished = None
+        self._stopped = threading.Event()
+        self._failed = threading.Event()
+
+    def run(self, items):
+        """
+        Feed `items` through every stage; return the last stage's outputs (unordered).
+        Raises the first error a stage recorded (see Stage's on_error) after shutdown.
+        """
+        self._started = time.perf_counter()
+        for stage, following in zip(self.stages, self.stages[1:] + [None]):
+            stage.start(following.inbox if following else self.results, self._failed)
+        monitor = threading.Thread(target=self._monitor, daemon=True)
+        monitor.start()
+        try:
+            for item in items:
+                if self._failed.is_set():
+                    break
+                self.stages[0].inbox.put(item)
+            # Close stages front to back: a stage is finished once all its
+            # workers have seen the marker, and only then can the next one be.
+            for stage in self.stages:
+                stage.inbox.put(_DONE)
+                stage.join()
+                stage.inbox.get_nowait()
+        finally:
+            self._finished = time.perf_counter()
+            self._stopped.set()
+            monitor.join()
+            self._publish()
+        for stage in self.stages:
+            if stage.error is not None:
+                raise stage.error
+        return list(self.results.queue)
+
+    def elapsed(self):
+        if self._started is None:
+            return 0.0
+        return (self._finished or time.perf_counter()) - self._started
+
+    def stats(self):
+        """Per-stage counters: items, queue depth, utilization and blocked share."""
+        elapsed = self.elapsed() or 1e-9
+        stats = []
+        for stage in self.stages:
+            with stage._lock:
+                capacity = stage.workers * elapsed
+                stats.append({
+                    "stage": stage.name,
+                    "workers": stage.workers,
+                    "items": stage.items,
+                    "queue_depth": stage.inbox.qsize(),
+                    "queue_size": stage.inbox.maxsize,
+                    "utilization": round(stage.busy / capacity, 3),
+                    "blocked": round(stage.blocked / capacity, 3),
+                })
+        return stats
+
+    def status_line(self):
+        return " | ".join(
+            f"{s['stage']} {s['items']} done, queue {s['queue_depth']}/{s['queue_size']}, "
+            f"busy {s['utilization']:.0%}"
+            for s in self.stats()
+        )
+
+    def print_report(self):
+        print(f"Pipeline stages ({self.elapsed():.1f}s):")
+        print(f"  {'stage':<8} {'workers':>7} {'items':>7} {'busy':>6} {'blocked':>8}")
+        for s in self.stats():
+            print(f"  {s['stage']:<8} {s['workers']:>7} {s['items']:>7} "
+                  f"{s['utilization']:>6.0%} {s['blocked']:>8.0%}")
+
+    def _publish(self):
+        for s in self.stats():
+            METRICS.set_gauge(f"pipeline_{s['stage']}_queue_depth", s["queue_depth"])
+            METRICS.set_gauge(f"pipeline_{s['stage']}_utilization", s["utilization"])
+
+    def _monitor(self):
+        last_report = time.perf_counter()
+        while not self._stopped.wait(1.0):
+            self._publish()
+            if self.report_interval and time.perf_counter() - last_report >= self.report_interval:
+                print(f"[pipeline {self.elapsed():.0f}s] {self.status_line()}")
+                last_report = time.perf_counter()
@@ -0,0 +1,227 @@
+"""
+Estimate what an extraction run will fetch and how long it will take, before running it.
+
+Reads a work-list CSV (filename, offset, length per row) and reports:
+
+- total bytes, rows and distinct WARC files
+- request count and bytes, with and without range coalescing
+  (warc_source.coalesce_ranges: neighbouring records in one request)
+- projected runtime at one or more concurrency levels
+
+The projection comes from previous runs' journals (html_extractor.py
+--journal). Per-request fetch latency is fitted as
+latency = setup + seconds_per_byte * length. The fetch stage then takes
+sum(latency) / concurrency (but no less than the slowest single request),
+and the decode stage takes records * decode time / decode processes, with
+the decode time taken from the decode stage's busy time in journalled runs. The slower of the two stages
+is the projected runtime. Real runs lose time to ramp-up, throttling and
+stragglers, so the projection is scaled by the median ratio of actual to
+modelled runtime over the journalled runs.
+
+Usage:
+    python plan.py --input brookings_cdx_working_sample.csv
+    python plan.py --input sample.csv --journal extraction_journal.jsonl --concurrency 16 32 64
+"""
+
+import argparse
+import csv
+import json
+import os
+import statistics
+
+from journal import read_journals
+from warc_source import COALESCE_MAX_GAP, COALESCE_MAX_SPAN, coalesce_ranges
+
+# ========== USER CONFIGURATION ==========
+INPUT_CSV = "brookings_cdx_working_sample.csv"
+JOURNAL = "extraction_journal.jsonl"  # Written by html_extractor.py
+CONCURRENCY_LEVELS = [8, 16, 32, 64]
+DECODE_PROCESSES = 2
+MIN_SIZE_SPREAD = 0.5  # Record sizes' std/mean needed to fit setup and transfer time separately
+# ========================================
+
+
+def format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.1f} {unit}" if unit != "B" else f"{n} B"
+        n /= 1024
+
+
+def format_seconds(seconds):
+    if seconds < 120:
+        return f"{seconds:.0f}s"
+    if seconds < 7200:
+        return f"{seconds / 60:.1f} min"
+    return f"{seconds / 3600:.1f} h"
+
+
+def plan_requests(rows, max_gap=COALESCE_MAX_GAP, max_span=COALESCE_MAX_SPAN):
+    """Return the fetch plan for work-list rows as a dict of counts and request sizes."""
+    ranges = [(row["filename"], int(row["offset"]), int(row["length"])) for row in rows]
+    spans = coalesce_ranges(ranges, max_gap, max_span)
+    return {
+        "rows": len(ranges),
+        "warc_files": len({filename for filename, _, _ in ranges}),
+        "bytes": sum(length for _, _, length in ranges),
+        "requests": len(ranges),
+        "request_sizes": [length for _, _, length in ranges],
+        "coalesced_requests": len(spans),
+        "coalesced_bytes": sum(length for _, _, length, _ in spans),
+        "coalesced_request_sizes": [length for _, _, length, _ in spans],
+    }
+
+
+def fit_latency(records):
+    """
+    Least-squares fit of fetch latency against record length.
+
+    Returns (setup seconds, seconds per byte), or None when the journal has
+    no fetched records. When record sizes are too uniform to separate setup
+    from transfer time (or the fit slopes the wrong way), all latency is
+    charged to transfer: that is the pessimistic choice for the large merged
+    requests of a coalesced plan.
+    """
+    points = [(r["length"], r["fetch_seconds"]) for r in records if r.get("fetch_seconds") is not None]
+    if not points:
+        return None
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points) / n
+    if var_x ** 0.5 >= MIN_SIZE_SPREAD * mean_x:
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / (var_x * n)
+        setup = mean_y - slope * mean_x
+        if slope > 0 and setup >= 0:
+            return setup, slope
+    return 0.0, mean_y / mean_x if mean_x else 0.0
+
+
+def fetch_model(records, runs):
+    """Build the latency/decode model and its calibration from journal lines."""
+    latency = fit_latency(records)
+    if latency is None:
+        return None
+    # The decode stage's own busy time includes shipping records to the worker
+    # processes and back, so prefer it to the in-worker decode timings.
+    decode_busy = decode_items = 0
+    for run in runs:
+        for stage in run.get("stages") or []:
+            if stage["stage"] == "decode" and stage["items"]:
+                decode_busy += stage["utilization"] * stage["workers"] * run["seconds"]
+                decode_items += stage["items"]
+    decode_times = [r["decode_seconds"] for r in records if r.get("decode_seconds") is not None]
+    if decode_items:
+        decode_seconds = decode_busy / decode_items
+    else:
+        decode_seconds = statistics.mean(decode_times) if decode_times else 0.0
+    model = {
+        "setup_seconds": latency[0],
+        "seconds_per_byte": latency[1],
+        "decode_seconds": decode_seconds,
+        "journal_records": len(records),
+        "journal_runs": len(runs),
+        "calibration": 1.0,
+    }
+    # How far off was the plain model for each run we have history for?
+    by_run = {}
+    for r in records:
+        if r.get("fetch_seconds") is not None:
+            by_run.setdefault(r["run"], []).append(r["length"])
+    ratios = []
+    for run in runs:
+        sizes = by_run.get(run["run"])
+        if not sizes or not run.get("seconds") or run.get("status") == "failed":
+            # A failed run stopped part way, so its wall time says little about throughput.
+            continue
+        modelled = project_runtime(model, sizes, run.get("max_concurrency") or 1,
+                                   run.get("decode_processes") or 1, calibrated=False)["seconds"]
+        if modelled > 0:
+            ratios.append(run["seconds"] / modelled)
+    if ratios:
+        model["calibration"] = statistics.median(ratios)
+    return model
+
+
+def project_runtime(model, request_sizes, concurrency, decode_processes, records=None, calibrated=True):
+    """Projected seconds for the fetch and decode stages and the whole run."""
+    latencies = [model["setup_seconds"] + model["seconds_per_byte"] * size for size in request_sizes]
+    # Never faster than the slowest single request.
+    fetch = max(sum(latencies) / max(1, concurrency), max(latencies, default=0.0))
+    records = len(request_sizes) if records is None else records
+    decode = records * model["decode_seconds"] / max(1, decode_processes)
+    factor = model["calibration"] if calibrated else 1.0
+    return {
+        "fetch_seconds": fetch * factor,
+        "decode_seconds": decode * factor,
+        "seconds": max(fetch, decode) * factor,
+        "bottleneck": "fetch" if fetch >= decode else "decode",
+    }
+
+
+def print_plan(plan, model, concurrency_levels, decode_processes):
+    print("Fetch plan:")
+    print(f"  Rows: {plan['rows']}")
+    print(f"  Distinct WARC files: {plan['warc_files']}")
+    print(f"  Record bytes: {format_bytes(plan['bytes'])}")
+    print(f"  Requests without coalescing: {plan['requests']} ({format_bytes(plan['bytes'])})")
+    print(f"  Requests with coalescing: {plan['coalesced_requests']} "
+          f"({format_bytes(plan['coalesced_bytes'])}, including gaps between records)")
+    if model is None:
+        print("\nNo fetched records in the journal; run html_extractor.py once to enable runtime projection.")
+        return
+    print(f"\nModel from {model['journal_records']} journalled records over {model['journal_runs']} runs:")
+    rate = 1 / model["seconds_per_byte"] / 1e6 if model["seconds_per_byte"] else float("inf")
+    print(f"  Request setup: {model['setup_seconds'] * 1000:.1f} ms, transfer: {rate:.2f} MB/s per request")
+    print(f"  Decode: {model['decode_seconds'] * 1000:.1f} ms per record, {decode_processes} processes")
+    print(f"  Calibration (actual / modelled runtime): x{model['calibration']:.2f}")
+    print(f"\n  {'concurrency':>11} {'runtime':>10} {'bottleneck':>10} {'coalesced':>10} {'bottleneck':>10}")
+    for concurrency in concurrency_levels:
+        plain = project_runtime(model, plan["request_sizes"], concurrency, decode_processes)
+        merged = project_runtime(model, plan["coalesced_request_sizes"], concurrency, decode_processes,
+                                 records=plan["rows"])
+        print(f"  {concurrency:>11} {format_seconds(plain['seconds']):>10} {plain['bottleneck']:>10} "
+              f"{format_seconds(merged['seconds']):>10} {merged['bottleneck']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate bytes, requests and runtime for an extraction work list")
+    parser.add_argument("--input", default=INPUT_CSV, help="Work-list CSV with filename, offset, length")
+    parser.add_argument("--journal", nargs="*", default=None,
+                        help=f"Journals from previous runs (default: {JOURNAL} if it exists)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=CONCURRENCY_LEVELS,
+                        help="Concurrency levels to project")
+    parser.add_argument("--decode-processes", type=int, default=DECODE_PROCESSES)
+    parser.add_argument("--max-gap", type=int, default=COALESCE_MAX_GAP,
+                        help="Coalesce records separated by fewer bytes than this")
+    parser.add_argument("--json", default=None, help="Also write the plan to this JSON file")
+    args = parser.parse_args()
+
+    with open(args.input, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    plan = plan_requests(rows, args.max_gap)
+
+    journals = args.journal if args.journal is not None else [j for j in [JOURNAL] if os.path.exists(j)]
+    model = fetch_model(*read_journals(journals)) if journals else None
+    print_plan(plan, model, args.concurrency, args.decode_processes)
+
+    if args.json:
+        result = {k: v for k, v in plan.items() if not k.endswith("request_sizes")}
+        result["model"] = model
+        if model is not None:
+            result["projections"] = [
+                {
+                    "concurrency": c,
+                    "plain": project_runtime(model, plan["request_sizes"], c, args.decode_processes),
+                    "coalesced": project_runtime(model, plan["coalesced_request_sizes"], c,
+                                                 args.decode_processes, records=plan["rows"]),
+                }
+                for c in args.concurrency
+            ]
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nPlan written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
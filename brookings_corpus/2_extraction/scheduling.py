@@ -0,0 +1,109 @@
+"""
+Cutting the tail of an extraction batch.
+
+A batch finishes when its slowest request does, so two things help:
+
+- locality_order(): fetch order for a work list. WARC files holding the most
+  bytes go first (longest jobs first, so no big record starts last and runs
+  alone), and records in the same file go in offset order, back to back on
+  the same object.
+- HedgePolicy: when a request is still running after the running p95
+  latency, WarcSource.read_range() sends a duplicate, keeps whichever answer
+  arrives first and cancels the other. Hedges are capped at a share of all
+  requests (HEDGE_BUDGET), so a generally slow endpoint is never hit with
+  twice the load.
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import METRICS
+
+HEDGE_BUDGET = 0.05  # At most this many extra requests per request
+HEDGE_QUANTILE = 0.95  # Hedge requests slower than this quantile of recent latencies
+HEDGE_MIN_SAMPLES = 20  # No hedging until this many requests have completed
+HEDGE_WINDOW = 1000  # Recent latencies the quantile is taken over
+
+
+def locality_order(ranges):
+    """
+    Return the indices of (filename, offset, length) ranges in fetch order.
+
+    Files are ordered by total bytes, largest first; ranges within a file by
+    offset.
+    """
+    by_file = {}
+    for i, (filename, _, _) in enumerate(ranges):
+        by_file.setdefault(filename, []).append(i)
+    groups = sorted(by_file.values(), key=lambda members: -sum(int(ranges[i][2]) for i in members))
+    return [i for members in groups for i in sorted(members, key=lambda i: int(ranges[i][1]))]
+
+
+class HedgePolicy:
+    """
+    Decides when a slow request gets a duplicate, and runs the requests.
+
+    Attach one to a WarcSource as `source.hedge`, the same way as its
+    controller. Requests then run on this policy's threads so the caller can
+    stop waiting for a straggler.
+
+    Args:
+        name (str): Endpoint label used in metric names (e.g. "https", "s3")
+        budget (float): Maximum hedged requests as a share of all requests
+        quantile (float): Latency quantile after which a request is hedged
+        min_samples (int): Completed requests needed before hedging starts
+        window (int): Number of recent latencies the quantile is taken over
+        max_workers (int): Threads for requests and their hedges; at least
+            twice the number of fetch workers
+        metrics (Metrics, optional): Registry to publish counters/gauges to
+    """
+
+    def __init__(self, name, budget=HEDGE_BUDGET, quantile=HEDGE_QUANTILE, min_samples=HEDGE_MIN_SAMPLES,
+                 window=HEDGE_WINDOW, max_workers=32, metrics=None):
+        self.name = name
+        self.budget = budget
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.metrics = metrics or METRICS
+        self.requests = 0
+        self.hedges = 0
+        self._latencies = deque(maxlen=window)
+        self._delay = None
+        self._observed = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-hedge")
+
+    def submit(self, func, *args):
+        return self._executor.submit(func, *args)
+
+    def observe(self, seconds):
+        """Record the latency of a request that completed (not one that was cancelled)."""
+        with self._lock:
+            self._latencies.append(seconds)
+            self._observed += 1
+            # Re-sorting the window on every request is wasted work; the
+            # quantile moves slowly.
+            if len(self._latencies) >= self.min_samples and (self._delay is None or self._observed % 50 == 0):
+                ordered = sorted(self._latencies)
+                self._delay = ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))]
+                self.metrics.set_gauge(f"{self.name}_hedge_delay_seconds", round(self._delay, 4))
+
+    def delay(self):
+        """Count a new request; return how long to wait before hedging it (None: do not hedge)."""
+        with self._lock:
+            self.requests += 1
+            return self._delay if self.budget > 0 else None
+
+    def try_hedge(self):
+        """Spend one hedge from the budget if there is any left."""
+        with self._lock:
+            if self.hedges + 1 > self.budget * self.requests:
+                self.metrics.inc(f"{self.name}_hedges_over_budget")
+                return False
+            self.hedges += 1
+        self.metrics.inc(f"{self.name}_hedged_requests")
+        return True
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,148 @@
+"""
+Bounded-memory access to the HTML payload of a WARC record.
+
+warcio decompresses a record lazily; record.content_stream().read() pulls the
+whole payload into memory at once. These helpers read it in CHUNK_SIZE
+pieces instead and give up as soon as it grows past a size limit, so one
+pathological multi-MB page cannot blow up a worker's memory.
+
+- write_html_payload(): stream the payload straight to a file as UTF-8 (the
+  extractor's path; the page never exists in memory as a whole)
+- read_html_text(): return the payload decoded to str, still size-capped, for
+  callers that really need the whole page (analysis)
+- read_html_payload(): the same as raw bytes (benchmarks)
+
+The text paths pick the page's encoding with charset.detect_encoding() and
+decode it exactly once. write_html_payload() also hashes the payload as it
+streams past (SHA-1, base32: the form of the CDX `digest` column), so it
+can be checked against the index without reading the page a second time.
+"""
+
+import base64
+import hashlib
+import io
+import itertools
+import os
+
+from warcio.archiveiterator import ArchiveIterator
+
+from charset import SNIFF_BYTES, decode_html, detect_encoding, iter_utf8
+
+CHUNK_SIZE = 64 * 1024
+MAX_PAYLOAD_BYTES = 10 * 1024 * 1024  # Brookings pages are ~200 KB; anything this big is not an article
+
+
+class PayloadTooLarge(Exception):
+    """The payload exceeded the size limit; nothing was kept."""
+
+    def __init__(self, limit):
+        super().__init__(limit)  # Keeps the exception picklable across process pools
+        self.limit = limit
+
+    def __str__(self):
+        return f"payload larger than {self.limit} bytes"
+
+
+def record_content_type(record):
+    """HTTP Content-Type header of a WARC record, or None."""
+    return record.http_headers.get_header("Content-Type") if record.http_headers else None
+
+
+def html_response(warc_bytes):
+    """Return the first response record with an HTML Content-Type, or None."""
+    for record in ArchiveIterator(io.BytesIO(warc_bytes)):
+        if record.rec_type == "response":
+            content_type = record_content_type(record)
+            if content_type and "html" in content_type:
+                return record
+    return None
+
+
+def iter_payload(record, max_bytes=MAX_PAYLOAD_BYTES, chunk_size=CHUNK_SIZE, hasher=None):
+    """
+    Yield the record's decompressed payload in chunks; raise PayloadTooLarge
+    past max_bytes. Each chunk is also fed to `hasher` (a hashlib object) if given.
+    """
+    stream = record.content_stream()
+    total = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        total += len(chunk)
+        if max_bytes and total > max_bytes:
+            raise PayloadTooLarge(max_bytes)
+        if hasher is not None:
+            hasher.update(chunk)
+        yield chunk
+
+
+def base32_digest(hasher):
+    """Digest of a hashlib object in Common Crawl's base32 form."""
+    return base64.b32encode(hasher.digest()).decode("ascii")
+
+
+def normalize_digest(digest):
+    """Strip the "sha1:" prefix WARC headers (and some CDX exports) carry."""
+    digest = (digest or "").strip().upper()
+    return digest[5:] if digest.startswith("SHA1:") else digest
+
+
+def write_html_payload(warc_bytes, out_path, max_bytes=MAX_PAYLOAD_BYTES, charset_hint=None):
+    """
+    Stream the HTML payload of a WARC record to out_path, re-encoded as UTF-8.
+
+    The encoding is detected from `charset_hint` (the CDX charset field), the
+    HTTP headers or the first chunk, so the payload is still read only once.
+
+    Returns a dict describing the page (None if the record holds no HTML
+    response; nothing is written then):
+
+    - html_bytes: UTF-8 bytes written
+    - encoding: detected source encoding
+    - payload_digest: base32 SHA-1 of the payload as served (before re-encoding)
+    - content_type, http_status: from the HTTP response headers
+
+    On PayloadTooLarge the partial file is removed before the exception
+    propagates.
+    """
+    record = html_response(warc_bytes)
+    if record is None:
+        return None
+    hasher = hashlib.sha1()
+    chunks = iter_payload(record, max_bytes, hasher=hasher)
+    written = 0
+    try:
+        first = next(chunks, b"")
+        encoding, _ = detect_encoding(first[:SNIFF_BYTES], charset_hint, record_content_type(record))
+        with open(out_path, "wb") as out:
+            for chunk in iter_utf8(itertools.chain([first], chunks), encoding):
+                out.write(chunk)
+                written += len(chunk)
+    except BaseException:
+        if os.path.exists(out_path):
+            os.remove(out_path)
+        raise
+    return {
+        "html_bytes": written,
+        "encoding": encoding,
+        "payload_digest": base32_digest(hasher),
+        "content_type": record_content_type(record),
+        "http_status": int(record.http_headers.get_statuscode() or 0) or None,
+    }
+
+
+def read_html_payload(warc_bytes, max_bytes=MAX_PAYLOAD_BYTES):
+    """Return the HTML payload of a WARC record as bytes (None if there is none)."""
+    record = html_response(warc_bytes)
+    if record is None:
+        return None
+    return b"".join(iter_payload(record, max_bytes))
+
+
+def read_html_text(warc_bytes, charset_hint=None, max_bytes=MAX_PAYLOAD_BYTES):
+    """Return (HTML payload as str, detected encoding), or None if there is no HTML response."""
+    record = html_response(warc_bytes)
+    if record is None:
+        return None
+    return decode_html(b"".join(iter_payload(record, max_bytes)), charset_hint, record_content_type(record))
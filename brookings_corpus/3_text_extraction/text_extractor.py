@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Main-text extraction for Brookings article pages
+
+Reads the {digest}.html files from the extraction step and writes each
+page's main text to {digest}.txt, with one log row per page (title, authors,
+date, word count, which extractor was used and how long it took).
+
+Brookings articles are all rendered from one page template, so most pages go
+through a fast site-profile path: precompiled XPath selectors (SITE_PROFILE)
+find the title, byline and date in the hero section and the body blocks in
+the content section, and boilerplate inside the body (sidebar, author cards,
+related content, the funding note, embeds) is dropped by path rules
+(BOILERPLATE_PATHS) before the text is read. Nothing else on the page is
+looked at.
+
+The fast path's output is then checked (sanity_problems): a title, a body,
+enough words, and not mostly link text. A page that fails a check (another
+template, a stub, a page that changed its markup) goes to the generic
+extractor instead: trafilatura if it is installed, otherwise the largest
+cluster of paragraphs on the page. The log records why each page fell back.
+
+Pages/s and MB/s are reported separately for fast-path and fallback pages
+(a fallback page's time includes the fast attempt that failed), so a drop
+in throughput can be traced to a rise in fallbacks.
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from lxml import etree, html
+
+try:
+    import trafilatura
+except ImportError:
+    trafilatura = None
+
+# Metrics are shared with the extraction step
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "2_extraction"))
+from metrics import METRICS, Metrics, add_metrics_arguments, start_metrics_exporter
+
+WORKERS = 1  # Processes for extract_files (1 = serial)
+CHUNK_SIZE = 200  # Files per task in parallel mode
+MIN_WORDS = 40  # Fewer words than this is not an article body
+MAX_LINK_DENSITY = 0.5  # Share of body words inside links above which the body is a link list
+LOG_FIELDS = ['digest', 'method', 'fallback_reason', 'title', 'authors', 'date',
+              'word_count', 'paragraphs', 'bytes', 'seconds']
+METHODS = ['site_profile', 'generic', 'failed']
+
+
+def _has_class(name):
+    """XPath predicate for a class token (contains(@class) would also match 'name-suffix')"""
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+
+# Where the fields of a Brookings article are, compiled once per process.
+SITE_PROFILE = {
+    'title': etree.XPath('//main//section[@id="hero"]//h1'),
+    'authors': etree.XPath(f'//main//section[@id="hero"]//a[{_has_class("person-hover")}]'),
+    'date': etree.XPath(f'//main//section[@id="hero"]//p[{_has_class("text-medium")}]'),
+    'content': etree.XPath(f'//main//section[@id="content"]//div[{_has_class("article-content")}]'),
+    'body': etree.XPath(f'./div[{_has_class("wysiwyg-block")}]'),
+}
+
+# Paths under the article content that are not part of the article. The
+# funding note is a wysiwyg block like the body but set off with a top border.
+BOILERPLATE_PATHS = etree.XPath(' | '.join([
+    './aside',
+    f'./div[{_has_class("authors")}]',
+    f'./div[{_has_class("related-content")}]',
+    f'./div[{_has_class("wysiwyg-block")} and {_has_class("border-t")}]',
+    './/template', './/script', './/style', './/noscript', './/iframe', './/form',
+    './/figcaption', './/sup',
+]))
+
+# Block elements whose text becomes a paragraph of the output
+TEXT_BLOCKS = etree.XPath(
+    './/*[self::p or self::h2 or self::h3 or self::h4 or self::h5 or self::h6'
+    ' or self::li or self::blockquote or self::pre]'
+    '[not(ancestor::p or ancestor::li or ancestor::blockquote or ancestor::pre)]'
+)
+LINK_TEXT = etree.XPath('.//a//text()')
+
+# Generic fallback without trafilatura: page furniture never holding the article
+GENERIC_DROP = etree.XPath(
+    '//script | //style | //noscript | //template | //nav | //header | //footer'
+    ' | //aside | //form | //iframe'
+)
+PARAGRAPHS = etree.XPath('//p')
+
+DATE_RE = re.compile(r'[A-Z][a-z]+ \d{1,2}, \d{4}')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize(text):
+    """Collapse runs of whitespace (including non-breaking spaces) to one space"""
+    return WHITESPACE_RE.sub(' ', text.replace('\xa0', ' ')).strip()
+
+
+def element_text(elem):
+    return normalize(''.join(elem.itertext()))
+
+
+def drop(elem):
+    """Remove an element but keep its tail text, which belongs to the parent"""
+    parent = elem.getparent()
+    if parent is None:
+        return
+    if elem.tail:
+        previous = elem.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or '') + elem.tail
+        else:
+            parent.text = (parent.text or '') + elem.tail
+    parent.remove(elem)
+
+
+def parse_date(text):
+    """'January 25, 2013' -> '2013-01-25'; None if the text holds no such date"""
+    match = DATE_RE.search(text)
+    if not match:
+        return None
+    try:
+        return datetime.strptime(match.group(0), '%B %d, %Y').date().isoformat()
+    except ValueError:
+        return None
+
+
+def extract_site_profile(tree):
+    """
+    Fast path: the article's fields from the Brookings page template.
+
+    Returns a result dict (title, authors, date, paragraphs, link_words);
+    title is None and paragraphs empty when the page does not have the
+    template's elements.
+    """
+    titles = SITE_PROFILE['title'](tree)
+    title = element_text(titles[0]) if titles else None
+    authors = []
+    for name in SITE_PROFILE['authors'](tree):
+        name = element_text(name)
+        if name and name not in authors:
+            authors.append(name)
+    date = None
+    for candidate in SITE_PROFILE['date'](tree):
+        date = parse_date(element_text(candidate))
+        if date:
+            break
+
+    paragraphs = []
+    link_words = 0
+    for content in SITE_PROFILE['content'](tree)[:1]:
+        # Matches are collected before any is removed, so nested ones are harmless.
+        for elem in BOILERPLATE_PATHS(content):
+            drop(elem)
+        for block in SITE_PROFILE['body'](content):
+            for text_block in TEXT_BLOCKS(block):
+                text = element_text(text_block)
+                if text:
+                    paragraphs.append(text)
+                    link_words += len(normalize(' '.join(LINK_TEXT(text_block))).split())
+
+    return {'title': title or None, 'authors': authors, 'date': date,
+            'paragraphs': paragraphs, 'link_words': link_words}
+
+
+def sanity_problems(result):
+    """Reasons the fast path's result cannot be trusted; empty if it looks like an article"""
+    problems = []
+    if not result['paragraphs']:
+        return ['no body']
+    if not result['title']:
+        problems.append('no title')
+    words = sum(len(paragraph.split()) for paragraph in result['paragraphs'])
+    if words < MIN_WORDS:
+        problems.append(f'{words} words')
+    if words and result['link_words'] / words > MAX_LINK_DENSITY:
+        problems.append(f"link density {result['link_words'] / words:.2f}")
+    return problems
+
+
+def extract_generic(content):
+    """
+    Fallback for pages the site profile does not fit.
+
+    With trafilatura installed, its extraction and metadata are used.
+    Otherwise the page furniture (nav, header, footer, aside, scripts) is
+    dropped and the paragraphs of the element holding the most paragraph
+    text are taken, which finds the article column of most CMS templates.
+    """
+    if trafilatura is not None:
+        extracted = trafilatura.extract(content, output_format='json', with_metadata=True,
+                                        include_comments=False, include_tables=False)
+        if not extracted:
+            return {'title': None, 'authors': [], 'date': None, 'paragraphs': []}
+        doc = json.loads(extracted)
+        authors = [a.strip() for a in (doc.get('author') or '').split(';') if a.strip()]
+        paragraphs = [normalize(line) for line in (doc.get('text') or '').split('\n') if line.strip()]
+        return {'title': doc.get('title'), 'authors': authors, 'date': doc.get('date'),
+                'paragraphs': paragraphs}
+
+    tree = html.fromstring(content)
+    titles = tree.xpath('//h1')
+    title = element_text(titles[0]) if titles else None
+    if not title:
+        title = normalize(tree.findtext('.//title') or '') or None
+    for elem in GENERIC_DROP(tree):
+        drop(elem)
+    by_parent = {}
+    for p in PARAGRAPHS(tree):
+        text = element_text(p)
+        if text:
+            by_parent.setdefault(p.getparent(), []).append(text)
+    best = max(by_parent.values(), key=lambda texts: sum(len(text) for text in texts), default=[])
+    return {'title': title, 'authors': [], 'date': None, 'paragraphs': best}
+
+
+def extract_text(content, metrics=METRICS):
+    """
+    Extract the main text of one page (HTML bytes).
+
+    Returns a result dict: method ('site_profile', 'generic' or 'failed'),
+    fallback_reason ('' on the fast path), title, authors, date and
+    paragraphs.
+    """
+    start = time.perf_counter()
+    tree = html.fromstring(content)
+    result = extract_site_profile(tree)
+    problems = sanity_problems(result)
+    if not problems:
+        metrics.inc('text_pages_site_profile')
+        metrics.inc('text_bytes_site_profile', len(content))
+        metrics.observe('text_site_profile_seconds', time.perf_counter() - start)
+        return dict(result, method='site_profile', fallback_reason='')
+
+    fast = result
+    result = extract_generic(content)
+    result['method'] = 'generic' if result['paragraphs'] else 'failed'
+    result['fallback_reason'] = '; '.join(problems)
+    # The fast path's byline and date are kept where the generic extractor has none.
+    result['title'] = result['title'] or fast['title']
+    result['authors'] = result['authors'] or fast['authors']
+    result['date'] = result['date'] or fast['date']
+    metrics.inc(f"text_pages_{result['method']}")
+    metrics.inc(f"text_bytes_{result['method']}", len(content))
+    metrics.observe('text_generic_seconds', time.perf_counter() - start)
+    return result
+
+
+def extract_chunk(html_files, output_dir, metrics=METRICS):
+    """Extract a list of HTML files, writing {digest}.txt for each; return one log row per file"""
+    rows = []
+    for html_file in html_files:
+        start = time.perf_counter()
+        row = {'digest': html_file.stem}
+        try:
+            with open(html_file, 'rb') as f:
+                content = f.read()
+            row['bytes'] = len(content)
+            result = extract_text(content, metrics)
+            if result['paragraphs']:
+                with open(os.path.join(output_dir, f"{html_file.stem}.txt"), 'w', encoding='utf-8') as f:
+                    f.write('\n\n'.join(result['paragraphs']) + '\n')
+            row.update(method=result['method'], fallback_reason=result['fallback_reason'],
+                       title=result['title'] or '', authors='; '.join(result['authors']),
+                       date=result['date'] or '', paragraphs=len(result['paragraphs']),
+                       word_count=sum(len(paragraph.split()) for paragraph in result['paragraphs']))
+        except Exception as e:
+            print(f"Error extracting {html_file}: {str(e)}")
+            row.update(method='failed', fallback_reason=f'error: {e}')
+            metrics.inc('text_pages_failed')
+        row['seconds'] = round(time.perf_counter() - start, 6)
+        rows.append(row)
+    return rows
+
+
+def _extract_chunk_in_worker(task):
+    # Worker processes count into their own registry; the parent merges it.
+    html_files, output_dir = task
+    metrics = Metrics()
+    return extract_chunk(html_files, output_dir, metrics), metrics.snapshot()
+
+
+def extract_files(input_dir, output_dir, workers=WORKERS, chunk_size=CHUNK_SIZE):
+    """
+    Extract the main text of every {digest}.html file in input_dir into
+    output_dir; return the log rows, in file order.
+
+    With workers > 1 the files are split into chunks of chunk_size files and
+    extracted in a process pool.
+    """
+    html_files = sorted(Path(input_dir).glob('*.html'))
+    os.makedirs(output_dir, exist_ok=True)
+    METRICS.set_gauge('text_files_total', len(html_files))
+
+    if workers > 1 and html_files:
+        # Small batches still get a few chunks per worker.
+        chunk_size = max(1, min(chunk_size, -(-len(html_files) // (workers * 4))))
+        tasks = [(html_files[i:i + chunk_size], output_dir) for i in range(0, len(html_files), chunk_size)]
+        rows = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for chunk_rows, metrics in pool.map(_extract_chunk_in_worker, tasks):
+                rows.extend(chunk_rows)
+                METRICS.merge(metrics)
+        return rows
+    return extract_chunk(html_files, output_dir)
+
+
+def throughput(rows):
+    """Pages, pages/s and MB/s per method, from the per-page seconds and bytes in the log rows"""
+    summary = {}
+    for method in METHODS:
+        method_rows = [row for row in rows if row['method'] == method]
+        seconds = sum(row['seconds'] for row in method_rows)
+        megabytes = sum(row.get('bytes', 0) for row in method_rows) / 1e6
+        latencies = sorted(row['seconds'] for row in method_rows)
+        summary[method] = {
+            'pages': len(method_rows),
+            'seconds': seconds,
+            'pages_per_second': len(method_rows) / seconds if seconds else None,
+            'mb_per_second': megabytes / seconds if seconds else None,
+            'p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else None,
+            'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000 if latencies else None,
+        }
+    return summary
+
+
+def write_log(rows, log_file):
+    with open(log_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=LOG_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def print_summary(rows, elapsed):
+    print(f"\n{len(rows)} pages in {elapsed:.1f}s")
+    print(f"{'path':<14}{'pages':>8}{'pages/s':>10}{'MB/s':>8}{'p50 ms':>9}{'p99 ms':>9}")
+    for method, stats in throughput(rows).items():
+        if not stats['pages']:
+            continue
+        print(f"{method:<14}{stats['pages']:>8}{stats['pages_per_second']:>10.1f}{stats['mb_per_second']:>8.1f}"
+              f"{stats['p50_ms']:>9.1f}{stats['p99_ms']:>9.1f}")
+    reasons = {}
+    for row in rows:
+        if row['method'] != 'site_profile':
+            reasons[row['fallback_reason']] = reasons.get(row['fallback_reason'], 0) + 1
+    if reasons:
+        print("\nFallback reasons:")
+        for reason, count in sorted(reasons.items(), key=lambda item: -item[1]):
+            print(f"  {count:>6}  {reason}")
+    print("(pages/s and MB/s are per worker process; fallback times include the failed fast attempt)")
+
+
+if __name__ == "__main__":
+    input_dir = "html_raw"  # Relative to script location
+    output_dir = "text_raw"  # {digest}.txt, one per page with text
+    log_file = "brookings_corpus/3_text_extraction/text_log.csv"
+
+    parser = argparse.ArgumentParser(description="Extract the main text of Brookings HTML pages")
+    parser.add_argument("--input-dir", default=input_dir, help="Directory of {digest}.html files")
+    parser.add_argument("--output-dir", default=output_dir, help="Directory for the {digest}.txt files")
+    parser.add_argument("--log", default=log_file, help="CSV log with one row per page")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Worker processes (1 = serial)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Files per task in parallel mode")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    exporter = start_metrics_exporter(args, job="text_extractor")
+
+    if trafilatura is None:
+        print("trafilatura is not installed; fallback pages use the built-in paragraph extractor")
+    print(f"Extracting text from {args.input_dir} into {args.output_dir}...")
+    start = time.perf_counter()
+    rows = extract_files(args.input_dir, args.output_dir, workers=args.workers, chunk_size=args.chunk_size)
+    elapsed = time.perf_counter() - start
+    write_log(rows, args.log)
+    print_summary(rows, elapsed)
+    print(f"Log saved to {args.log}")
+    if exporter is not None:
+        exporter.stop()
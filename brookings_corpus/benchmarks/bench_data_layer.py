@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark and correctness check for brookings.dataLayer extraction.
+
+Compares preliminary_analysis.extract_data_layer (marker search on the raw
+bytes, then json raw_decode of just the object) with the DOTALL regex it
+replaced (decode the whole page, then `{.*?};`), on:
+
+- the real fixture pages in html_raw_test/ (speed, and whether both agree)
+- variants of one fixture that the regex gets wrong: `};` inside a string
+  value, a nested object followed by `};` in a string, and an object closed
+  without a semicolon
+
+Usage:
+    python bench_data_layer.py
+    python bench_data_layer.py --pages /path/to/html_raw --repeat 50
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(REPO_ROOT, "brookings_corpus", "data_analysis", "preliminary"))
+from preliminary_analysis import extract_data_layer
+
+FIXTURE_DIR = os.path.join(REPO_ROOT, "html_raw_test")
+REPEAT = 20
+
+
+def regex_data_layer(html_bytes):
+    """The previous extractor: decode the whole page, then a non-greedy DOTALL regex."""
+    html_content = html_bytes.decode("utf-8", errors="replace")
+    match = re.search(r'brookings\.dataLayer\s*=\s*({.*?});', html_content, re.DOTALL)
+    if match:
+        try:
+            return json.loads(match.group(1))
+        except json.JSONDecodeError:
+            return None
+    return None
+
+
+def time_per_page(func, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            func(page)
+    return (time.perf_counter() - start) / (repeat * len(pages))
+
+
+def tricky_variants(page):
+    """
+    Pages derived from `page` whose dataLayer the regex cannot extract
+    correctly, as {case: (page, expected dataLayer)}.
+    """
+    marker = re.search(rb'brookings\.dataLayer\s*=\s*', page)
+    tail = page[marker.end():].decode("utf-8")
+    data, chars = json.JSONDecoder().raw_decode(tail)
+    rest = tail[chars:].encode("utf-8")
+    rest = rest[1:] if rest.startswith(b";") else rest
+
+    def rebuild(value, closing=b";"):
+        return page[:marker.end()] + json.dumps(value).encode() + closing + rest, value
+
+    return {
+        "'};' inside a string": rebuild({**data, "title": "Budget deal reached}; what next"}),
+        "nested object, '};' in a string": rebuild({**data, "meta": {"note": "a};b", "ids": [1, 2]}}),
+        "no semicolon after the object": rebuild(data, closing=b"\n"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare dataLayer extractors on fixture pages")
+    parser.add_argument("--pages", default=FIXTURE_DIR, help="Directory of .html pages")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="Passes over the pages when timing")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.pages, "*.html")))
+    pages = []
+    for path in paths:
+        with open(path, "rb") as f:
+            pages.append(f.read())
+    total_bytes = sum(len(page) for page in pages)
+
+    old = time_per_page(regex_data_layer, pages, args.repeat)
+    new = time_per_page(extract_data_layer, pages, args.repeat)
+    print(f"{len(pages)} pages, {total_bytes / len(pages) / 1024:.0f} KB average, {args.repeat} passes")
+    print(f"  {'extractor':<22} {'ms/page':>9} {'MB/s':>9}")
+    for name, seconds in (("regex (previous)", old), ("marker + raw_decode", new)):
+        print(f"  {name:<22} {seconds * 1000:>9.3f} {total_bytes / len(pages) / seconds / 1e6:>9.1f}")
+    print(f"  Speedup: x{old / new:.1f}")
+
+    found_old = found_new = agree = 0
+    for path, page in zip(paths, pages):
+        a, b = regex_data_layer(page), extract_data_layer(page)
+        found_old += a is not None
+        found_new += b is not None
+        if a == b:
+            agree += 1
+        else:
+            print(f"  Differ on {os.path.basename(path)}: regex {'found' if a else 'none'}, "
+                  f"raw_decode {'found' if b else 'none'}")
+    print(f"\ndataLayer found: regex {found_old}/{len(pages)}, raw_decode {found_new}/{len(pages)}; "
+          f"identical results on {agree}/{len(pages)}")
+
+    base = next((page for page in pages if extract_data_layer(page)), None)
+    if base is None:
+        return
+    print("\nPages the regex gets wrong:")
+    print(f"  {'case':<34} {'regex':>8} {'raw_decode':>11}")
+    for case, (page, expected) in tricky_variants(base).items():
+        ok_old = regex_data_layer(page) == expected
+        ok_new = extract_data_layer(page) == expected
+        print(f"  {case:<34} {'ok' if ok_old else 'WRONG':>8} {'ok' if ok_new else 'WRONG':>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Equivalence and speed check for the HTMLAnalyzer backends.
+
+Runs prototypes_old/politics_sources/scripts/utils/html_analyzer.py's
+analyze_html_sample with the BeautifulSoup backend (html.parser, the
+fallback) and the lxml backend on the same pages, and reports:
+
+- time per page for each backend
+- on how many pages the two results are identical, and for the others which
+  fields differ (html.parser and libxml2 repair badly nested markup
+  differently, so a few differences on broken pages are expected)
+
+Usage:
+    python bench_html_analyzer.py
+    python bench_html_analyzer.py --pages /path/to/html_raw --limit 200 --repeat 3
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+import warnings
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(REPO_ROOT, "prototypes_old", "politics_sources", "scripts"))
+from utils.html_analyzer import analyze_html_sample
+
+FIXTURE_DIR = os.path.join(REPO_ROOT, "html_raw_test")
+REPEAT = 3
+
+
+def differences(a, b, path=""):
+    """Paths (e.g. analysis.content_structure.word_count) where two results differ."""
+    if isinstance(a, dict) and isinstance(b, dict):
+        return [p for key in sorted(set(a) | set(b)) for p in differences(a.get(key), b.get(key), f"{path}.{key}")]
+    return [path.lstrip(".")] if a != b else []
+
+
+def time_per_page(backend, pages, url, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            analyze_html_sample(page, url, backend)
+    return (time.perf_counter() - start) / (repeat * len(pages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the HTMLAnalyzer backends on fixture pages")
+    parser.add_argument("--pages", default=FIXTURE_DIR, help="Directory of .html pages")
+    parser.add_argument("--limit", type=int, help="Use at most this many pages")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="Passes over the pages when timing")
+    parser.add_argument("--url", default="https://www.brookings.edu/articles/example/",
+                        help="URL passed to the analyzer for every page")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")  # bs4 warnings about odd markup are not what is measured here
+
+    paths = sorted(glob.glob(os.path.join(args.pages, "*.html")))[:args.limit]
+    pages = []
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            pages.append(f.read())
+    total_chars = sum(len(page) for page in pages)
+
+    timings = {backend: time_per_page(backend, pages, args.url, args.repeat) for backend in ("bs4", "lxml")}
+    print(f"{len(pages)} pages, {total_chars / len(pages) / 1024:.0f} K chars average, {args.repeat} passes")
+    print(f"  {'backend':<22} {'ms/page':>9}")
+    for backend, seconds in timings.items():
+        print(f"  {backend:<22} {seconds * 1000:>9.1f}")
+    print(f"  Speedup: x{timings['bs4'] / timings['lxml']:.1f}")
+
+    same = 0
+    for path, page in zip(paths, pages):
+        diff = differences(analyze_html_sample(page, args.url, "bs4"), analyze_html_sample(page, args.url, "lxml"))
+        if diff:
+            print(f"  Differ on {os.path.basename(path)}: {', '.join(diff)}")
+        else:
+            same += 1
+    print(f"\nIdentical analyze_html_sample() results on {same}/{len(pages)} pages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for data.commoncrawl.org and the `commoncrawl` S3 bucket.
+
+Serves WARC, cdx and cluster.idx files from a directory laid out like the
+crawl (crawl-data/..., cc-index/...) with proper Range/206 semantics, so the
+extractors and scanners can be benchmarked and fault-tested on a laptop.
+
+Two addressing styles are accepted on the same port:
+
+- HTTPS-style paths:  GET /crawl-data/CC-MAIN-2025-18/.../x.warc.gz
+- S3 path-style:      GET /commoncrawl/crawl-data/CC-MAIN-2025-18/.../x.warc.gz
+  (what boto3 sends with endpoint_url=http://127.0.0.1:PORT)
+
+Faults can be injected on purpose, each with its own probability:
+
+- --ignore-range: answer 200 with the whole file, as some servers do
+- --slowdown: answer 503 (S3 "SlowDown" XML error body)
+- --slow-body: sleep between body chunks
+- --straggler: make some responses much slower than the rest (tail latency),
+  sleeping --straggler-delay seconds before each body chunk
+- --drop: send part of the body, then close the connection
+
+Server-side counters are available at GET /_stats as JSON.
+
+Usage:
+    python cc_local_server.py --root /data/synthetic_cc --port 8000 --slowdown 0.05
+    python ../2_extraction/html_extractor.py --source http://127.0.0.1:8000/
+"""
+
+import argparse
+import json
+import os
+import random
+import ssl
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+CHUNK_SIZE = 64 * 1024
+S3_BUCKET = "commoncrawl"
+
+
+class FaultConfig:
+    """
+    Probabilities (0-1) and delays for injected faults.
+
+    Args:
+        ignore_range (float): Chance a ranged GET is answered 200 with the whole file
+        slowdown (float): Chance a request is answered 503 SlowDown
+        drop (float): Chance the connection is closed half way through the body
+        slow_body (float): Seconds to sleep before each body chunk
+        straggler (float): Chance a response is a straggler
+        straggler_delay (float): Seconds a straggler sleeps before each body chunk
+        seed (int, optional): Seed for reproducible fault sequences
+    """
+
+    def __init__(self, ignore_range=0.0, slowdown=0.0, drop=0.0, slow_body=0.0, straggler=0.0,
+                 straggler_delay=2.0, seed=None):
+        self.ignore_range = ignore_range
+        self.slowdown = slowdown
+        self.drop = drop
+        self.slow_body = slow_body
+        self.straggler = straggler
+        self.straggler_delay = straggler_delay
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def roll(self, probability):
+        """Return True with the given probability."""
+        if probability <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < probability
+
+
+class ServerStats:
+    """Request, byte and fault counters for the running server."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+def parse_range(header, size):
+    """
+    Parse a single `bytes=` range header against a file of `size` bytes.
+
+    Returns (start, end) inclusive, None when there is no usable single
+    range (the whole file is served), or "unsatisfiable".
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first == "":
+            suffix = int(last)
+            if suffix == 0:
+                return "unsatisfiable"
+            return max(0, size - suffix), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
+
+
+class CommonCrawlHandler(BaseHTTPRequestHandler):
+    """Serves files below server.root; see module docstring."""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "cc-local-server/1.0"
+    # Headers and body go out in separate writes; without TCP_NODELAY every
+    # keep-alive response waits ~40 ms on delayed ACKs.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def handle(self):
+        try:
+            super().handle()
+        except (ConnectionResetError, BrokenPipeError):
+            # Clients abort whole-file responses on purpose; not a server error.
+            self.server.stats.inc("client_disconnects")
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/_stats":
+            body = json.dumps(self.server.stats.snapshot(), indent=2).encode()
+            self._send_simple(200, body, "application/json")
+            return
+        self._serve(send_body=True)
+
+    def _resolve(self):
+        """Map the request path to (file path, is_s3) or (None, is_s3)."""
+        path = unquote(urlparse(self.path).path).lstrip("/")
+        is_s3 = False
+        bucket_prefix = self.server.bucket + "/"
+        if path.startswith(bucket_prefix):
+            path = path[len(bucket_prefix):]
+            is_s3 = True
+        full = os.path.realpath(os.path.join(self.server.root, path))
+        if not full.startswith(self.server.root + os.sep) or not os.path.isfile(full):
+            return None, is_s3
+        return full, is_s3
+
+    def _serve(self, send_body):
+        stats = self.server.stats
+        faults = self.server.faults
+        stats.inc("requests")
+        full, is_s3 = self._resolve()
+        if full is None:
+            stats.inc("not_found")
+            self._send_error(404, "NoSuchKey", "The specified key does not exist.", is_s3)
+            return
+        if faults.roll(faults.slowdown):
+            stats.inc("fault_slowdown")
+            self._send_error(503, "SlowDown", "Please reduce your request rate.", is_s3)
+            return
+
+        size = os.path.getsize(full)
+        byte_range = parse_range(self.headers.get("Range"), size)
+        if byte_range == "unsatisfiable":
+            stats.inc("range_unsatisfiable")
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if byte_range is not None and faults.roll(faults.ignore_range):
+            stats.inc("fault_ignore_range")
+            byte_range = None
+
+        if byte_range is None:
+            start, end = 0, size - 1
+            self.send_response(200)
+            stats.inc("status_200")
+        else:
+            start, end = byte_range
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            stats.inc("status_206")
+        length = end - start + 1
+        self.send_header("Content-Length", str(length))
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", f'"{int(os.path.getmtime(full))}-{size}"')
+        self.send_header("Last-Modified", formatdate(os.path.getmtime(full), usegmt=True))
+        self.end_headers()
+        if not send_body:
+            return
+
+        drop_after = length // 2 if faults.roll(faults.drop) else None
+        delay = faults.slow_body
+        if faults.roll(faults.straggler):
+            stats.inc("fault_straggler")
+            delay += faults.straggler_delay
+        sent = 0
+        with open(full, "rb") as f:
+            f.seek(start)
+            while sent < length:
+                if drop_after is not None and sent >= drop_after:
+                    stats.inc("fault_drop")
+                    self.close_connection = True
+                    self.connection.shutdown(2)
+                    return
+                if delay:
+                    time.sleep(delay)
+                chunk = f.read(min(CHUNK_SIZE, length - sent))
+                if not chunk:
+                    break
+                if drop_after is not None:
+                    chunk = chunk[: max(1, drop_after - sent)]
+                try:
+                    self.wfile.write(chunk)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client hung up (e.g. it stopped reading a 200 body early).
+                    stats.inc("client_disconnects")
+                    self.close_connection = True
+                    return
+                sent += len(chunk)
+                stats.inc("bytes_sent", len(chunk))
+
+    def _send_error(self, status, code, message, is_s3):
+        if is_s3:
+            body = (
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                f"<Error><Code>{code}</Code><Message>{message}</Message></Error>"
+            ).encode()
+            self._send_simple(status, body, "application/xml")
+        else:
+            self._send_simple(status, message.encode(), "text/plain")
+
+    def _send_simple(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+
+def start_server(root, host="127.0.0.1", port=0, faults=None, bucket=S3_BUCKET,
+                 certfile=None, keyfile=None, verbose=False):
+    """
+    Start the server on a background thread.
+
+    Args:
+        root (str): Directory to serve
+        host (str): Interface to bind
+        port (int): Port to bind (0 picks a free one)
+        faults (FaultConfig, optional): Faults to inject (default: none)
+        bucket (str): Bucket name accepted in S3 path-style requests
+        certfile (str, optional): PEM certificate to serve real HTTPS
+        keyfile (str, optional): Private key for certfile
+        verbose (bool): Log every request
+
+    Returns:
+        tuple: (server, base_url); call server.shutdown() to stop it
+    """
+    server = ThreadingHTTPServer((host, port), CommonCrawlHandler)
+    server.daemon_threads = True
+    server.root = os.path.realpath(root)
+    server.bucket = bucket
+    server.faults = faults or FaultConfig()
+    server.stats = ServerStats()
+    server.verbose = verbose
+    scheme = "http"
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"{scheme}://{host}:{server.server_address[1]}/"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local Common Crawl mirror with optional fault injection")
+    parser.add_argument("--root", required=True, help="Directory laid out like crawl-data/ and cc-index/")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--bucket", default=S3_BUCKET, help="Bucket name for S3 path-style requests")
+    parser.add_argument("--ignore-range", type=float, default=0.0,
+                        help="Probability of answering a ranged GET with 200 and the whole file")
+    parser.add_argument("--slowdown", type=float, default=0.0, help="Probability of a 503 SlowDown")
+    parser.add_argument("--drop", type=float, default=0.0, help="Probability of dropping the connection mid-body")
+    parser.add_argument("--slow-body", type=float, default=0.0, help="Seconds to sleep before each 64 KB body chunk")
+    parser.add_argument("--straggler", type=float, default=0.0, help="Probability of a very slow response")
+    parser.add_argument("--straggler-delay", type=float, default=2.0,
+                        help="Seconds a straggler sleeps before each 64 KB body chunk")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible faults")
+    parser.add_argument("--certfile", default=None, help="PEM certificate to serve HTTPS instead of HTTP")
+    parser.add_argument("--keyfile", default=None, help="Private key for --certfile")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    faults = FaultConfig(
+        ignore_range=args.ignore_range,
+        slowdown=args.slowdown,
+        drop=args.drop,
+        slow_body=args.slow_body,
+        straggler=args.straggler,
+        straggler_delay=args.straggler_delay,
+        seed=args.seed,
+    )
+    server, url = start_server(
+        args.root, args.host, args.port, faults, args.bucket, args.certfile, args.keyfile, args.verbose
+    )
+    print(f"Serving {os.path.abspath(args.root)} at {url}")
+    print(f"  HTTPS-style: --source {url}")
+    print(f"  S3-style:    boto3.client('s3', endpoint_url='{url.rstrip('/')}') bucket '{args.bucket}'")
+    print(f"  Stats:       {url}_stats")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\nStopping server.")
+        print(json.dumps(server.stats.snapshot(), indent=2))
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
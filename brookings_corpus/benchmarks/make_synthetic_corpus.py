@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Build a synthetic Common Crawl corpus for reproducible throughput benchmarks.
+
+Pages are generated from the real Brookings fixtures in html_raw_test/: each
+synthetic article takes one fixture's template (head, navigation, footer,
+dataLayer) and gets a fresh slug, title, dataLayer values and a body drawn
+from the fixtures' paragraphs. Word counts follow a log-normal fitted to the
+preliminary report (median ~930, mean ~1220 words), so gzipped record sizes
+land in the same 40-60 KB range as the real cdx rows.
+
+Output layout (mirrors the crawl, so cc_local_server.py can serve it and
+LocalWarcSource can read it directly):
+
+    OUT/crawl-data/CRAWL/segments/SEGMENT/warc/CRAWL-...-NNNNN.warc.gz
+    OUT/cc-index/collections/CRAWL/indexes/cdx-NNNNN.gz   (SURT-sorted shards)
+    OUT/cc-index/collections/CRAWL/indexes/cluster.idx
+    OUT/brookings_cdx_matches.txt      (as written by find_brookings_in_cdx.py)
+    OUT/brookings_cdx_working_sample.csv  (input for the extractors)
+
+Every capture is written as request/response/metadata records like Common
+Crawl; the cdx offset/length point at the response record and the digest is
+the real SHA-1/base32 of the HTTP payload.
+
+Usage:
+    python make_synthetic_corpus.py --out /data/synthetic_cc --records 5000
+"""
+
+import argparse
+import base64
+import csv
+import glob
+import gzip
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import re
+from datetime import datetime, timedelta
+
+from warcio.statusandheaders import StatusAndHeaders
+from warcio.warcwriter import WARCWriter
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+FIXTURE_DIR = os.path.join(REPO_ROOT, "html_raw_test")
+CRAWL_ID = "CC-MAIN-2025-18"
+BROOKINGS_SURT = "edu,brookings)/articles/"
+CDX_BLOCK_LINES = 3000  # Lines per gzip member / cluster.idx entry, as in Common Crawl
+WORD_COUNT_MEDIAN = 933
+WORD_COUNT_SIGMA = 0.75
+
+DATA_LAYER_RE = re.compile(r"brookings\.dataLayer\s*=\s*({.*?});", re.DOTALL)
+PARAGRAPH_RE = re.compile(r"<p>(?:(?!<p>).)*?</p>", re.DOTALL)
+TITLE_RE = re.compile(r"<title>.*?</title>", re.DOTALL)
+
+TOPICS = [
+    "U.S. Government & Politics", "U.S. Economy", "Education", "Cities & Communities",
+    "U.S. Foreign Policy", "Technology & Information", "Terrorism & Extremism",
+    "Climate Change", "Global Economy & Development", "Defense & Security",
+]
+TYPES = ["", "", "", "Op-ed", "Podcast", "Testimony"]
+REGIONS = ["", "", "Asia & the Pacific", "Europe & Eurasia", "Middle East & North Africa", "Africa", "Latin America & the Caribbean"]
+WORDS = (
+    "policy economy federal reform global security trade growth education climate "
+    "energy health public market research government state local data labor housing "
+    "infrastructure democracy election china russia budget tax innovation technology"
+).split()
+NOISE_HOSTS = ["com,example)/", "org,wikipedia,en)/wiki/", "gov,census)/data/", "net,news-site)/story/"]
+
+
+def load_fixtures(fixture_dir):
+    """Return [(template html, paragraphs)] for every fixture page."""
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(fixture_dir, "*.html"))):
+        with open(path, "r", encoding="utf-8") as f:
+            html = f.read()
+        if not DATA_LAYER_RE.search(html):
+            continue
+        fixtures.append((html, PARAGRAPH_RE.findall(html)))
+    if not fixtures:
+        raise SystemExit(f"No Brookings fixtures with a dataLayer found in {fixture_dir}")
+    return fixtures
+
+
+def body_region(html):
+    """Return (start, end) of the article body paragraphs in a fixture."""
+    start = html.find("<p>", html.find("article-content"))
+    end = html.find("</div>", start)
+    return start, end
+
+
+def make_page(rng, fixtures, paragraph_pool, slug, url, publish_date):
+    """Generate one article page; return (html bytes, dataLayer dict)."""
+    template, _ = rng.choice(fixtures)
+    target_words = max(40, int(rng.lognormvariate(math.log(WORD_COUNT_MEDIAN), WORD_COUNT_SIGMA)))
+    body, words = [], 0
+    while words < target_words:
+        paragraph = rng.choice(paragraph_pool)
+        body.append(paragraph)
+        words += len(re.sub(r"<[^>]+>", " ", paragraph).split())
+
+    title = " ".join(word.capitalize() for word in slug.split("-"))
+    data_layer = json.loads(DATA_LAYER_RE.search(template).group(1))
+    data_layer.update({
+        "title": title,
+        "word_count": words,
+        "post_id": rng.randint(10000, 999999),
+        "publish_date": publish_date.strftime("%Y-%m-%d"),
+        "monthPublished": publish_date.strftime("%m"),
+        "yearPublished": publish_date.strftime("%Y"),
+        "type": rng.choice(TYPES),
+        "primary_topic": rng.choice(TOPICS),
+        "topic": ", ".join(rng.sample(TOPICS, 3)),
+        "region": rng.choice(REGIONS),
+        "canonicalContent": url,
+    })
+
+    start, end = body_region(template)
+    html = (
+        template[:start]
+        + "\n".join(body)
+        + template[end:]
+    )
+    html = TITLE_RE.sub(lambda _: f"<title>{title}</title>", html, count=1)
+    html = DATA_LAYER_RE.sub(
+        lambda _: "brookings.dataLayer = " + json.dumps(data_layer).replace("/", "\\/") + ";",
+        html,
+        count=1,
+    )
+    return html.encode("utf-8"), data_layer
+
+
+def payload_digest(payload):
+    """SHA-1 of the payload, base32-encoded as in the cdx `digest` field."""
+    return base64.b32encode(hashlib.sha1(payload).digest()).decode("ascii")
+
+
+def write_capture(writer, stream, url, timestamp, payload):
+    """Write request/response/metadata records; return (offset, length) of the response."""
+    warc_date = timestamp.strftime("%Y-%m-%dT%H:%M:%SZ")
+    request_headers = StatusAndHeaders(
+        "GET /" + url.split("/", 3)[3] + " HTTP/1.1",
+        [("Host", "www.brookings.edu"), ("User-Agent", "CCBot/2.0 (https://commoncrawl.org/faq/)"),
+         ("Accept", "text/html,application/xhtml+xml")],
+        is_http_request=True,
+    )
+    writer.write_record(writer.create_warc_record(
+        url, "request", http_headers=request_headers, warc_headers_dict={"WARC-Date": warc_date},
+    ))
+
+    offset = stream.tell()
+    response_headers = StatusAndHeaders(
+        "200 OK",
+        [("Content-Type", "text/html; charset=UTF-8"), ("Server", "nginx"),
+         ("Date", timestamp.strftime("%a, %d %b %Y %H:%M:%S GMT")),
+         ("Content-Length", str(len(payload)))],
+        protocol="HTTP/1.1",
+    )
+    writer.write_record(writer.create_warc_record(
+        url, "response", payload=io.BytesIO(payload), http_headers=response_headers,
+        warc_headers_dict={"WARC-Date": warc_date, "WARC-Identified-Payload-Type": "text/html"},
+    ))
+    length = stream.tell() - offset
+
+    metadata = b"fetchTimeMs: 312\ncharset-detected: UTF-8\nlanguages-cld2: {\"languages\":[{\"code\":\"en\"}]}\n"
+    writer.write_record(writer.create_warc_record(
+        url, "metadata", payload=io.BytesIO(metadata),
+        warc_headers_dict={"WARC-Date": warc_date, "Content-Type": "application/warc-fields"},
+    ))
+    return offset, length
+
+
+def noise_lines(rng, count):
+    """Non-Brookings cdx lines so scanner benchmarks have something to skip."""
+    lines = []
+    for i in range(count):
+        surt = f"{rng.choice(NOISE_HOSTS)}page-{rng.randrange(10**9):09d}"
+        meta = {
+            "url": "https://noise.example/" + surt.split(")/", 1)[1], "mime": "text/html",
+            "mime-detected": "text/html", "status": "200", "digest": payload_digest(surt.encode()),
+            "length": str(rng.randint(2000, 90000)), "offset": str(rng.randrange(10**9)),
+            "filename": f"crawl-data/{CRAWL_ID}/segments/noise/warc/noise-{i % 100:05d}.warc.gz",
+            "charset": "UTF-8", "languages": "eng",
+        }
+        lines.append(f"{surt} 20250420000000 {json.dumps(meta)}\n")
+    return lines
+
+
+def write_cdx_index(lines, index_dir, shards):
+    """Write SURT-sorted lines as gzip-member cdx shards plus cluster.idx."""
+    os.makedirs(index_dir, exist_ok=True)
+    lines.sort()
+    per_shard = math.ceil(len(lines) / shards)
+    cluster = []
+    block = 0
+    for shard in range(shards):
+        shard_lines = lines[shard * per_shard:(shard + 1) * per_shard]
+        name = f"cdx-{shard:05d}.gz"
+        with open(os.path.join(index_dir, name), "wb") as f:
+            for i in range(0, len(shard_lines), CDX_BLOCK_LINES):
+                chunk = shard_lines[i:i + CDX_BLOCK_LINES]
+                offset = f.tell()
+                f.write(gzip.compress("".join(chunk).encode("utf-8")))
+                surt, timestamp = chunk[0].split(" ", 2)[:2]
+                cluster.append(f"{surt} {timestamp}\t{name}\t{offset}\t{f.tell() - offset}\t{block}\n")
+                block += 1
+    with open(os.path.join(index_dir, "cluster.idx"), "w", encoding="utf-8") as f:
+        f.writelines(cluster)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Brookings WARC/CDX corpus")
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--records", type=int, default=1000, help="Number of article captures")
+    parser.add_argument("--records-per-warc", type=int, default=500, help="Captures per WARC file")
+    parser.add_argument("--cdx-shards", type=int, default=4, help="Number of cdx-NNNNN.gz shards")
+    parser.add_argument("--noise-ratio", type=float, default=5.0,
+                        help="Non-Brookings cdx lines per article line (for scanner benchmarks)")
+    parser.add_argument("--fixtures", default=FIXTURE_DIR, help="Directory of real Brookings HTML pages")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (same seed, same corpus)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    fixtures = load_fixtures(args.fixtures)
+    paragraph_pool = [p for _, paragraphs in fixtures for p in paragraphs]
+    print(f"Loaded {len(fixtures)} fixture templates, {len(paragraph_pool)} paragraphs")
+
+    segment = "1744889135976.34"
+    warc_dir = os.path.join(args.out, "crawl-data", CRAWL_ID, "segments", segment, "warc")
+    os.makedirs(warc_dir, exist_ok=True)
+    crawl_start = datetime(2025, 4, 17)
+
+    cdx_lines, rows = [], []
+    stream = writer = None
+    total_bytes = 0
+    for i in range(args.records):
+        if i % args.records_per_warc == 0:
+            if stream:
+                total_bytes += stream.tell()
+                stream.close()
+            warc_index = i // args.records_per_warc
+            warc_name = f"{CRAWL_ID}-20250426032300-20250426062300-{warc_index:05d}.warc.gz"
+            filename = f"crawl-data/{CRAWL_ID}/segments/{segment}/warc/{warc_name}"
+            stream = open(os.path.join(args.out, filename), "wb")
+            writer = WARCWriter(stream, gzip=True)
+
+        slug = "-".join(rng.sample(WORDS, rng.randint(3, 7))) + f"-{i}"
+        url = f"https://www.brookings.edu/articles/{slug}/"
+        publish_date = datetime(2005, 1, 1) + timedelta(days=rng.randrange(20 * 365))
+        timestamp = crawl_start + timedelta(seconds=rng.randrange(14 * 86400))
+        payload, _ = make_page(rng, fixtures, paragraph_pool, slug, url, publish_date)
+        offset, length = write_capture(writer, stream, url, timestamp, payload)
+
+        meta = {
+            "url": url, "mime": "text/html", "mime-detected": "text/html", "status": "200",
+            "digest": payload_digest(payload), "length": str(length), "offset": str(offset),
+            "filename": filename, "charset": "UTF-8", "languages": "eng",
+        }
+        surt = BROOKINGS_SURT + slug
+        ts = timestamp.strftime("%Y%m%d%H%M%S")
+        cdx_lines.append(f"{surt} {ts} {json.dumps(meta)}\n")
+        rows.append(dict(meta, surt_url=surt, timestamp=ts))
+    if stream:
+        total_bytes += stream.tell()
+        stream.close()
+
+    matches = sorted(cdx_lines)
+    cdx_lines.extend(noise_lines(rng, int(len(matches) * args.noise_ratio)))
+    index_dir = os.path.join(args.out, "cc-index", "collections", CRAWL_ID, "indexes")
+    write_cdx_index(cdx_lines, index_dir, args.cdx_shards)
+
+    with open(os.path.join(args.out, "brookings_cdx_matches.txt"), "w", encoding="utf-8") as f:
+        f.writelines(matches)
+    fields = ["surt_url", "timestamp", "charset", "digest", "filename", "languages", "length",
+              "mime", "mime-detected", "offset", "status", "url"]
+    with open(os.path.join(args.out, "brookings_cdx_working_sample.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for row in sorted(rows, key=lambda r: r["surt_url"]):
+            writer.writerow(row)
+
+    print(f"Wrote {args.records} captures ({total_bytes / 1e6:.1f} MB of WARC) to {args.out}")
+    print(f"Wrote {len(cdx_lines)} cdx lines in {args.cdx_shards} shards plus cluster.idx")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the Brookings pipeline stages.
+
+Runs each stage over a corpus built by make_synthetic_corpus.py (or any
+directory with the same layout) and reports, per stage:
+
+- records/s and MB/s over the stage's wall-clock time
+- p50/p99 latency of a single item (one cdx shard, one record)
+
+Stages:
+
+- cdx_scan: find_brookings_in_cdx.filter_brookings_in_cdx over every shard
+  (records = cdx lines, MB = compressed shard bytes)
+- fetch:    WarcSource.read_range for every work-list row, on --workers threads
+  (MB = compressed WARC record bytes)
+- decode:   html_extractor.extract_html_from_warc (MB = HTML bytes out)
+- write:    writing {digest}.html files (MB = HTML bytes written)
+- analyze:  preliminary_analysis.extract_data_layer (MB = HTML bytes in)
+
+Records are processed in batches so memory stays bounded; each stage's time
+is summed over batches.
+
+Usage:
+    python run_benchmark.py --corpus /data/synthetic_cc
+    python run_benchmark.py --corpus /data/synthetic_cc --serve --workers 16 --json bench.json
+"""
+
+import argparse
+import csv
+import glob
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BROOKINGS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BROOKINGS_DIR, "1_identification"))
+sys.path.append(os.path.join(BROOKINGS_DIR, "2_extraction"))
+sys.path.append(os.path.join(BROOKINGS_DIR, "data_analysis", "preliminary"))
+import find_brookings_in_cdx
+from html_extractor import extract_html_from_warc
+from preliminary_analysis import extract_data_layer
+from warc_source import open_warc_source
+
+from cc_local_server import start_server
+
+BATCH_SIZE = 500
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+class StageStats:
+    """Wall time, item latencies, record and byte counts for one stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.wall = 0.0
+        self.latencies = []
+        self.records = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency, nbytes, records=1):
+        with self._lock:
+            self.latencies.append(latency)
+            self.bytes += nbytes
+            self.records += records
+
+    def summary(self):
+        wall = self.wall or 1e-9
+        return {
+            "stage": self.name,
+            "records": self.records,
+            "seconds": round(self.wall, 3),
+            "records_per_s": round(self.records / wall, 1),
+            "mb_per_s": round(self.bytes / 1e6 / wall, 2),
+            "p50_ms": round(percentile(self.latencies, 50) * 1000, 3),
+            "p99_ms": round(percentile(self.latencies, 99) * 1000, 3),
+        }
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_cdx_scan(corpus, stats, scratch):
+    find_brookings_in_cdx.MATCHES_FILE = os.path.join(scratch, "matches.txt")
+    shards = sorted(glob.glob(os.path.join(corpus, "cc-index", "collections", "*", "indexes", "cdx-*.gz")))
+    for shard in shards:
+        with gzip.open(shard, "rt", encoding="utf-8") as f:
+            lines = sum(1 for _ in f)
+        _, latency = timed(find_brookings_in_cdx.filter_brookings_in_cdx, shard)
+        stats.record(latency, os.path.getsize(shard), records=lines)
+        # Shards are scanned one after another, so wall time is the sum.
+        stats.wall += latency
+
+
+def bench_batch(rows, source, workers, out_dir, stats):
+    def fetch(row):
+        data, latency = timed(source.read_range, row["filename"], row["offset"], row["length"])
+        stats["fetch"].record(latency, len(data))
+        return data
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        segments = list(executor.map(fetch, rows))
+    stats["fetch"].wall += time.perf_counter() - start
+
+    start = time.perf_counter()
+    pages = []
+    for segment in segments:
+        html, latency = timed(extract_html_from_warc, segment)
+        stats["decode"].record(latency, len(html or b""))
+        pages.append(html or b"")
+    stats["decode"].wall += time.perf_counter() - start
+
+    start = time.perf_counter()
+    for row, html in zip(rows, pages):
+        item_start = time.perf_counter()
+        with open(os.path.join(out_dir, f"{row['digest']}.html"), "wb") as f:
+            f.write(html)
+        stats["write"].record(time.perf_counter() - item_start, len(html))
+    stats["write"].wall += time.perf_counter() - start
+
+    start = time.perf_counter()
+    for html in pages:
+        _, latency = timed(extract_data_layer, html)
+        stats["analyze"].record(latency, len(html))
+    stats["analyze"].wall += time.perf_counter() - start
+
+
+def print_table(summaries):
+    header = f"{'stage':<10} {'records':>8} {'seconds':>9} {'records/s':>11} {'MB/s':>9} {'p50 ms':>9} {'p99 ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for s in summaries:
+        print(
+            f"{s['stage']:<10} {s['records']:>8} {s['seconds']:>9.3f} {s['records_per_s']:>11.1f} "
+            f"{s['mb_per_s']:>9.2f} {s['p50_ms']:>9.3f} {s['p99_ms']:>9.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Brookings pipeline stages on a local corpus")
+    parser.add_argument("--corpus", required=True, help="Corpus directory from make_synthetic_corpus.py")
+    parser.add_argument("--work-list", default=None,
+                        help="Work-list CSV (default: CORPUS/brookings_cdx_working_sample.csv)")
+    parser.add_argument("--source", default=None,
+                        help="WARC backend for the fetch stage (default: read CORPUS as a local mirror)")
+    parser.add_argument("--serve", action="store_true",
+                        help="Fetch over HTTP from cc_local_server.py started on CORPUS")
+    parser.add_argument("--workers", type=int, default=8, help="Fetch threads")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N work-list rows")
+    parser.add_argument("--json", default=None, help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    work_list = args.work_list or os.path.join(args.corpus, "brookings_cdx_working_sample.csv")
+    with open(work_list, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))[: args.limit]
+
+    server = None
+    if args.serve:
+        server, url = start_server(args.corpus)
+        source = open_warc_source(url)
+    else:
+        source = open_warc_source(args.source or args.corpus)
+
+    stats = {name: StageStats(name) for name in ("cdx_scan", "fetch", "decode", "write", "analyze")}
+    scratch = tempfile.mkdtemp(prefix="cc-bench-")
+    try:
+        bench_cdx_scan(args.corpus, stats["cdx_scan"], scratch)
+        for i in range(0, len(rows), BATCH_SIZE):
+            bench_batch(rows[i : i + BATCH_SIZE], source, args.workers, scratch, stats)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+        if server:
+            server.shutdown()
+
+    summaries = [s.summary() for s in stats.values()]
+    print(f"Benchmark over {len(rows)} records from {args.corpus}")
+    print_table(summaries)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"corpus": args.corpus, "records": len(rows), "workers": args.workers,
+                       "source": "server" if args.serve else (args.source or "local"),
+                       "stages": summaries}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
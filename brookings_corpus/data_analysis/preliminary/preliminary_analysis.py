@@ -2,110 +2,427 @@
 """
 Preliminary analysis of Brookings HTML corpus
 Extracts metadata from brookings.dataLayer in HTML files and generates basic statistics
+
+Each document's dataLayer fields become one row of a typed metadata table
+(topics, regions, type, year, publish date, word count, joined with the CDX
+fields when --cdx-csv is given), saved as Parquet (--metadata) for later
+analysis. The report is built from fixed-size stats (counters plus a
+StreamStats for word counts, see stream_stats.py) counted from the rows;
+--report-only counts them from the saved table without touching the HTML.
+
+Large corpora can be analyzed in parallel with --workers N (map-reduce):
+the file list is split into chunks, each worker process counts its chunk
+into partial stats, and the parent only merges the partials (merge_stats).
+Workers also send back their chunk's rows, which feed the row cache and the
+metadata table but are not counted again.
+
+Merged quantile sketches depend on how the values were split, so the split
+is fixed: chunks are CHUNK_SIZE consecutive files of the whole list, sorted
+by name so it does not depend on directory order, cached or not (a chunk's cached rows travel with it to the worker), counted in
+file order, and merged in chunk order. The report is therefore the same for
+any --workers, with or without the cache; the serial run counts the same
+chunks in-process.
+
+Rows are cached between runs (--cache, keyed by digest and checked against
+each file's size and mtime), so regenerating the report after an extraction
+batch only parses the new pages. --no-cache parses everything.
 """
 
+import argparse
 import json
+import os
 import re
+import sys
+import time
 from pathlib import Path
 from bs4 import BeautifulSoup
-from collections import defaultdict
-import statistics
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from stream_stats import StreamStats
+
+# Metrics are shared with the extraction step
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "2_extraction"))
+from metrics import METRICS, Metrics, add_metrics_arguments, start_metrics_exporter
+
+DATA_LAYER_RE = re.compile(rb'brookings\.dataLayer\s*=\s*(?={)')
+DATA_LAYER_STR_RE = re.compile(r'brookings\.dataLayer\s*=\s*(?={)')
+DATA_LAYER_WINDOW = 16 * 1024  # Bytes decoded after the marker at first; grown while the object runs past it
+DATA_LAYER_MAX = 1024 * 1024  # Give up on objects larger than this (real ones are a few KB)
+JSON_DECODER = json.JSONDecoder()
+WORKERS = 1  # Processes for analyze_files (1 = serial)
+CHUNK_SIZE = 200  # Files per chunk; fixed, so the merged stats do not depend on --workers
+CACHE_VERSION = 3  # Bump when document_row changes, so old cached rows are re-parsed
+TEXT_COLUMNS = ['primary_topic', 'type', 'content_type', 'program']
+CDX_COLUMNS = ['digest', 'url', 'timestamp', 'status', 'length', 'languages']
+DATE_YEAR_RE = re.compile(r'(\d{4})-\d{2}-\d{2}')
 
 def extract_data_layer(html_content):
-    """Extract brookings.dataLayer JSON from HTML content"""
-    match = re.search(r'brookings\.dataLayer\s*=\s*({.*?});', html_content, re.DOTALL)
-    if match:
+    """
+    Extract brookings.dataLayer JSON from HTML content (bytes or str).
+
+    Finds the `brookings.dataLayer = {` marker, then parses exactly one JSON
+    object from there with raw_decode, so braces or `};` inside strings and
+    nested objects are handled, and nothing after the object is scanned. For
+    bytes, only a window after the marker is decoded, grown (up to
+    DATA_LAYER_MAX) until the whole object fits.
+    """
+    if isinstance(html_content, str):
+        match = DATA_LAYER_STR_RE.search(html_content)
+        if not match:
+            return None
         try:
-            return json.loads(match.group(1))
+            return JSON_DECODER.raw_decode(html_content, match.end())[0]
         except json.JSONDecodeError:
             return None
-    return None
+    match = DATA_LAYER_RE.search(html_content)
+    if not match:
+        return None
+    start = match.end()
+    window = DATA_LAYER_WINDOW
+    while True:
+        end = start + window
+        # A multi-byte character cut at the window edge only matters if the object runs past it.
+        text = html_content[start:end].decode('utf-8', errors='replace')
+        try:
+            return JSON_DECODER.raw_decode(text)[0]
+        except json.JSONDecodeError:
+            if end >= len(html_content) or window >= DATA_LAYER_MAX:
+                return None
+        window *= 4
+
+def split_field(value):
+    """Comma-separated dataLayer field ('A, B') as a list; [] if empty"""
+    if not value:
+        return []
+    return [v.strip() for v in value.split(',') if v.strip()]
+
+def to_int(value):
+    """Whole number from a dataLayer number or numeric string; None otherwise"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() else None
+
+def to_text(value):
+    """dataLayer value as a string; None if missing or empty"""
+    return None if value is None or value == '' else str(value)
+
+def document_year(data):
+    """yearPublished, else the year of an ISO publish_date; None if neither has one"""
+    year = to_int(data.get('yearPublished'))
+    if year is None and isinstance(data.get('publish_date'), str):
+        match = DATE_YEAR_RE.match(data['publish_date'])
+        year = int(match.group(1)) if match else None
+    return year
 
-def analyze_files(input_dir):
-    """Analyze all HTML files in directory"""
-    stats = {
+def document_row(data):
+    """Reduce a dataLayer to the metadata table's fields (one cacheable row per document)"""
+    row = {'parse_status': 'parsed', 'word_count': to_int(data.get('word_count'))}
+    for column in TEXT_COLUMNS:
+        row[column] = to_text(data.get(column))
+    row['topics'] = split_field(data.get('topic'))
+    row['regions'] = split_field(data.get('region'))
+    row['year'] = document_year(data)
+    row['publish_date'] = data.get('publish_date')
+    return row
+
+def empty_stats():
+    return {
         'total_files': 0,
         'processed_files': 0,
-        'word_counts': [],
-        'topics': defaultdict(int),
-        'regions': defaultdict(int),
-        'types': defaultdict(int),
-        'years': defaultdict(int)
+        'word_counts': StreamStats(),
+        'topics': Counter(),
+        'regions': Counter(),
+        'types': Counter(),
+        'years': Counter()
     }
 
-    html_files = list(Path(input_dir).glob('*.html'))
-    stats['total_files'] = len(html_files)
+def add_row(stats, row):
+    """Count one document row into stats (in place)"""
+    stats['total_files'] += 1
+    if row['parse_status'] != 'parsed':
+        return
+    stats['processed_files'] += 1
+    if row['word_count'] is not None:
+        stats['word_counts'].add(row['word_count'])
+    stats['topics'][row['primary_topic'] or 'Unknown'] += 1
+    stats['types'][row['type'] or 'Unknown'] += 1
+    for region in row['regions'] or ['Unknown']:
+        stats['regions'][region] += 1
+    if row['year'] is not None:
+        stats['years'][row['year']] += 1
 
+def analyze_chunk(html_files, metrics=METRICS):
+    """Parse a list of HTML files; return one row per file, in order"""
+    rows = []
     for html_file in html_files:
+        start = time.perf_counter()
         try:
-            with open(html_file, 'r', encoding='utf-8') as f:
+            with open(html_file, 'rb') as f:
                 content = f.read()
+                metrics.inc('analysis_bytes', len(content))
                 data = extract_data_layer(content)
                 if data:
-                    stats['processed_files'] += 1
-                    if 'word_count' in data:
-                        stats['word_counts'].append(data['word_count'])
-                    stats['topics'][data.get('primary_topic', 'Unknown')] += 1
-                    regions = data.get('region', 'Unknown')
-                    if regions:
-                        for region in [r.strip() for r in regions.split(',')]:
-                            stats['regions'][region] += 1
-                    else:
-                        stats['regions']['Unknown'] += 1
-                    stats['types'][data.get('type', 'Unknown')] += 1
-                    year = data.get('yearPublished') or (data.get('publish_date', '')[:4] if data.get('publish_date') else 'Unknown')
-                    stats['years'][year] += 1
+                    rows.append(document_row(data))
+                    metrics.inc('analysis_files_parsed')
                 else:
                     print(f"No dataLayer found in {html_file}")
+                    rows.append({'parse_status': 'no_datalayer'})
+                    metrics.inc('analysis_files_no_datalayer')
         except Exception as e:
             print(f"Error processing {html_file}: {str(e)}")
+            rows.append({'parse_status': 'failed'})
+            metrics.inc('analysis_files_failed')
             continue
+        finally:
+            metrics.observe('analysis_file_seconds', time.perf_counter() - start)
 
-    if not stats['word_counts']:
-        stats['word_counts'] = [0]  # Prevent empty list for statistics
+    return rows
 
+def merge_stats(stats, partial):
+    """
+    Add partial stats into stats (in place) and return stats. New keys go
+    after the ones already seen, so merging partials in file order keeps the
+    first-seen order that breaks ties in the report.
+    """
+    stats['total_files'] += partial['total_files']
+    stats['processed_files'] += partial['processed_files']
+    stats['word_counts'].merge(partial['word_counts'])
+    for key in ('topics', 'regions', 'types', 'years'):
+        stats[key].update(partial[key])
     return stats
 
+def count_chunk(entries, metrics=METRICS):
+    """
+    Parse the files of a chunk that have no cached row, then count all of
+    the chunk's rows in file order. entries are (html_file, cached row or
+    None). Returns (the newly parsed rows, in order; the chunk's stats).
+    """
+    parsed = analyze_chunk([html_file for html_file, row in entries if row is None], metrics)
+    new_rows = iter(parsed)
+    stats = empty_stats()
+    for html_file, row in entries:
+        add_row(stats, row if row is not None else next(new_rows))
+    return parsed, stats
+
+def _count_chunk_in_worker(entries):
+    # Worker processes count into their own registry and stats; the parent merges both.
+    metrics = Metrics()
+    parsed, stats = count_chunk(entries, metrics)
+    return parsed, stats, metrics.snapshot()
+
+def load_cache(cache_file):
+    """Read the row cache ({digest: {'size', 'mtime_ns', 'row'}}); empty if missing or stale"""
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get('version') != CACHE_VERSION:
+        return {}
+    return cache['documents']
+
+def save_cache(cache_file, documents):
+    """Write the row cache atomically, so an interrupted run leaves the old one intact"""
+    tmp_file = f"{cache_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({'version': CACHE_VERSION, 'documents': documents}, f, separators=(',', ':'))
+    os.replace(tmp_file, cache_file)
+
+def analyze_files(input_dir, workers=1, chunk_size=CHUNK_SIZE, cache_file=None):
+    """
+    Analyze all HTML files in directory.
+
+    Returns (digests, rows, stats): one document_row per file, in file
+    order, and the report stats. With
+    cache_file, rows are kept between runs keyed by digest (the file name)
+    and reused while the file's size and mtime are unchanged, so a rerun
+    only parses new or changed files.
+
+    The files are split into chunks of chunk_size files, whether cached or
+    not; each chunk is parsed and counted (count_chunk) and only the
+    partial stats are merged here, in chunk order. With workers > 1 and
+    files to parse, the chunks go to a process pool.
+    """
+    html_files = sorted(Path(input_dir).glob('*.html'))
+    METRICS.set_gauge('analysis_files_total', len(html_files))
+
+    cached = load_cache(cache_file) if cache_file else {}
+    documents = {}
+    rows = [None] * len(html_files)
+    todo = []
+    for i, html_file in enumerate(html_files):
+        st = html_file.stat()
+        entry = cached.get(html_file.stem)
+        if entry and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+            rows[i] = entry['row']
+            documents[html_file.stem] = entry
+        else:
+            todo.append(i)
+            documents[html_file.stem] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    METRICS.inc('analysis_files_cached', len(html_files) - len(todo))
+    if cache_file:
+        print(f"{len(html_files) - len(todo)} files unchanged since the last run, {len(todo)} to parse")
+
+    entries = list(zip(html_files, rows))
+    chunks = [entries[i:i + chunk_size] for i in range(0, len(entries), chunk_size)]
+    stats = empty_stats()
+    parsed = []
+    if workers > 1 and todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for chunk_rows, partial, metrics in pool.map(_count_chunk_in_worker, chunks):
+                parsed.extend(chunk_rows)
+                merge_stats(stats, partial)
+                METRICS.merge(metrics)
+    else:
+        for chunk in chunks:
+            chunk_rows, partial = count_chunk(chunk)
+            parsed.extend(chunk_rows)
+            merge_stats(stats, partial)
+
+    for i, row in zip(todo, parsed):
+        rows[i] = row
+        documents[html_files[i].stem]['row'] = row
+
+    if cache_file:
+        save_cache(cache_file, documents)
+
+    return [html_file.stem for html_file in html_files], rows, stats
+
+def build_metadata_table(digests, rows, cdx_csv=None):
+    """
+    Turn document rows into a typed DataFrame, one row per file.
+
+    Text fields are strings with empty values as NA, word_count and year are
+    nullable integers (year as in document_row), publish_date a datetime,
+    topics and regions lists of strings. With
+    cdx_csv, the CDX fields are left-joined on digest.
+    """
+    table = pd.DataFrame.from_records(rows, columns=['parse_status', 'word_count'] + TEXT_COLUMNS +
+                                      ['topics', 'regions', 'year', 'publish_date'])
+    table.insert(0, 'digest', pd.Series(digests, dtype='string'))
+    table['parse_status'] = table['parse_status'].astype('category')
+    table['word_count'] = pd.to_numeric(table['word_count'], errors='coerce').astype('Int32')
+    for column in TEXT_COLUMNS:
+        table[column] = table[column].astype('string').replace('', pd.NA)
+    for column in ('topics', 'regions'):
+        table[column] = [value if isinstance(value, list) else [] for value in table[column]]
+    year = table.pop('year')
+    table['publish_date'] = pd.to_datetime(table['publish_date'], errors='coerce', format='ISO8601')
+    table['year'] = pd.to_numeric(year, errors='coerce').astype('Int16')
+
+    if cdx_csv:
+        cdx = pd.read_csv(cdx_csv, usecols=CDX_COLUMNS, dtype='string').drop_duplicates('digest')
+        cdx['timestamp'] = pd.to_datetime(cdx['timestamp'], errors='coerce', format='%Y%m%d%H%M%S')
+        cdx['http_status'] = pd.to_numeric(cdx.pop('status'), errors='coerce').astype('Int16')
+        cdx['length'] = pd.to_numeric(cdx['length'], errors='coerce').astype('Int64')
+        table = table.merge(cdx, on='digest', how='left')
+    return table
+
+def stats_from_table(table):
+    """
+    Count the report stats from a metadata table (for --report-only). Counter
+    keys keep the order values were first seen, as add_row's do, and word
+    counts are sketched per CHUNK_SIZE rows and merged in order, as in
+    analyze_files, so the report is the same as from the rows.
+    """
+    stats = empty_stats()
+    is_parsed = table['parse_status'] == 'parsed'
+    parsed = table[is_parsed]
+    stats['total_files'] = len(table)
+    stats['processed_files'] = len(parsed)
+    word_counts = table['word_count'].where(is_parsed)
+    for start in range(0, len(table), CHUNK_SIZE):
+        partial = StreamStats()
+        for word_count in word_counts.iloc[start:start + CHUNK_SIZE].dropna():
+            partial.add(int(word_count))
+        stats['word_counts'].merge(partial)
+    stats['topics'].update(parsed['primary_topic'].fillna('Unknown').value_counts(sort=False).to_dict())
+    stats['types'].update(parsed['type'].fillna('Unknown').value_counts(sort=False).to_dict())
+    stats['regions'].update(parsed['regions'].explode().fillna('Unknown').value_counts(sort=False).to_dict())
+    stats['years'].update({int(year): count for year, count in parsed['year'].dropna().value_counts(sort=False).items()})
+    return stats
+
+def ranked(counts):
+    """Counter items, largest first; ties keep the order values were first seen"""
+    return sorted(counts.items(), key=lambda item: -item[1])
+
 def generate_report(stats, output_file):
     """Generate a markdown report with enhanced statistics"""
+    total_files = stats['total_files']
+    processed_files = stats['processed_files']
+    word_counts = stats['word_counts']
+    if not word_counts.count:
+        word_counts = StreamStats()
+        word_counts.add(0)  # Report zeros rather than fail on an empty corpus
+
     with open(output_file, 'w', encoding='utf-8') as f:
         f.write("# Brookings Corpus Preliminary Analysis Report\n\n")
-        f.write(f"- **Total HTML files processed**: {stats['total_files']}\n")
-        f.write(f"- **Successfully parsed**: {stats['processed_files']} ({stats['processed_files']/stats['total_files']:.1%})\n\n")
+        f.write(f"- **Total HTML files processed**: {total_files}\n")
+        f.write(f"- **Successfully parsed**: {processed_files} ({processed_files/total_files:.1%})\n\n")
         
         f.write("## Word Count Statistics\n")
-        f.write(f"- **Total words**: {sum(stats['word_counts']):,}\n")
-        f.write(f"- **Average words per article**: {statistics.mean(stats['word_counts']):.1f}\n")
-        f.write(f"- **Median words**: {statistics.median(stats['word_counts'])}\n")
-        f.write(f"- **Shortest article**: {min(stats['word_counts'])} words\n")
-        f.write(f"- **Longest article**: {max(stats['word_counts'])} words\n\n")
+        f.write(f"- **Total words**: {word_counts.total:,}\n")
+        f.write(f"- **Average words per article**: {word_counts.mean():.1f}\n")
+        f.write(f"- **Median words**: {word_counts.quantile(0.5)}\n")
+        f.write(f"- **90th percentile**: {word_counts.quantile(0.9)} words\n")
+        f.write(f"- **99th percentile**: {word_counts.quantile(0.99)} words\n")
+        f.write(f"- **Shortest article**: {word_counts.min} words\n")
+        f.write(f"- **Longest article**: {word_counts.max} words\n\n")
         
         f.write("## Content Distribution\n")
         f.write("### Top 10 Topics\n")
-        for topic, count in sorted(stats['topics'].items(), key=lambda x: -x[1])[:10]:
-            f.write(f"- {topic}: {count} ({count/stats['processed_files']:.1%})\n")
+        for topic, count in ranked(stats['topics'])[:10]:
+            f.write(f"- {topic}: {count} ({count/processed_files:.1%})\n")
         
         f.write("\n### Article Types\n")
-        for type_, count in sorted(stats['types'].items(), key=lambda x: -x[1]):
-            f.write(f"- {type_}: {count} ({count/stats['processed_files']:.1%})\n")
+        for type_, count in ranked(stats['types']):
+            f.write(f"- {type_}: {count} ({count/processed_files:.1%})\n")
         
         f.write("\n### Regions Covered\n")
-        for region, count in sorted(stats['regions'].items(), key=lambda x: -x[1]):
-            if region:  # Skip empty regions
-                f.write(f"- {region}: {count} ({count/stats['processed_files']:.1%})\n")
+        for region, count in ranked(stats['regions']):
+            f.write(f"- {region}: {count} ({count/processed_files:.1%})\n")
         
         f.write("\n## Publication Timeline\n")
         f.write("| Year | Articles | Percentage |\n")
         f.write("|------|---------:|-----------:|\n")
         for year, count in sorted(stats['years'].items()):
-            if year != 'Unknown':
-                f.write(f"| {year} | {count} | {count/stats['processed_files']:.1%} |\n")
+            f.write(f"| {year} | {count} | {count/processed_files:.1%} |\n")
 
 if __name__ == "__main__":
     input_dir = "html_raw"  # Relative to script location
     output_file = "brookings_corpus/data_analysis/preliminary/preliminary_report.md"  # Save in same directory as script
+    cache_file = "brookings_corpus/data_analysis/preliminary/analysis_cache.json"  # Per-document rows from earlier runs
+    metadata_file = "brookings_corpus/data_analysis/preliminary/metadata.parquet"  # Typed metadata table, one row per file
+
+    parser = argparse.ArgumentParser(description="Preliminary analysis of the Brookings HTML corpus")
+    parser.add_argument("--input-dir", default=input_dir, help="Directory of {digest}.html files")
+    parser.add_argument("--output", default=output_file, help="Markdown report to write")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Worker processes (1 = serial; the report is identical either way)")
+    parser.add_argument("--cache", default=cache_file, help="Row cache reused between runs")
+    parser.add_argument("--no-cache", action="store_true", help="Parse every file and leave the cache untouched")
+    parser.add_argument("--cdx-csv", help="CDX CSV (digest, url, timestamp, ...) to join into the metadata table")
+    parser.add_argument("--metadata", default=metadata_file, help="Parquet metadata table to write (or read with --report-only)")
+    parser.add_argument("--report-only", action="store_true", help="Build the report from the saved metadata table")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    exporter = start_metrics_exporter(args, job="preliminary_analysis")
 
-    print(f"Analyzing files in {input_dir}...")
-    stats = analyze_files(input_dir)
-    generate_report(stats, output_file)
-    print(f"Analysis complete. Report saved to {output_file}")
+    if args.report_only:
+        stats = stats_from_table(pd.read_parquet(args.metadata))
+    else:
+        print(f"Analyzing files in {args.input_dir}...")
+        digests, rows, stats = analyze_files(args.input_dir, workers=args.workers,
+                                             cache_file=None if args.no_cache else args.cache)
+        table = build_metadata_table(digests, rows, args.cdx_csv)
+        table.to_parquet(args.metadata, index=False)
+        print(f"Metadata table ({len(table)} rows) saved to {args.metadata}")
+    start = time.perf_counter()
+    generate_report(stats, args.output)
+    METRICS.observe('analysis_report_seconds', time.perf_counter() - start)
+    print(f"Analysis complete. Report saved to {args.output}")
+    if exporter is not None:
+        exporter.stop()
@@ -0,0 +1,132 @@
+"""
+Fixed-memory summary statistics for a stream of numbers.
+
+StreamStats keeps count, sum, min and max exactly, and quantiles (median,
+p90, p99) in a QuantileSketch: a KLL sketch that holds a few hundred values
+however long the stream is. Both merge, so summaries of separate shares of a
+corpus (e.g. from worker processes) can be combined. Merged quantiles depend
+on how the values were split and the order of the merges (the compaction
+coin flips are seeded, so the same split merged in the same order always
+gives the same result); preliminary_analysis therefore fixes both, and its
+report is the same for any --workers.
+
+Quantiles are exact until the sketch first compacts (about SKETCH_K values);
+after that a reported quantile is within roughly 1-2% of the true rank.
+"""
+
+import math
+import random
+
+SKETCH_K = 200  # Size of the top compactor; larger is more accurate and uses more memory
+SKETCH_SEED = 0  # Compaction coin flips are seeded so a report is reproducible
+
+
+class QuantileSketch:
+    """
+    KLL quantile sketch (Karnin, Lang, Liberty 2016).
+
+    Values go into compactor 0. When the sketch is full, the lowest full
+    compactor is sorted and every other value (odd or even positions, by a
+    coin flip) moves up one level, where it stands for twice as many values.
+    Lower levels get geometrically smaller capacities, so the total size
+    stays around 3 * k.
+    """
+
+    def __init__(self, k=SKETCH_K, seed=SKETCH_SEED):
+        self.k = k
+        self.n = 0
+        self.compactors = [[]]
+        self._rng = random.Random(seed)
+
+    def _capacity(self, level):
+        depth = len(self.compactors) - level - 1
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    def _max_size(self):
+        return sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    def _size(self):
+        return sum(len(items) for items in self.compactors)
+
+    def add(self, value):
+        self.compactors[0].append(value)
+        self.n += 1
+        if self._size() >= self._max_size():
+            self._compress()
+
+    def merge(self, other):
+        """Add the values summarized by another sketch into this one."""
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self.n += other.n
+        while self._size() >= self._max_size():
+            self._compress()
+        return self
+
+    def _compress(self):
+        for level in range(len(self.compactors)):
+            items = self.compactors[level]
+            if len(items) < self._capacity(level):
+                continue
+            if level + 1 == len(self.compactors):
+                self.compactors.append([])
+            items.sort()
+            # An odd value out stays behind; the rest halve into the next level.
+            leftover = [items.pop()] if len(items) % 2 else []
+            self.compactors[level + 1].extend(items[self._rng.randint(0, 1)::2])
+            self.compactors[level] = leftover
+            if self._size() < self._max_size():
+                return
+
+    def quantile(self, q):
+        """Return the value at rank q (0..1), or None if the sketch is empty."""
+        if not self.n:
+            return None
+        weighted = sorted(
+            (value, 2 ** level)
+            for level, items in enumerate(self.compactors)
+            for value in items
+        )
+        target = max(1, math.ceil(q * self.n))
+        seen = 0
+        for value, weight in weighted:
+            seen += weight
+            if seen >= target:
+                return value
+        return weighted[-1][0]
+
+
+class StreamStats:
+    """Count, sum, min, max and quantiles of a stream of numbers."""
+
+    def __init__(self, k=SKETCH_K):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.sketch = QuantileSketch(k)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.sketch.add(value)
+
+    def merge(self, other):
+        """Add another StreamStats into this one (in place) and return self."""
+        if other.count:
+            self.count += other.count
+            self.total += other.total
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+            self.sketch.merge(other.sketch)
+        return self
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        return self.sketch.quantile(q)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Script to analyze many saved pages per source, reusing selectors learned per domain.
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import logging
+import argparse
+from datetime import datetime
+
+# Add the parent directory to the path so we can import the utils modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.batch_analyzer import (
+    CHUNK_SIZE, LEARN_PAGES, analyze_pages, load_templates, save_templates, summarize_domains
+)
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def pages_from_sample_file(sample_file):
+    """
+    List the saved samples in a sample analysis file from fetch_sample_content.py.
+
+    Args:
+        sample_file (str): Path to the sample analysis JSON file
+
+    Returns:
+        list: Pages with 'domain', 'url' and 'path'
+    """
+    with open(sample_file, 'r') as f:
+        results = json.load(f)
+
+    pages = []
+    for result in results:
+        for sample in result.get('samples', []):
+            if sample.get('sample_path') and os.path.exists(sample['sample_path']):
+                pages.append({'domain': result['domain'], 'url': sample.get('url'), 'path': sample['sample_path']})
+    return pages
+
+def pages_from_directory(pages_dir):
+    """
+    List the .html files in a directory with one subdirectory per domain
+    (the layout fetch_sample_content.py saves samples in). The pages have no URL.
+
+    Args:
+        pages_dir (str): Directory of per-domain subdirectories
+
+    Returns:
+        list: Pages with 'domain', 'url' and 'path'
+    """
+    pages = []
+    for domain_dir in sorted(glob.glob(os.path.join(pages_dir, '*', ''))):
+        domain = os.path.basename(os.path.dirname(domain_dir))
+        for path in sorted(glob.glob(os.path.join(domain_dir, '*.html'))):
+            pages.append({'domain': domain, 'url': None, 'path': path})
+    return pages
+
+def main():
+    """
+    Main function to batch analyze saved pages.
+    """
+    parser = argparse.ArgumentParser(description='Analyze saved pages per source with per-domain selector templates')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--sample-file', type=str,
+                        help='Sample analysis JSON file from fetch_sample_content.py')
+    source.add_argument('--pages-dir', type=str,
+                        help='Directory with one subdirectory of .html files per domain')
+    parser.add_argument('--output-dir', type=str, default='../data/sample_content',
+                        help='Directory to save the batch analysis')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes')
+    parser.add_argument('--learn-pages', type=int, default=LEARN_PAGES,
+                        help='Pages per domain analyzed in full before its selectors are reused')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help='Pages per worker task')
+    parser.add_argument('--templates', type=str, default=None,
+                        help='JSON file to load learned templates from and save them to')
+    parser.add_argument('--backend', type=str, default='lxml', choices=['lxml', 'bs4'],
+                        help='HTML analyzer backend')
+    args = parser.parse_args()
+
+    # Resolve paths relative to the script location
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    output_dir = os.path.abspath(os.path.join(script_dir, args.output_dir))
+    os.makedirs(output_dir, exist_ok=True)
+
+    if args.sample_file:
+        pages = pages_from_sample_file(os.path.abspath(os.path.join(script_dir, args.sample_file)))
+    else:
+        pages = pages_from_directory(os.path.abspath(os.path.join(script_dir, args.pages_dir)))
+    if not pages:
+        logger.error("No pages to analyze")
+        return
+    logger.info(f"Analyzing {len(pages)} pages from {len({page['domain'] for page in pages})} domains")
+
+    templates_file = os.path.abspath(os.path.join(script_dir, args.templates)) if args.templates else None
+    templates = load_templates(templates_file)
+    if templates:
+        logger.info(f"Loaded templates for {len(templates)} domains from {templates_file}")
+
+    start = time.time()
+    records, templates = analyze_pages(pages, workers=args.workers, learn_pages=args.learn_pages,
+                                       templates=templates, backend=args.backend, chunk_size=args.chunk_size)
+    elapsed = time.time() - start
+    domains = summarize_domains(records, templates)
+
+    if templates_file:
+        save_templates(templates_file, templates)
+        logger.info(f"Saved templates for {len(templates)} domains to {templates_file}")
+
+    # Save detailed results and the per-domain summary as JSON
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    records_output_path = os.path.join(output_dir, f'batch_analysis_{timestamp}.json')
+    with open(records_output_path, 'w') as f:
+        json.dump(records, f, indent=2)
+    logger.info(f"Saved page analyses to {records_output_path}")
+
+    methods = {method: sum(domain['methods'][method] for domain in domains.values())
+               for method in ['full', 'template', 'fallback', 'error']}
+    summary = {
+        'total_pages': len(records),
+        'total_domains': len(domains),
+        'timestamp': timestamp,
+        'elapsed_seconds': elapsed,
+        'methods': methods,
+        'domains': domains
+    }
+    summary_output_path = os.path.join(output_dir, f'batch_summary_{timestamp}.json')
+    with open(summary_output_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    logger.info(f"Saved summary to {summary_output_path}")
+
+    # Print summary to console
+    print("\nBatch Analysis Summary:")
+    print(f"Pages: {len(records)} from {len(domains)} domains in {elapsed:.1f}s ({len(records) / elapsed:.1f} pages/s)")
+    print(f"Full analyses: {methods['full']}, from templates: {methods['template']}, "
+          f"template fallbacks: {methods['fallback']}, errors: {methods['error']}")
+
+    print("\nExtractability by domain:")
+    sorted_domains = sorted(domains.items(), key=lambda x: (x[1]['avg_score'] is None, -(x[1]['avg_score'] or 0)))
+    for domain, data in sorted_domains:
+        score = f"{data['avg_score']:.1f}" if data['avg_score'] is not None else "n/a"
+        print(f"  {domain}: {data['overall_difficulty']} ({score}/90), {data['pages']} pages, "
+              f"{data['methods']['template']} from template, {data['methods']['fallback']} fallbacks")
+
+if __name__ == "__main__":
+    main()
@@ -13,13 +13,21 @@ import pandas as pd
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from bs4 import BeautifulSoup
-from warcio.archiveiterator import ArchiveIterator
 import requests
-import io
 
 # Add the parent directory to the path so we can import the utils modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils.cc_api import get_sample_articles, fetch_warc_record
+# WARC payload decoding is shared with the Brookings extraction scripts
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))),
+        "brookings_corpus",
+        "2_extraction",
+    )
+)
+from utils.cc_api import fetch_warc_record, get_sample_articles
+from warc_payload import MAX_PAYLOAD_BYTES, PayloadTooLarge, read_html_text
+from warc_source import open_warc_source
 from utils.html_analyzer import analyze_html_sample
 
 # Configure logging
@@ -34,7 +42,7 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def fetch_and_analyze_sample(domain, name, crawl_id, sample_count=3):
+def fetch_and_analyze_sample(domain, name, crawl_id, sample_count=3, warc_source=None):
     """
     Fetch and analyze sample articles from a domain.
     
@@ -43,6 +51,7 @@ def fetch_and_analyze_sample(domain, name, crawl_id, sample_count=3):
         name (str): The name of the source
         crawl_id (str): The crawl ID to fetch samples from
         sample_count (int, optional): Number of samples to fetch
+        warc_source (WarcSource, optional): Backend to read WARC records from
         
     Returns:
         dict: Results of the sample fetching and analysis
@@ -73,19 +82,21 @@ def fetch_and_analyze_sample(domain, name, crawl_id, sample_count=3):
                 warc_content = fetch_warc_record(
                     record['filename'],
                     int(record['offset']),
-                    int(record['length'])
+                    int(record['length']),
+                    source=warc_source
                 )
                 
                 if not warc_content:
                     logger.warning(f"Failed to fetch WARC record for {record['url']}")
                     continue
                 
-                # Parse the WARC record to get the HTML content
-                html_content = None
-                for warc_record in ArchiveIterator(io.BytesIO(warc_content)):
-                    if warc_record.rec_type == 'response':
-                        html_content = warc_record.content_stream().read().decode('utf-8', errors='replace')
-                        break
+                # Parse the WARC record to get the HTML content (size-capped, read in chunks)
+                try:
+                    decoded = read_html_text(warc_content, record.get('charset'), MAX_PAYLOAD_BYTES)
+                except PayloadTooLarge as e:
+                    logger.warning(f"Skipping {record['url']}: {e}")
+                    continue
+                html_content, encoding = decoded if decoded else (None, None)
                 
                 if not html_content:
                     logger.warning(f"No HTML content found in WARC record for {record['url']}")
@@ -115,6 +126,7 @@ def fetch_and_analyze_sample(domain, name, crawl_id, sample_count=3):
                     'offset': record['offset'],
                     'length': record['length'],
                     'sample_path': sample_path,
+                    'encoding': encoding,
                     'content_type': analysis_result['analysis']['content_type'],
                     'extractability': analysis_result['analysis']['extractability']['difficulty'],
                     'metadata': analysis_result['analysis']['metadata'],
@@ -168,7 +180,10 @@ def main():
                         help='Number of samples to fetch per source')
     parser.add_argument('--limit', type=int, default=None,
                         help='Limit the number of sources to process (for testing)')
+    parser.add_argument('--warc-source', type=str, default='https',
+                        help='WARC backend: https, s3, s3://bucket/prefix, or a local mirror path / file:// URL')
     args = parser.parse_args()
+    warc_source = open_warc_source(args.warc_source)
     
     # Resolve paths relative to the script location
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -231,7 +246,8 @@ def main():
                 source['domain'], 
                 source['name'], 
                 args.crawl_id,
-                args.sample_count
+                args.sample_count,
+                warc_source
             ): source for source in available_sources
         }
         
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Script to learn a boilerplate template per source from its saved sample pages.
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+
+# Add the parent directory to the path so we can import the utils modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.boilerplate_learner import apply_template, learn_template, load_templates, save_templates
+from batch_analyze import pages_from_directory, pages_from_sample_file
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def read_page(path):
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+def main():
+    """
+    Main function to learn boilerplate templates from saved pages.
+    """
+    parser = argparse.ArgumentParser(description='Learn a boilerplate template per source from its saved sample pages')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--sample-file', type=str,
+                        help='Sample analysis JSON file from fetch_sample_content.py')
+    source.add_argument('--pages-dir', type=str,
+                        help='Directory with one subdirectory of .html files per domain')
+    parser.add_argument('--templates', type=str, default='../data/sample_content/boilerplate_templates.json',
+                        help='JSON file the templates are saved to (templates of other domains in it are kept)')
+    parser.add_argument('--max-pages', type=int, default=20,
+                        help='Pages per domain to learn from')
+    parser.add_argument('--text-dir', type=str, default=None,
+                        help='Directory to write each page\'s text without boilerplate to, one subdirectory per domain')
+    args = parser.parse_args()
+
+    # Resolve paths relative to the script location
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    if args.sample_file:
+        pages = pages_from_sample_file(os.path.abspath(os.path.join(script_dir, args.sample_file)))
+    else:
+        pages = pages_from_directory(os.path.abspath(os.path.join(script_dir, args.pages_dir)))
+    if not pages:
+        logger.error("No pages to learn from")
+        return
+
+    by_domain = {}
+    for page in pages:
+        by_domain.setdefault(page['domain'], []).append(page)
+    logger.info(f"Learning boilerplate templates for {len(by_domain)} domains from {len(pages)} pages")
+
+    templates_file = os.path.abspath(os.path.join(script_dir, args.templates))
+    templates = load_templates(templates_file)
+    text_dir = os.path.abspath(os.path.join(script_dir, args.text_dir)) if args.text_dir else None
+
+    print("\nBoilerplate Templates:")
+    for domain, domain_pages in sorted(by_domain.items()):
+        start = time.time()
+        template = learn_template([read_page(page['path']) for page in domain_pages[:args.max_pages]])
+        elapsed = time.time() - start
+        if template is None:
+            print(f"  {domain}: too few pages ({len(domain_pages)})")
+            continue
+        templates[domain] = template
+        print(f"  {domain}: {len(template['boilerplate'])} boilerplate paths from {template['pages']} pages "
+              f"in {elapsed:.2f}s, {template['kept_share'] * 100:.0f}% of the text kept")
+
+        if text_dir:
+            os.makedirs(os.path.join(text_dir, domain), exist_ok=True)
+            for page in domain_pages:
+                result = apply_template(read_page(page['path']), template)
+                name = os.path.splitext(os.path.basename(page['path']))[0]
+                with open(os.path.join(text_dir, domain, f'{name}.txt'), 'w', encoding='utf-8') as f:
+                    f.write('\n\n'.join(result['paragraphs']) + '\n')
+                if not result['content_found']:
+                    logger.warning(f"{page['path']}: the template's content path is missing")
+
+    os.makedirs(os.path.dirname(templates_file), exist_ok=True)
+    save_templates(templates_file, templates)
+    logger.info(f"Saved boilerplate templates for {len(templates)} domains to {templates_file}")
+
+if __name__ == "__main__":
+    main()
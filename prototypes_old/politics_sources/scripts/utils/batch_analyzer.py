@@ -0,0 +1,331 @@
+"""
+Batch HTML analysis with per-domain selector templates.
+
+Pages from one domain are built from a few templates, so the elements a
+page's title, author, date, breadcrumbs and content are found in have the
+same selectors from page to page. analyze_pages() runs the full analysis on
+the first few pages of each domain, keeps the selectors of the elements each
+field was taken from (HTMLAnalyzer.template_selectors, ranked by how many of
+those pages had them) as the domain's template, and analyzes the rest of the
+domain's pages with HTMLAnalyzer.analyze_with_selectors(), which only looks
+those selectors up.
+
+A field found on every learning page is required; the others (a date that
+only some articles show, say) are optional, and a page without them is
+analyzed from the template with the field not found. A page on which none
+of a required field's selectors gives a candidate gets the full analysis
+instead. The selectors it took its fields from are added to the template
+for the pages after it, and a required field the full analysis did not find
+either becomes optional, so a variant of the template (another author
+block, a missing date) falls back once per chunk of pages rather than on
+every page. Fields come out the same as with the full analysis; a field's
+best candidate is taken from its most common selector rather than from the
+first matching element on the page, so it can differ.
+
+Templates can be saved and loaded again (save_templates/load_templates), so a
+later run skips the learning pages for domains it has already seen.
+"""
+
+import os
+import json
+import logging
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.html_analyzer import DEFAULT_BACKEND, TEMPLATE_FIELDS, difficulty_for_score, make_analyzer
+
+logger = logging.getLogger(__name__)
+
+# Pages per domain analyzed in full before the domain's template is learned
+LEARN_PAGES = 3
+# Pages per task sent to a worker process
+CHUNK_SIZE = 20
+# Bumped when the template format changes, so older template files are ignored
+TEMPLATE_VERSION = 2
+
+METADATA_FIELDS = ['title', 'author', 'date', 'section']
+METHODS = ['full', 'template', 'fallback', 'error']
+
+def learn_template(records):
+    """
+    Learn a domain's template from full analyses of some of its pages.
+
+    Args:
+        records (list): Records of pages of one domain from analyze_page
+            with learn=True
+
+    Returns:
+        dict: The content type, per field the selectors the pages took it
+            from (most common first), and the fields every page had
+            ('required'); None if the pages do not share a content type
+    """
+    content_types = {record['analysis']['content_type'] for record in records}
+    if len(content_types) != 1:
+        return None
+
+    selectors = {}
+    for field in TEMPLATE_FIELDS:
+        # Ties keep the order of the pages
+        counts = Counter(record['template_selectors'][field] for record in records)
+        counts.pop(None, None)
+        selectors[field] = [selector for selector, _ in counts.most_common()]
+
+    return {
+        'content_type': content_types.pop(),
+        'selectors': selectors,
+        'required': [field for field in TEMPLATE_FIELDS
+                     if all(record['template_selectors'][field] is not None for record in records)],
+        'learned_from': len(records)
+    }
+
+def extend_template(template, record):
+    """
+    Add the selectors of a page that fell back to full analysis to a template.
+
+    Args:
+        template (dict): The domain's template
+        record (dict): The page's record, with 'template_selectors'
+
+    Returns:
+        dict: A new template with the page's selectors after the template's
+            own and the required fields the page did not have made
+            optional, or the template itself if the page has another
+            content type or teaches it nothing
+    """
+    if record['analysis']['content_type'] != template['content_type']:
+        return template
+    page_selectors = record['template_selectors']
+    new = {field: selector for field, selector in page_selectors.items()
+           if selector is not None and selector not in template['selectors'].get(field, [])}
+    required = [field for field in template['required'] if page_selectors.get(field) is not None]
+    if not new and required == template['required']:
+        return template
+    selectors = {field: list(field_selectors) for field, field_selectors in template['selectors'].items()}
+    for field, selector in new.items():
+        selectors.setdefault(field, []).append(selector)
+    return dict(template, selectors=selectors, required=required)
+
+def analyze_page(page, template=None, backend=DEFAULT_BACKEND, learn=False):
+    """
+    Analyze one page, from its domain's template if there is one.
+
+    Args:
+        page (dict): 'domain', 'url' and 'path' (an HTML file) of the page
+        template (dict, optional): The domain's template (see learn_template)
+        backend (str, optional): HTMLAnalyzer backend, "lxml" or "bs4"
+        learn (bool, optional): Also record the page's template selectors
+            (always recorded for a fallback)
+
+    Returns:
+        dict: The page with 'method' ("full", "template", "fallback" when
+            the template did not match, or "error"), 'analysis',
+            'recommendations' and 'template_selectors', or 'error'
+    """
+    record = {'domain': page['domain'], 'url': page.get('url'), 'path': page['path']}
+    try:
+        with open(page['path'], 'r', encoding='utf-8', errors='replace') as f:
+            html_content = f.read()
+
+        analyzer = make_analyzer(html_content, page.get('url'), backend)
+        analysis = None
+        if template:
+            analysis = analyzer.analyze_with_selectors(template['selectors'], template['content_type'],
+                                                       template['required'])
+        if analysis is not None:
+            record['method'] = 'template'
+        else:
+            analyzer.analyze()
+            record['method'] = 'fallback' if template else 'full'
+
+        record['analysis'] = analyzer.analysis
+        record['recommendations'] = analyzer.get_extraction_recommendations()
+        if learn or record['method'] == 'fallback':
+            record['template_selectors'] = analyzer.template_selectors()
+
+    except Exception as e:
+        logger.error(f"Error analyzing {page['path']}: {e}")
+        record['method'] = 'error'
+        record['error'] = str(e)
+
+    return record
+
+def _analyze_chunk(task):
+    """Worker entry point: analyze (pages, template, backend, learn), extending the template on fallbacks."""
+    pages, template, backend, learn = task
+    records = []
+    for page in pages:
+        record = analyze_page(page, template, backend, learn)
+        if record['method'] == 'fallback':
+            template = extend_template(template, record)
+        records.append(record)
+    return records
+
+def analyze_pages(pages, workers=1, learn_pages=LEARN_PAGES, templates=None,
+                  backend=DEFAULT_BACKEND, chunk_size=CHUNK_SIZE):
+    """
+    Analyze many pages, learning a selector template per domain.
+
+    The first learn_pages pages of each domain without a template get the
+    full analysis. If they all succeed and share a content type, the
+    domain's template is learned from them and the domain's other pages are
+    analyzed from it. With workers > 1 the pages are analyzed in a process
+    pool, chunk_size pages of one domain per task.
+
+    Args:
+        pages (list): Dicts with 'domain', 'url' (may be None) and 'path'
+        workers (int, optional): Number of worker processes
+        learn_pages (int, optional): Pages per domain to learn a template from
+        templates (dict, optional): Templates by domain from an earlier run
+        backend (str, optional): HTMLAnalyzer backend, "lxml" or "bs4"
+        chunk_size (int, optional): Pages per worker task
+
+    Returns:
+        tuple: (records in the order of pages, see analyze_page; templates
+            by domain, including the ones learned here)
+    """
+    templates = dict(templates or {})
+    by_domain = {}
+    for i, page in enumerate(pages):
+        by_domain.setdefault(page['domain'], []).append(i)
+
+    learning = {domain: indexes[:learn_pages] for domain, indexes in by_domain.items()
+                if domain not in templates}
+    records = [None] * len(pages)
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        _run(pool, pages, records, [(indexes, None, True) for indexes in learning.values()], backend, chunk_size)
+
+        for domain, indexes in learning.items():
+            analyzed = [records[i] for i in indexes if records[i]['method'] == 'full']
+            if len(analyzed) < learn_pages:
+                logger.info(f"Too few pages to learn a template for {domain}")
+                continue
+            template = learn_template(analyzed)
+            if template is None:
+                logger.info(f"No template for {domain}: the first {learn_pages} pages have different content types")
+            else:
+                templates[domain] = template
+
+        jobs = []
+        for domain, indexes in by_domain.items():
+            rest = indexes[len(learning.get(domain, [])):]
+            if rest:
+                jobs.append((rest, templates.get(domain), False))
+        _run(pool, pages, records, jobs, backend, chunk_size)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    # Keep what the fallbacks taught for the next run
+    for record in records:
+        if record['method'] == 'fallback':
+            templates[record['domain']] = extend_template(templates[record['domain']], record)
+
+    return records, templates
+
+def _run(pool, pages, records, jobs, backend, chunk_size):
+    """Analyze the pages of each (indexes, template, learn) job and store their records."""
+    tasks = []
+    positions = []
+    for indexes, template, learn in jobs:
+        for start in range(0, len(indexes), chunk_size):
+            chunk = indexes[start:start + chunk_size]
+            tasks.append(([pages[i] for i in chunk], template, backend, learn))
+            positions.append(chunk)
+
+    results = pool.map(_analyze_chunk, tasks) if pool is not None else map(_analyze_chunk, tasks)
+    for chunk, chunk_records in zip(positions, results):
+        for i, record in zip(chunk, chunk_records):
+            records[i] = record
+
+def summarize_domains(records, templates=None):
+    """
+    Aggregate page analyses per domain.
+
+    Args:
+        records (list): Records from analyze_pages
+        templates (dict, optional): Templates by domain
+
+    Returns:
+        dict: Per domain: page counts by method, the average extractability
+            score and its difficulty level, difficulty and content type
+            counts, the percentage of pages where each field was found, and
+            the domain's template selectors
+    """
+    templates = templates or {}
+    summary = {}
+    for record in records:
+        domain = summary.setdefault(record['domain'], {
+            'pages': 0,
+            'methods': {method: 0 for method in METHODS},
+            'scores': [],
+            'difficulty': {},
+            'content_types': {},
+            'found': {field: 0 for field in METADATA_FIELDS + ['content']}
+        })
+        domain['pages'] += 1
+        domain['methods'][record['method']] += 1
+        if 'analysis' not in record:
+            continue
+
+        analysis = record['analysis']
+        extractability = analysis['extractability']
+        domain['scores'].append(extractability['score'])
+        domain['difficulty'][extractability['difficulty']] = domain['difficulty'].get(extractability['difficulty'], 0) + 1
+        domain['content_types'][analysis['content_type']] = domain['content_types'].get(analysis['content_type'], 0) + 1
+        for field in METADATA_FIELDS:
+            if analysis['metadata'][field]['found']:
+                domain['found'][field] += 1
+        if analysis['content_structure']['content_found']:
+            domain['found']['content'] += 1
+
+    for name, domain in summary.items():
+        scores = domain.pop('scores')
+        analyzed = len(scores)
+        domain['analyzed'] = analyzed
+        domain['avg_score'] = sum(scores) / analyzed if analyzed else None
+        domain['overall_difficulty'] = difficulty_for_score(domain['avg_score']) if analyzed else None
+        domain['found'] = {field: count / analyzed * 100 if analyzed else 0
+                           for field, count in domain['found'].items()}
+        template = templates.get(name)
+        domain['template'] = template['selectors'] if template else None
+
+    return summary
+
+def load_templates(templates_file):
+    """
+    Load templates saved by save_templates.
+
+    Args:
+        templates_file (str): Path to the templates JSON file
+
+    Returns:
+        dict: Templates by domain; empty if the file is missing, unreadable
+            or from another template version
+    """
+    if not templates_file or not os.path.exists(templates_file):
+        return {}
+    try:
+        with open(templates_file, 'r') as f:
+            saved = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring templates file {templates_file}: {e}")
+        return {}
+    if saved.get('version') != TEMPLATE_VERSION:
+        logger.info(f"Ignoring templates file {templates_file}: template version {saved.get('version')}")
+        return {}
+    return saved.get('templates', {})
+
+def save_templates(templates_file, templates):
+    """
+    Save templates by domain to a JSON file (written to a temporary file first).
+
+    Args:
+        templates_file (str): Path to the templates JSON file
+        templates (dict): Templates by domain
+    """
+    tmp_file = f"{templates_file}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump({'version': TEMPLATE_VERSION, 'templates': templates}, f, indent=2)
+    os.replace(tmp_file, templates_file)
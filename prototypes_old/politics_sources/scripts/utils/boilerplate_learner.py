@@ -0,0 +1,336 @@
+"""
+Boilerplate templates learned from a sample of a domain's pages.
+
+Every element of a page gets a path: the tag, id and classes of the element
+and of each of its ancestors ("html/body/div#page/nav.menu"). Pages built
+from the same site template give their navigation, footer, rails and other
+furniture the same paths, and the text under those paths repeats from page
+to page, while the text under the article body's paths changes with every
+page. learn_template() compares the text found under each path across a
+domain's sample pages and marks as boilerplate:
+
+- "repeated": paths whose text is mostly made of pieces that appear on at
+  least half of the pages with that path (nav, footer, newsletter boxes,
+  disclaimers)
+- "links": container paths whose text changes but is mostly link text
+  (related-content rails, "more from" lists)
+
+Only the outermost boilerplate paths are kept, so a template is a short list
+of paths. apply_template() strips them from a page in one pass over its
+elements: a dropped element's subtree is never visited, and the text of
+everything else is collected on the way. No per-page analysis is needed, so
+a new site can be extracted as soon as a few of its pages have been fetched
+(fetch_sample_content.py saves them per domain).
+
+Ids and classes containing digits are left out of paths ("post-1234"), and
+html/body are named by tag alone, since CMSs give them per-page classes.
+"""
+
+import os
+import json
+import re
+import logging
+from collections import Counter
+
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+# A path must have text on this many sample pages to be classified
+MIN_PAGES = 2
+# Share of a path's text made of repeated pieces for it to be boilerplate
+REPEAT_SHARE = 0.8
+# Share of a container's text inside links for it to be a link rail
+LINK_SHARE = 0.5
+# Share of the page's kept text a path must hold to be reported as the content
+CONTENT_SHARE = 0.8
+# Bumped when the template format changes, so older template files are ignored
+TEMPLATE_VERSION = 1
+
+# Never part of the text
+SKIP_TAGS = {'head', 'script', 'style', 'noscript', 'template', 'iframe', 'svg'}
+# Never marked as boilerplate themselves: dropping one would cut a sentence
+INLINE_TAGS = {'a', 'abbr', 'b', 'cite', 'code', 'em', 'i', 'mark', 'q', 's', 'small',
+               'span', 'strong', 'sub', 'sup', 'time', 'u'}
+# Containers that can be link rails
+RAIL_TAGS = {'aside', 'div', 'nav', 'ol', 'section', 'table', 'ul'}
+# Start a new paragraph of the output
+BLOCK_TAGS = {'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt',
+              'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+              'header', 'hr', 'li', 'main', 'nav', 'ol', 'p', 'pre', 'section', 'table',
+              'td', 'th', 'tr', 'ul'}
+
+DIGIT_RE = re.compile(r'\d')
+WHITESPACE_RE = re.compile(r'\s+')
+
+def parse_html(html_content):
+    """
+    Parse a page with lxml's HTML parser.
+
+    Args:
+        html_content (str): HTML content
+
+    Returns:
+        lxml.etree._Element: The root element, or None if the page is empty
+    """
+    parser = etree.HTMLParser(encoding='utf-8', huge_tree=True)
+    return etree.fromstring(html_content.encode('utf-8', errors='replace'), parser)
+
+def element_key(elem):
+    """
+    Name an element by its tag, id and classes, e.g. "div#main.content.wide".
+
+    Args:
+        elem (lxml.etree._Element): The element
+
+    Returns:
+        str: The element's key; ids and classes with digits are left out, and
+            html and body are named by their tag alone
+    """
+    tag = elem.tag
+    if tag in ('html', 'body'):
+        return tag
+    key = tag
+    elem_id = elem.get('id')
+    if elem_id and not DIGIT_RE.search(elem_id):
+        key += f'#{elem_id}'
+    classes = sorted({name for name in (elem.get('class') or '').split() if not DIGIT_RE.search(name)})
+    if classes:
+        key += '.' + '.'.join(classes)
+    return key
+
+def iter_text(root, drop=frozenset()):
+    """
+    Walk a page once, in document order.
+
+    Args:
+        root (lxml.etree._Element): The page's root element
+        drop (set, optional): Paths whose elements are skipped with their
+            subtree (their tail text is kept, it belongs to the parent)
+
+    Yields:
+        tuple: (paths of the element the text is in and of its ancestors,
+            outermost first; the text, or None where a block element starts
+            or ends; whether the text is inside a link)
+    """
+    stack = [(root, (), False)]
+    while stack:
+        item, chain, in_link = stack.pop()
+        if item is None:  # End of a block element
+            yield chain, None, False
+            continue
+        if isinstance(item, str):
+            yield chain, item, in_link
+            continue
+        if item.tail:
+            stack.append((item.tail, chain, in_link))
+        tag = item.tag
+        # Comments and processing instructions have no string tag
+        if not isinstance(tag, str) or tag in SKIP_TAGS:
+            continue
+        path = f'{chain[-1]}/{element_key(item)}' if chain else element_key(item)
+        if path in drop:
+            continue
+        chain = chain + (path,)
+        if tag in BLOCK_TAGS:
+            yield chain, None, False
+            stack.append((None, chain, False))
+        in_link = in_link or tag == 'a'
+        for child in reversed(item):
+            stack.append((child, chain, in_link))
+        if item.text:
+            yield chain, item.text, in_link
+
+def normalize(text):
+    """Collapse runs of whitespace (including non-breaking spaces) to one space."""
+    return WHITESPACE_RE.sub(' ', text.replace('\xa0', ' ')).strip()
+
+def _path_texts(root, drop=frozenset()):
+    """Map each path of a page to [the text pieces under it, characters inside links]."""
+    paths = {}
+    for chain, text, in_link in iter_text(root, drop):
+        if text is None:
+            continue
+        text = normalize(text)
+        if not text:
+            continue
+        for path in chain:
+            entry = paths.get(path)
+            if entry is None:
+                entry = paths[path] = [[], 0]
+            entry[0].append(text)
+            if in_link:
+                entry[1] += len(text)
+    return paths
+
+def _classify(pages_with):
+    """
+    Decide whether a path is boilerplate from its texts on the pages that have it.
+
+    Args:
+        pages_with (list): [text pieces, link characters] per page
+
+    Returns:
+        tuple: (share of the text made of repeated pieces, share of the text
+            inside links), averaged over the pages
+    """
+    # A piece is repeated if it appears on at least half of the pages (and on two)
+    on_pages = Counter(piece for pieces, _ in pages_with for piece in set(pieces))
+    common = max(2, -(-len(pages_with) // 2))
+    repeated = 0.0
+    links = 0.0
+    for pieces, link_chars in pages_with:
+        chars = sum(len(piece) for piece in pieces)
+        repeated += sum(len(piece) for piece in pieces if on_pages[piece] >= common) / chars
+        links += link_chars / chars
+    return repeated / len(pages_with), links / len(pages_with)
+
+def learn_template(pages, min_pages=MIN_PAGES, repeat_share=REPEAT_SHARE, link_share=LINK_SHARE):
+    """
+    Learn a domain's boilerplate template from a sample of its pages.
+
+    Args:
+        pages (list): HTML content of pages of one domain
+        min_pages (int, optional): Pages a path needs text on to be classified
+        repeat_share (float, optional): Share of repeated text that makes a
+            path boilerplate
+        link_share (float, optional): Share of link text that makes a
+            container a link rail
+
+    Returns:
+        dict: 'pages' (pages learned from), 'boilerplate' (outermost
+            boilerplate paths and why: "repeated" or "links"), 'content' (the
+            innermost path holding most of the remaining text, or None) and
+            'kept_share' (average share of a page's text left after
+            stripping); None if fewer than min_pages pages could be parsed
+    """
+    roots = []
+    for html_content in pages:
+        try:
+            root = parse_html(html_content)
+        except (ValueError, etree.LxmlError) as e:
+            logger.warning(f"Skipping unparsable page: {e}")
+            continue
+        if root is not None:
+            roots.append(root)
+    if len(roots) < min_pages:
+        return None
+
+    page_paths = [_path_texts(root) for root in roots]
+    seen = Counter(path for paths in page_paths for path in paths)
+
+    found = {}
+    for path, count in seen.items():
+        tag = path.rsplit('/', 1)[-1].split('.', 1)[0].split('#', 1)[0]
+        if count < min_pages or path in ('html', 'html/body') or tag in INLINE_TAGS:
+            continue
+        repeated, links = _classify([paths[path] for paths in page_paths if path in paths])
+        if repeated >= repeat_share:
+            found[path] = 'repeated'
+        elif links >= link_share and tag in RAIL_TAGS:
+            found[path] = 'links'
+
+    # Paths inside a boilerplate path go with it
+    boilerplate = {}
+    for path in sorted(found):
+        parts = path.split('/')
+        if not any('/'.join(parts[:i]) in boilerplate for i in range(1, len(parts))):
+            boilerplate[path] = found[path]
+
+    # What is left: the share of each page's text under each path
+    drop = frozenset(boilerplate)
+    shares = Counter()
+    kept = []
+    for root, paths in zip(roots, page_paths):
+        total = sum(len(piece) for piece in paths.get('html', [[]])[0])
+        stripped = _path_texts(root, drop)
+        chars = {path: sum(len(piece) for piece in pieces) for path, (pieces, _) in stripped.items()}
+        kept.append(chars.get('html', 0) / total if total else 0)
+        if chars.get('html'):
+            for path, path_chars in chars.items():
+                shares[path] += path_chars / chars['html'] / len(roots)
+    content = max((path for path, share in shares.items() if share >= CONTENT_SHARE),
+                  key=lambda path: path.count('/'), default=None)
+
+    return {
+        'pages': len(roots),
+        'boilerplate': boilerplate,
+        'content': content,
+        'kept_share': sum(kept) / len(kept)
+    }
+
+def apply_template(html_content, template):
+    """
+    Strip a template's boilerplate from a page and return the rest of its text.
+
+    Args:
+        html_content (str): HTML content
+        template (dict): The domain's template from learn_template
+
+    Returns:
+        dict: 'paragraphs' (text of the page without the boilerplate, one
+            string per block) and 'content_found' (whether the page has the
+            template's content path; False also when the template has none)
+    """
+    root = parse_html(html_content)
+    if root is None:
+        return {'paragraphs': [], 'content_found': False}
+
+    content = template.get('content')
+    content_found = False
+    paragraphs = []
+    current = []
+    for chain, text, _ in iter_text(root, frozenset(template['boilerplate'])):
+        if text is None:
+            if current:
+                paragraph = normalize(''.join(current))
+                if paragraph:
+                    paragraphs.append(paragraph)
+                current = []
+            continue
+        current.append(text)
+        if not content_found and content in chain:
+            content_found = True
+    if current:
+        paragraph = normalize(''.join(current))
+        if paragraph:
+            paragraphs.append(paragraph)
+
+    return {'paragraphs': paragraphs, 'content_found': content_found}
+
+def load_templates(templates_file):
+    """
+    Load boilerplate templates saved by save_templates.
+
+    Args:
+        templates_file (str): Path to the templates JSON file
+
+    Returns:
+        dict: Templates by domain; empty if the file is missing, unreadable
+            or from another template version
+    """
+    if not templates_file or not os.path.exists(templates_file):
+        return {}
+    try:
+        with open(templates_file, 'r') as f:
+            saved = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring boilerplate templates file {templates_file}: {e}")
+        return {}
+    if saved.get('version') != TEMPLATE_VERSION:
+        logger.info(f"Ignoring boilerplate templates file {templates_file}: template version {saved.get('version')}")
+        return {}
+    return saved.get('templates', {})
+
+def save_templates(templates_file, templates):
+    """
+    Save boilerplate templates by domain to a JSON file (written to a temporary file first).
+
+    Args:
+        templates_file (str): Path to the templates JSON file
+        templates (dict): Templates by domain
+    """
+    tmp_file = f"{templates_file}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump({'version': TEMPLATE_VERSION, 'templates': templates}, f, indent=2)
+    os.replace(tmp_file, templates_file)
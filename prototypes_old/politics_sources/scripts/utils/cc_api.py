@@ -3,12 +3,24 @@ Common Crawl API utilities for checking source availability and fetching content
 This implementation uses cdx-toolkit for more reliable and polite access to the CDX API.
 """
 
+import os
+import sys
 import json
 import time
 import random
 import logging
 import cdx_toolkit
 
+# WARC byte-range access is shared with the Brookings extraction scripts
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))),
+        "brookings_corpus",
+        "2_extraction",
+    )
+)
+from warc_source import open_warc_source
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -320,6 +332,7 @@ def get_sample_articles(domain, crawl_id, count=5):
                     "url": record.get("url"),
                     "timestamp": record.get("timestamp"),
                     "mime": record.get("mime"),
+                    "charset": record.get("charset"),
                     "status": record.get("status"),
                     "digest": record.get("digest"),
                     "filename": record.get("filename"),
@@ -335,7 +348,7 @@ def get_sample_articles(domain, crawl_id, count=5):
         return []
 
 
-def fetch_warc_record(filename, offset, length):
+def fetch_warc_record(filename, offset, length, source=None):
     """
     Fetch a specific WARC record from Common Crawl.
 
@@ -343,25 +356,22 @@ def fetch_warc_record(filename, offset, length):
         filename (str): The path to the WARC file
         offset (int): The offset of the record within the WARC file
         length (int): The length of the record
+        source (WarcSource, optional): Backend to read from (default: HTTPS)
 
     Returns:
         bytes: The raw content of the WARC record, or None if an error occurred
     """
+    if source is None:
+        source = open_warc_source("https")
+
     # Try multiple times with increasing delays
     max_retries = 5
     retry_delays = [5, 10, 20, 30, 60]  # seconds
 
     for retry in range(max_retries):
         try:
-            # Create a CDX fetcher for Common Crawl
-            # Note: cdx-toolkit doesn't support custom headers, it uses its own User-Agent
-            cdx = cdx_toolkit.CDXFetcher(source="cc")
-
-            # Use cdx-toolkit to fetch the record
             logger.info(f"Fetching WARC record (attempt {retry+1}/{max_retries})")
-            record = cdx.fetch_warc_record(filename, offset, length)
-
-            content = record.content_stream().read()
+            content = source.read_range(filename, offset, length)
             logger.info(f"Successfully fetched WARC record ({len(content)} bytes)")
             return content
 
@@ -1,5 +1,26 @@
 """
 HTML structure analyzer for examining content from political sources.
+
+Two backends produce the same analyze() result:
+
+- "lxml" (default): lxml's C parser, with tag lookups done by lxml and the
+  class/id patterns tested only on elements that carry the attribute.
+- "bs4": BeautifulSoup with html.parser. Used when lxml is not installed or
+  cannot parse a page, or when asked for with backend="bs4".
+
+The analysis itself is written once, against a few tree lookups (_find,
+_find_all, _text, ...) that each backend implements with BeautifulSoup's
+matching rules (multi-valued class/rel attributes, .string for text=,
+script/style text left out of .text). Every document-wide lookup the
+analysis makes is listed in INDEXED_LOOKUPS; one pass over the tree sorts
+each element into all the lookups it matches, and _find/_find_all answer
+from that index instead of walking the tree again. html.parser and lxml repair broken
+markup differently, so a badly nested page can still come out slightly
+different; brookings_corpus/benchmarks/bench_html_analyzer.py compares them.
+
+analyze_with_selectors() analyzes a page from the selectors that
+template_selectors() found on other pages built from the same template (see
+batch_analyzer.py), without building the index.
 """
 
 import re
@@ -9,6 +30,11 @@ from collections import Counter
 from urllib.parse import urlparse
 import json
 
+try:
+    from lxml import etree
+except ImportError:  # BeautifulSoup backend only
+    etree = None
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -16,9 +42,59 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+DEFAULT_BACKEND = "lxml"  # "lxml" or "bs4"
+
+TITLE_CLASS_RE = re.compile(r'article-title|post-title|entry-title|headline')
+AUTHOR_CLASS_RE = re.compile(r'author|byline')
+DATE_CLASS_RE = re.compile(r'date|published|posted|time')
+BODY_CLASS_RE = re.compile(r'article-body|post-content|entry-content|story-body')
+ARTICLE_CLASS_RE = re.compile(r'article|post|entry|story')
+ARTICLE_LINK_RE = re.compile(r'article|story|post|news')
+SECTION_HEADING_RE = re.compile(r'Latest|Top|Featured|News|Opinion')
+NAV_RE = re.compile(r'nav|menu|navigation')
+CARD_CLASS_RE = re.compile(r'card|teaser|thumbnail')
+BREADCRUMB_CLASS_RE = re.compile(r'breadcrumb')
+# The selector forms the analysis reports: "tag", "tag#id", "#id",
+# "tag.class1.class2", ".class1" and "tag[rel='author']"
+SELECTOR_RE = re.compile(r"([\w-]+)?(?:#(.+)|\.(.+)|\[rel='([\w-]+)'\])?")
+# Fields analyze_with_selectors takes from template selectors
+TEMPLATE_FIELDS = ['title', 'author', 'date', 'section', 'content']
+
+# Document-wide lookups answered from the element index, as
+# (tag names, attribute, attribute value or pattern, .string pattern)
+INDEXED_LOOKUPS = [
+    ('title', None, None, None),
+    ('h1', None, None, None),
+    ('time', None, None, None),
+    ('article', None, None, None),
+    ('meta', 'property', 'og:title', None),
+    ('meta', 'name', 'twitter:title', None),
+    ('meta', 'name', 'author', None),
+    ('meta', 'property', 'article:published_time', None),
+    ('meta', 'property', 'article:section', None),
+    ('a', 'href', ARTICLE_LINK_RE, None),
+    (('h2', 'h3'), None, None, SECTION_HEADING_RE),
+    (None, 'rel', 'author', None),
+    (None, 'class', TITLE_CLASS_RE, None),
+    (None, 'id', TITLE_CLASS_RE, None),
+    (None, 'class', AUTHOR_CLASS_RE, None),
+    (('a', 'span', 'div', 'p'), 'class', AUTHOR_CLASS_RE, None),
+    (None, 'class', DATE_CLASS_RE, None),
+    (None, 'class', BODY_CLASS_RE, None),
+    (None, 'id', BODY_CLASS_RE, None),
+    (None, 'class', ARTICLE_CLASS_RE, None),
+    (None, 'class', NAV_RE, None),
+    (None, 'id', NAV_RE, None),
+    (None, 'class', CARD_CLASS_RE, None),
+    (None, 'class', BREADCRUMB_CLASS_RE, None),
+]
+
 class HTMLAnalyzer:
     """
     Analyzes HTML content to determine structure and extractability of key elements.
+
+    This is the BeautifulSoup backend; LxmlHTMLAnalyzer overrides the tree
+    lookups below. Use make_analyzer() to get the configured backend.
     """
     
     def __init__(self, html_content, url=None):
@@ -34,6 +110,155 @@ class HTMLAnalyzer:
         self.domain = urlparse(url).netloc if url else None
         self.soup = BeautifulSoup(html_content, 'html.parser')
         self.analysis = {}
+        self._index = None
+        self._selector_index = None
+    
+    def _find(self, names=None, attr=None, value=None, within=None, string=None):
+        """
+        First element matching names (tag name or list), attribute attr matching
+        value (string or compiled regex) and string (regex on the element's
+        .string), searching the whole document or the descendants of within.
+        """
+        if within is None:
+            found = self._indexed(names, attr, value, string)
+            if found is not None:
+                return found[0] if found else None
+        return self._search_first(names, attr, value, within, string)
+    
+    def _find_all(self, names=None, attr=None, value=None, within=None, string=None):
+        """All elements matching, in document order (see _find)."""
+        if within is None:
+            found = self._indexed(names, attr, value, string)
+            if found is not None:
+                return found
+        return self._search_all(names, attr, value, within, string)
+    
+    def _indexed(self, names, attr, value, string):
+        """Elements for a document-wide lookup from the index, or None if it is not indexed."""
+        if self._index is None:
+            self._index = self._build_index()
+        return self._index.get(_lookup_key(names, attr, value, string))
+    
+    def _build_index(self):
+        """
+        Classify every element against all INDEXED_LOOKUPS in one pass over
+        the document; returns {lookup: [elements in document order]}.
+        """
+        index = {}
+        by_tag = {}  # Tag name lookups without an attribute
+        by_attr = {}  # Attribute lookups, by attribute name
+        for lookup in map(lambda l: _lookup_key(*l), INDEXED_LOOKUPS):
+            index[lookup] = []
+            names, attr, value, string = lookup
+            if attr:
+                by_attr.setdefault(attr, []).append(lookup)
+            else:
+                for name in names:
+                    by_tag.setdefault(name, []).append(lookup)
+        # The patterns have no anchors, so one search with all of an
+        # attribute's patterns rules out most values before they are tested
+        # pattern by pattern.
+        screens = {}
+        for attr, lookups in by_attr.items():
+            patterns = [lookup[2].pattern for lookup in lookups if not isinstance(lookup[2], str)]
+            if patterns:
+                screens[attr] = re.compile('|'.join(f'(?:{pattern})' for pattern in patterns))
+        
+        for elem in self._iter_elements():
+            tag = self._tag(elem)
+            for lookup in by_tag.get(tag, ()):
+                string = lookup[3]
+                if string is None or ((text := self._string(elem)) is not None and string.search(text)):
+                    index[lookup].append(elem)
+            for attr, lookups in by_attr.items():
+                raw = self._attr(elem, attr)
+                if raw is None:
+                    continue
+                screen = screens.get(attr)
+                screened_out = screen is not None and not screen.search(' '.join(raw) if isinstance(raw, list) else raw)
+                for lookup in lookups:
+                    names, _, value, _ = lookup
+                    if screened_out and not isinstance(value, str):
+                        continue
+                    if (names is None or tag in names) and self._attr_matches(elem, attr, value):
+                        index[lookup].append(elem)
+        return index
+    
+    def _iter_elements(self):
+        return self.soup.find_all(True)
+    
+    def _attr_matches(self, elem, attr, value):
+        """BeautifulSoup's attribute test: multi-valued attributes match on any value or all of them."""
+        raw = elem.get(attr)
+        if raw is None:
+            return False
+        candidates = raw + [' '.join(raw)] if isinstance(raw, list) else [raw]
+        if isinstance(value, str):
+            return value in candidates
+        return any(value.search(candidate) for candidate in candidates)
+    
+    def _string(self, elem):
+        return elem.string
+    
+    def _search_first(self, names, attr, value, within, string):
+        scope = self.soup if within is None else within
+        return scope.find(names, attrs={attr: value} if attr else {}, string=string)
+    
+    def _search_all(self, names, attr, value, within, string):
+        scope = self.soup if within is None else within
+        return scope.find_all(names, attrs={attr: value} if attr else {}, string=string)
+    
+    def _title(self):
+        return self._find('title')
+    
+    def _select(self, selector):
+        """
+        First element matching one of the selectors the analysis reports (see
+        SELECTOR_RE), or None. Class selectors match elements that have all
+        of the classes, as in CSS.
+        """
+        match = SELECTOR_RE.fullmatch(selector)
+        if not match or not any(match.groups()):
+            return None
+        tag, elem_id, classes, rel = match.groups()
+        if rel:
+            return self._search_first(tag, 'rel', rel, None, None)
+        if self._selector_index is None:
+            self._selector_index = self._build_selector_index()
+        wanted = classes.split('.') if classes else []
+        if elem_id:
+            candidates = self._selector_index.get(('id', elem_id), [])
+        elif wanted:
+            candidates = self._selector_index.get(('class', wanted[0]), [])
+        else:
+            candidates = self._selector_index.get(('tag', tag), [])
+        for elem in candidates:
+            if (tag is None or self._tag(elem) == tag) and set(wanted).issubset(self._classes(elem) or ()):
+                return elem
+        return None
+    
+    def _build_selector_index(self):
+        """Elements by ('tag', name), ('id', id) and ('class', class name), in one pass over the document."""
+        index = {}
+        for elem in self._iter_elements():
+            index.setdefault(('tag', self._tag(elem)), []).append(elem)
+            if self._attr(elem, 'id') is not None:
+                index.setdefault(('id', self._attr(elem, 'id')), []).append(elem)
+            for name in self._classes(elem) or ():
+                index.setdefault(('class', name), []).append(elem)
+        return index
+    
+    def _text(self, elem):
+        return elem.text
+    
+    def _tag(self, elem):
+        return elem.name
+    
+    def _attr(self, elem, name):
+        return elem.get(name)
+    
+    def _classes(self, elem):
+        return elem.get('class')
     
     def analyze(self):
         """
@@ -47,12 +272,164 @@ class HTMLAnalyzer:
             "domain": self.domain,
             "content_type": self._determine_content_type(),
             "metadata": self._analyze_metadata(),
-            "content_structure": self._analyze_content_structure(),
-            "extractability": self._assess_extractability()
+            "content_structure": self._analyze_content_structure()
+        }
+        # Scored from the results above, so it has to come after them
+        self.analysis["extractability"] = self._assess_extractability()
+        
+        return self.analysis
+    
+    def analyze_with_selectors(self, selectors, content_type, required=None):
+        """
+        Analyze a page built from a known template by looking up the
+        template's selectors instead of searching the page for every pattern.
+        
+        Meta tags and the URL are read as in analyze(). For the title, author,
+        date, section and content, the first of the field's selectors whose
+        element gives a candidate is used. A field without selectors is not
+        looked for beyond the meta tags and URL, and neither is an optional
+        field none of whose selectors gives a candidate.
+        
+        Args:
+            selectors (dict): Per field, selectors to try in order (see
+                template_selectors)
+            content_type (str): The template's content type
+            required (list, optional): Fields the page must give a candidate
+                for from their selectors; the others are optional. Defaults
+                to every field with selectors
+        
+        Returns:
+            dict: Analysis results like analyze(), or None if none of a
+                required field's selectors gives a candidate on this page
+        """
+        found = {}
+        for field in TEMPLATE_FIELDS:
+            found[field] = (None, [])
+            for selector in selectors.get(field, []):
+                elem = self._select(selector)
+                candidates = self._template_candidates(field, selector, elem) if elem is not None else []
+                if candidates:
+                    found[field] = (selector, candidates)
+                    break
+            else:
+                if selectors.get(field) and (required is None or field in required):
+                    return None
+        
+        metadata = {}
+        
+        title = self._search_first('title', None, None, None, None)
+        og_title = self._search_first('meta', 'property', 'og:title', None, None)
+        twitter_title = self._search_first('meta', 'name', 'twitter:title', None, None)
+        title_candidates = [
+            self._text(title).strip() if title is not None else None,
+            self._attr(og_title, 'content') if og_title is not None else None,
+            self._attr(twitter_title, 'content') if twitter_title is not None else None,
+        ]
+        title_candidates = [t for t in title_candidates if t] + found['title'][1]
+        
+        metadata_tags = {
+            'author': self._search_first('meta', 'name', 'author', None, None),
+            'date': self._search_first('meta', 'property', 'article:published_time', None, None),
+            'section': self._search_first('meta', 'property', 'article:section', None, None)
+        }
+        field_candidates = {'title': title_candidates}
+        for field, meta in metadata_tags.items():
+            field_candidates[field] = []
+            if meta is not None and self._attr(meta, 'content'):
+                field_candidates[field].append(self._attr(meta, 'content'))
+            field_candidates[field].extend(found[field][1])
+        field_candidates['section'].extend(self._sections_from_url())
+        
+        for field, candidates in field_candidates.items():
+            metadata[field] = {
+                'found': len(candidates) > 0,
+                'candidates': candidates,
+                'best_candidate': candidates[0] if candidates else None,
+                'selectors': [found[field][0]] if found[field][0] else []
+            }
+        
+        container = found['content'][1][0] if found['content'][1] else None
+        self.analysis = {
+            "url": self.url,
+            "domain": self.domain,
+            "content_type": content_type,
+            "metadata": metadata,
+            "content_structure": (self._describe_container(container) if container is not None
+                                  else self._empty_content_structure())
         }
+        self.analysis["extractability"] = self._assess_extractability()
         
         return self.analysis
     
+    def template_selectors(self):
+        """
+        Selectors of the elements the analysis took each field from, for
+        analyze_with_selectors on other pages of the same template.
+        
+        Returns:
+            dict: Per field ('title', 'author', 'date', 'section', 'content'),
+                the selector of the first element that gave a candidate, or
+                None if the field came only from meta tags or the URL or was
+                not found
+        """
+        if not self.analysis:
+            self.analyze()
+        
+        sources = {
+            'title': [self._find('h1'), self._find(attr='class', value=TITLE_CLASS_RE)],
+            'author': self._find_all(['a', 'span', 'div', 'p'], attr='class', value=AUTHOR_CLASS_RE),
+            'date': self._find_all('time') + self._find_all(attr='class', value=DATE_CLASS_RE),
+            'section': [self._find(attr='class', value=BREADCRUMB_CLASS_RE)]
+        }
+        rel_author = self._find(attr='rel', value="author")
+        
+        selectors = {}
+        for field, elems in sources.items():
+            candidates = (self._selector_for(elem) for elem in elems if elem is not None)
+            selectors[field] = next((selector for selector in candidates
+                                     if self._template_candidates(field, selector, self._select(selector))), None)
+        if selectors['author'] is None and rel_author is not None:
+            selectors['author'] = f"{self._tag(rel_author)}[rel='author']"
+        content_selectors = self.analysis['content_structure']['content_selectors']
+        selectors['content'] = content_selectors[0] if content_selectors else None
+        
+        return selectors
+    
+    def _selector_for(self, elem):
+        """Selector for an element: tag and classes, tag and id, or the tag alone."""
+        if self._classes(elem):
+            return f"{self._tag(elem)}.{'.'.join(self._classes(elem))}"
+        if self._attr(elem, 'id'):
+            return f"{self._tag(elem)}#{self._attr(elem, 'id')}"
+        return self._tag(elem)
+    
+    def _template_candidates(self, field, selector, elem):
+        """
+        Candidates the element a template selector matched gives for a
+        field, by the rules analyze() applies to that kind of element.
+        
+        Returns:
+            list: The candidates (the element itself for 'content'); empty
+                if there are none
+        """
+        if elem is None:
+            return []
+        if field == 'content':
+            return [elem]
+        if field == 'section':
+            return [self._text(link).strip() for link in self._find_all('a', within=elem)]
+        if field == 'author' and selector.endswith("[rel='author']"):
+            return [self._text(elem).strip()]
+        if field == 'date' and self._tag(elem) == 'time':
+            text = self._attr(elem, 'datetime') or self._text(elem).strip()
+            return [text] if text else []
+        text = self._text(elem).strip()
+        if field == 'author' and (self._tag(elem) not in ('a', 'span', 'div', 'p') or len(text) >= 100):
+            return []
+        if field == 'date' and len(text) >= 50:
+            return []
+        return [text] if text else []
+    
     def _determine_content_type(self):
         """
         Determine if the page is an article, homepage, section page, etc.
@@ -63,21 +440,21 @@ class HTMLAnalyzer:
         # Check for common article indicators
         article_indicators = [
             # Title patterns
-            self.soup.find('h1'),
-            self.soup.find(class_=re.compile(r'article-title|post-title|entry-title|headline')),
-            self.soup.find(id=re.compile(r'article-title|post-title|entry-title|headline')),
+            self._find('h1'),
+            self._find(attr='class', value=TITLE_CLASS_RE),
+            self._find(attr='id', value=TITLE_CLASS_RE),
             
             # Author patterns
-            self.soup.find(class_=re.compile(r'author|byline')),
-            self.soup.find(rel="author"),
+            self._find(attr='class', value=AUTHOR_CLASS_RE),
+            self._find(attr='rel', value="author"),
             
             # Date patterns
-            self.soup.find(class_=re.compile(r'date|published|posted|time')),
-            self.soup.find('time'),
+            self._find(attr='class', value=DATE_CLASS_RE),
+            self._find('time'),
             
             # Content patterns
-            self.soup.find(class_=re.compile(r'article-body|post-content|entry-content|story-body')),
-            self.soup.find(id=re.compile(r'article-body|post-content|entry-content|story-body'))
+            self._find(attr='class', value=BODY_CLASS_RE),
+            self._find(attr='id', value=BODY_CLASS_RE)
         ]
         
         # Count how many article indicators we found
@@ -86,17 +463,17 @@ class HTMLAnalyzer:
         # Check for homepage indicators
         homepage_indicators = [
             # Multiple article links
-            len(self.soup.find_all('a', href=re.compile(r'article|story|post|news'))) > 5,
+            len(self._find_all('a', attr='href', value=ARTICLE_LINK_RE)) > 5,
             
             # Section headings
-            len(self.soup.find_all(['h2', 'h3'], text=re.compile(r'Latest|Top|Featured|News|Opinion'))) > 0,
+            len(self._find_all(['h2', 'h3'], string=SECTION_HEADING_RE)) > 0,
             
             # Navigation elements
-            self.soup.find(class_=re.compile(r'nav|menu|navigation')),
-            self.soup.find(id=re.compile(r'nav|menu|navigation')),
+            self._find(attr='class', value=NAV_RE) is not None,
+            self._find(attr='id', value=NAV_RE) is not None,
             
             # Multiple cards or teasers
-            len(self.soup.find_all(class_=re.compile(r'card|teaser|thumbnail'))) > 3
+            len(self._find_all(attr='class', value=CARD_CLASS_RE)) > 3
         ]
         
         # Count how many homepage indicators we found
@@ -124,13 +501,17 @@ class HTMLAnalyzer:
         metadata = {}
         
         # Title analysis
+        title = self._title()
+        og_title = self._find('meta', attr='property', value='og:title')
+        twitter_title = self._find('meta', attr='name', value='twitter:title')
+        h1 = self._find('h1')
+        title_elem = self._find(attr='class', value=TITLE_CLASS_RE)
         title_candidates = [
-            self.soup.title.text.strip() if self.soup.title else None,
-            self.soup.find('meta', property='og:title').get('content') if self.soup.find('meta', property='og:title') else None,
-            self.soup.find('meta', name='twitter:title').get('content') if self.soup.find('meta', name='twitter:title') else None,
-            self.soup.find('h1').text.strip() if self.soup.find('h1') else None,
-            self.soup.find(class_=re.compile(r'article-title|post-title|entry-title|headline')).text.strip() 
-                if self.soup.find(class_=re.compile(r'article-title|post-title|entry-title|headline')) else None,
+            self._text(title).strip() if title is not None else None,
+            self._attr(og_title, 'content') if og_title is not None else None,
+            self._attr(twitter_title, 'content') if twitter_title is not None else None,
+            self._text(h1).strip() if h1 is not None else None,
+            self._text(title_elem).strip() if title_elem is not None else None,
         ]
         
         title_candidates = [t for t in title_candidates if t]
@@ -146,20 +527,20 @@ class HTMLAnalyzer:
         author_candidates = []
         
         # Check meta tags
-        meta_author = self.soup.find('meta', attrs={'name': 'author'})
-        if meta_author and meta_author.get('content'):
-            author_candidates.append(meta_author.get('content'))
+        meta_author = self._find('meta', attr='name', value='author')
+        if meta_author is not None and self._attr(meta_author, 'content'):
+            author_candidates.append(self._attr(meta_author, 'content'))
         
         # Check for author elements
-        for author_elem in self.soup.find_all(['a', 'span', 'div', 'p'], class_=re.compile(r'author|byline')):
-            author_text = author_elem.text.strip()
+        for author_elem in self._find_all(['a', 'span', 'div', 'p'], attr='class', value=AUTHOR_CLASS_RE):
+            author_text = self._text(author_elem).strip()
             if author_text and len(author_text) < 100:  # Avoid capturing large blocks
                 author_candidates.append(author_text)
         
         # Check for rel="author"
-        rel_author = self.soup.find(rel="author")
-        if rel_author:
-            author_candidates.append(rel_author.text.strip())
+        rel_author = self._find(attr='rel', value="author")
+        if rel_author is not None:
+            author_candidates.append(self._text(rel_author).strip())
         
         metadata['author'] = {
             'found': len(author_candidates) > 0,
@@ -172,20 +553,20 @@ class HTMLAnalyzer:
         date_candidates = []
         
         # Check meta tags
-        meta_date = self.soup.find('meta', property='article:published_time')
-        if meta_date and meta_date.get('content'):
-            date_candidates.append(meta_date.get('content'))
+        meta_date = self._find('meta', attr='property', value='article:published_time')
+        if meta_date is not None and self._attr(meta_date, 'content'):
+            date_candidates.append(self._attr(meta_date, 'content'))
         
         # Check for time elements
-        for time_elem in self.soup.find_all('time'):
-            if time_elem.get('datetime'):
-                date_candidates.append(time_elem.get('datetime'))
-            elif time_elem.text.strip():
-                date_candidates.append(time_elem.text.strip())
+        for time_elem in self._find_all('time'):
+            if self._attr(time_elem, 'datetime'):
+                date_candidates.append(self._attr(time_elem, 'datetime'))
+            elif self._text(time_elem).strip():
+                date_candidates.append(self._text(time_elem).strip())
         
         # Check for date classes
-        for date_elem in self.soup.find_all(class_=re.compile(r'date|published|posted|time')):
-            date_text = date_elem.text.strip()
+        for date_elem in self._find_all(attr='class', value=DATE_CLASS_RE):
+            date_text = self._text(date_elem).strip()
             if date_text and len(date_text) < 50:  # Avoid capturing large blocks
                 date_candidates.append(date_text)
         
@@ -200,24 +581,18 @@ class HTMLAnalyzer:
         section_candidates = []
         
         # Check meta tags
-        meta_section = self.soup.find('meta', property='article:section')
-        if meta_section and meta_section.get('content'):
-            section_candidates.append(meta_section.get('content'))
+        meta_section = self._find('meta', attr='property', value='article:section')
+        if meta_section is not None and self._attr(meta_section, 'content'):
+            section_candidates.append(self._attr(meta_section, 'content'))
         
         # Check for breadcrumbs
-        breadcrumbs = self.soup.find(class_=re.compile(r'breadcrumb'))
-        if breadcrumbs:
-            for link in breadcrumbs.find_all('a'):
-                section_candidates.append(link.text.strip())
+        breadcrumbs = self._find(attr='class', value=BREADCRUMB_CLASS_RE)
+        if breadcrumbs is not None:
+            for link in self._find_all('a', within=breadcrumbs):
+                section_candidates.append(self._text(link).strip())
         
         # Check URL for section info
-        if self.url:
-            url_parts = self.url.split('/')
-            for section_indicator in ['category', 'section', 'topic', 'tag']:
-                if section_indicator in url_parts:
-                    idx = url_parts.index(section_indicator)
-                    if idx + 1 < len(url_parts) and url_parts[idx + 1]:
-                        section_candidates.append(url_parts[idx + 1].replace('-', ' ').replace('_', ' ').title())
+        section_candidates.extend(self._sections_from_url())
         
         metadata['section'] = {
             'found': len(section_candidates) > 0,
@@ -228,6 +603,18 @@ class HTMLAnalyzer:
         
         return metadata
     
+    def _sections_from_url(self):
+        """Section names from /category/, /section/, /topic/ and /tag/ URL segments."""
+        sections = []
+        if self.url:
+            url_parts = self.url.split('/')
+            for section_indicator in ['category', 'section', 'topic', 'tag']:
+                if section_indicator in url_parts:
+                    idx = url_parts.index(section_indicator)
+                    if idx + 1 < len(url_parts) and url_parts[idx + 1]:
+                        sections.append(url_parts[idx + 1].replace('-', ' ').replace('_', ' ').title())
+        return sections
+    
     def _analyze_content_structure(self):
         """
         Analyze the structure of the main content.
@@ -235,60 +622,75 @@ class HTMLAnalyzer:
         Returns:
             dict: Content structure analysis
         """
-        structure = {}
-        
         # Find potential content containers
         content_containers = [
-            self.soup.find(class_=re.compile(r'article-body|post-content|entry-content|story-body')),
-            self.soup.find(id=re.compile(r'article-body|post-content|entry-content|story-body')),
-            self.soup.find('article'),
-            self.soup.find(class_=re.compile(r'article|post|entry|story'))
+            self._find(attr='class', value=BODY_CLASS_RE),
+            self._find(attr='id', value=BODY_CLASS_RE),
+            self._find('article'),
+            self._find(attr='class', value=ARTICLE_CLASS_RE)
         ]
         
         # Filter out None values
-        content_containers = [c for c in content_containers if c]
+        content_containers = [c for c in content_containers if c is not None]
         
         if not content_containers:
-            structure['content_found'] = False
-            structure['content_selectors'] = []
-            structure['paragraph_count'] = 0
-            structure['has_images'] = False
-            structure['has_links'] = False
-            structure['has_blockquotes'] = False
-            structure['has_lists'] = False
-            structure['has_tables'] = False
-            structure['has_iframes'] = False
-            return structure
+            return self._empty_content_structure()
         
         # Use the first container found
-        container = content_containers[0]
+        return self._describe_container(content_containers[0])
+    
+    def _empty_content_structure(self):
+        """Content structure of a page without a content container."""
+        structure = {}
+        structure['content_found'] = False
+        structure['content_selectors'] = []
+        structure['paragraph_count'] = 0
+        structure['has_images'] = False
+        structure['has_links'] = False
+        structure['has_blockquotes'] = False
+        structure['has_lists'] = False
+        structure['has_tables'] = False
+        structure['has_iframes'] = False
+        return structure
+    
+    def _describe_container(self, container):
+        """
+        Content structure of a page with the given content container.
+        
+        Args:
+            container: The main content element
+            
+        Returns:
+            dict: Content structure analysis
+        """
+        structure = {}
         
         # Get selectors for the container
         selectors = []
-        if container.get('id'):
-            selectors.append(f"#{container.get('id')}")
-        if container.get('class'):
-            selectors.append(f".{'.'.join(container.get('class'))}")
+        if self._attr(container, 'id'):
+            selectors.append(f"#{self._attr(container, 'id')}")
+        if self._classes(container):
+            selectors.append(f".{'.'.join(self._classes(container))}")
         if not selectors:
-            selectors.append(container.name)
+            selectors.append(self._tag(container))
         
         # Count paragraphs
-        paragraphs = container.find_all('p')
+        paragraphs = self._find_all('p', within=container)
         
         # Check for various content elements
         structure['content_found'] = True
         structure['content_selectors'] = selectors
         structure['paragraph_count'] = len(paragraphs)
-        structure['has_images'] = len(container.find_all('img')) > 0
-        structure['has_links'] = len(container.find_all('a')) > 0
-        structure['has_blockquotes'] = len(container.find_all('blockquote')) > 0
-        structure['has_lists'] = len(container.find_all(['ul', 'ol'])) > 0
-        structure['has_tables'] = len(container.find_all('table')) > 0
-        structure['has_iframes'] = len(container.find_all('iframe')) > 0
+        structure['has_images'] = self._find('img', within=container) is not None
+        structure['has_links'] = self._find('a', within=container) is not None
+        structure['has_blockquotes'] = self._find('blockquote', within=container) is not None
+        structure['has_lists'] = self._find(['ul', 'ol'], within=container) is not None
+        structure['has_tables'] = self._find('table', within=container) is not None
+        structure['has_iframes'] = self._find('iframe', within=container) is not None
         
         # Analyze text content
         if paragraphs:
-            text_content = ' '.join(p.text.strip() for p in paragraphs)
+            text_content = ' '.join(self._text(p).strip() for p in paragraphs)
             structure['text_length'] = len(text_content)
             structure['word_count'] = len(text_content.split())
             structure['avg_paragraph_length'] = structure['word_count'] / len(paragraphs)
@@ -340,18 +742,8 @@ class HTMLAnalyzer:
             if word_count < 100:
                 score -= 10
         
-        # Determine difficulty level
-        if score >= 80:
-            difficulty = "easy"
-        elif score >= 60:
-            difficulty = "moderate"
-        elif score >= 40:
-            difficulty = "challenging"
-        else:
-            difficulty = "difficult"
-        
         extractability['score'] = score
-        extractability['difficulty'] = difficulty
+        extractability['difficulty'] = difficulty_for_score(score)
         extractability['metadata_complete'] = metadata_found
         extractability['content_extractable'] = content_found
         extractability['missing_elements'] = []
@@ -382,54 +774,54 @@ class HTMLAnalyzer:
         
         if element_type == 'title':
             # Check for h1
-            h1 = self.soup.find('h1')
-            if h1:
-                if h1.get('id'):
-                    selectors.append(f"h1#{h1.get('id')}")
-                elif h1.get('class'):
-                    selectors.append(f"h1.{'.'.join(h1.get('class'))}")
+            h1 = self._find('h1')
+            if h1 is not None:
+                if self._attr(h1, 'id'):
+                    selectors.append(f"h1#{self._attr(h1, 'id')}")
+                elif self._classes(h1):
+                    selectors.append(f"h1.{'.'.join(self._classes(h1))}")
                 else:
                     selectors.append("h1")
             
             # Check for title classes
-            title_elem = self.soup.find(class_=re.compile(r'article-title|post-title|entry-title|headline'))
-            if title_elem:
-                if title_elem.get('class'):
-                    selectors.append(f"{title_elem.name}.{'.'.join(title_elem.get('class'))}")
+            title_elem = self._find(attr='class', value=TITLE_CLASS_RE)
+            if title_elem is not None:
+                if self._classes(title_elem):
+                    selectors.append(f"{self._tag(title_elem)}.{'.'.join(self._classes(title_elem))}")
         
         elif element_type == 'author':
             # Check for author classes
-            author_elem = self.soup.find(class_=re.compile(r'author|byline'))
-            if author_elem:
-                if author_elem.get('class'):
-                    selectors.append(f"{author_elem.name}.{'.'.join(author_elem.get('class'))}")
+            author_elem = self._find(attr='class', value=AUTHOR_CLASS_RE)
+            if author_elem is not None:
+                if self._classes(author_elem):
+                    selectors.append(f"{self._tag(author_elem)}.{'.'.join(self._classes(author_elem))}")
             
             # Check for rel="author"
-            rel_author = self.soup.find(rel="author")
-            if rel_author:
-                selectors.append(f"{rel_author.name}[rel='author']")
+            rel_author = self._find(attr='rel', value="author")
+            if rel_author is not None:
+                selectors.append(f"{self._tag(rel_author)}[rel='author']")
         
         elif element_type == 'date':
             # Check for time element
-            time_elem = self.soup.find('time')
-            if time_elem:
-                if time_elem.get('class'):
-                    selectors.append(f"time.{'.'.join(time_elem.get('class'))}")
+            time_elem = self._find('time')
+            if time_elem is not None:
+                if self._classes(time_elem):
+                    selectors.append(f"time.{'.'.join(self._classes(time_elem))}")
                 else:
                     selectors.append("time")
             
             # Check for date classes
-            date_elem = self.soup.find(class_=re.compile(r'date|published|posted|time'))
-            if date_elem:
-                if date_elem.get('class'):
-                    selectors.append(f"{date_elem.name}.{'.'.join(date_elem.get('class'))}")
+            date_elem = self._find(attr='class', value=DATE_CLASS_RE)
+            if date_elem is not None:
+                if self._classes(date_elem):
+                    selectors.append(f"{self._tag(date_elem)}.{'.'.join(self._classes(date_elem))}")
         
         elif element_type == 'section':
             # Check for breadcrumbs
-            breadcrumbs = self.soup.find(class_=re.compile(r'breadcrumb'))
-            if breadcrumbs:
-                if breadcrumbs.get('class'):
-                    selectors.append(f"{breadcrumbs.name}.{'.'.join(breadcrumbs.get('class'))}")
+            breadcrumbs = self._find(attr='class', value=BREADCRUMB_CLASS_RE)
+            if breadcrumbs is not None:
+                if self._classes(breadcrumbs):
+                    selectors.append(f"{self._tag(breadcrumbs)}.{'.'.join(self._classes(breadcrumbs))}")
         
         return selectors
     
@@ -519,18 +911,251 @@ class HTMLAnalyzer:
         
         return recommendations
 
-def analyze_html_sample(html_content, url=None):
+class LxmlHTMLAnalyzer(HTMLAnalyzer):
+    """
+    HTMLAnalyzer on an lxml tree.
+
+    The element index is built over lxml's iterator with BeautifulSoup's
+    matching rules. Lookups outside the index use lxml's iterators, and
+    attribute lookups start from a compiled XPath that selects only the
+    elements carrying the attribute.
+
+    Raises:
+        ValueError: If lxml is not installed or the page does not parse
+    """
+    
+    # BeautifulSoup keeps the strings inside these tags out of .text
+    STRING_CONTAINERS = ('script', 'style', 'template', 'rt', 'rp')
+    # ... and collapses whitespace-only strings to "\n" or " " outside these
+    PRESERVE_WHITESPACE = ('pre', 'textarea')
+    ASCII_SPACES = ' \n\t\f\r'
+    # Attributes BeautifulSoup splits into a list of values, and for which tags (None: all)
+    MULTI_VALUED = {'class': None, 'rel': ('a', 'link', 'area')}
+    _attr_xpaths = {}
+    _select_xpaths = {}
+    
+    def __init__(self, html_content, url=None):
+        if etree is None:
+            raise ValueError("lxml is not installed")
+        self.html = html_content
+        self.url = url
+        self.domain = urlparse(url).netloc if url else None
+        parser = etree.HTMLParser(encoding='utf-8', huge_tree=True)
+        self.root = etree.fromstring(html_content.encode('utf-8', errors='replace'), parser)
+        if self.root is None:
+            raise ValueError("lxml could not parse the document")
+        self.analysis = {}
+        self._index = None
+        self._selector_index = None
+    
+    @classmethod
+    def _attr_xpath(cls, attr, include_self):
+        key = (attr, include_self)
+        if key not in cls._attr_xpaths:
+            axis = 'descendant-or-self' if include_self else 'descendant'
+            cls._attr_xpaths[key] = etree.XPath(f'{axis}::*[@{attr}]')
+        return cls._attr_xpaths[key]
+    
+    def _select(self, selector):
+        # Template selectors are looked up on every page of a domain, so each
+        # form compiles to an XPath that lets libxml2 find the candidates;
+        # they are then checked with BeautifulSoup's rules as usual.
+        match = SELECTOR_RE.fullmatch(selector)
+        if not match or not any(match.groups()):
+            return None
+        tag, elem_id, classes, rel = match.groups()
+        wanted = classes.split('.') if classes else []
+        key = (tag, elem_id is not None, len(wanted), rel is not None)
+        if key not in self._select_xpaths:
+            conditions = ['@id=$id'] if elem_id is not None else []
+            conditions += [f"contains(concat(' ', normalize-space(@class), ' '), $c{i})" for i in range(len(wanted))]
+            if rel is not None:
+                conditions.append("contains(concat(' ', normalize-space(@rel), ' '), $rel)")
+            predicate = f"[{' and '.join(conditions)}]" if conditions else ''
+            try:
+                self._select_xpaths[key] = etree.XPath(f"descendant-or-self::{tag or '*'}{predicate}")
+            except etree.XPathSyntaxError:
+                self._select_xpaths[key] = None
+        xpath = self._select_xpaths[key]
+        if xpath is None:
+            return super()._select(selector)
+        variables = {f'c{i}': f' {name} ' for i, name in enumerate(wanted)}
+        if elem_id is not None:
+            variables['id'] = elem_id
+        if rel is not None:
+            variables['rel'] = f' {rel} '
+        for elem in xpath(self.root, **variables):
+            if (set(wanted).issubset(self._classes(elem) or ())
+                    and (rel is None or self._attr_matches(elem, 'rel', rel))):
+                return elem
+        return None
+    
+    def _attr_matches(self, elem, attr, value):
+        raw = elem.get(attr)
+        if raw is None:
+            return False
+        # Cheap rejection: the patterns here have no anchors, so a value that
+        # matches one of the tokens also matches the raw attribute.
+        if not isinstance(value, str) and not value.search(raw):
+            return False
+        tags = self.MULTI_VALUED.get(attr, ())
+        if tags is None or elem.tag in tags:
+            tokens = raw.split()
+            candidates = tokens + [' '.join(tokens)]
+        else:
+            candidates = [raw]
+        if isinstance(value, str):
+            return value in candidates
+        return any(value.search(candidate) for candidate in candidates)
+    
+    def _string(self, elem):
+        """BeautifulSoup's .string: the text of an element with exactly one child node."""
+        nodes = (1 if elem.text else 0) + len(elem) + sum(1 for child in elem if child.tail)
+        if nodes != 1:
+            return None
+        if elem.text:
+            return self._collapse(elem.text, self._preserves_whitespace(elem))
+        child = elem[0]
+        if not isinstance(child.tag, str):  # Comment or processing instruction
+            return child.text
+        return self._string(child)
+    
+    def _preserves_whitespace(self, elem):
+        return (elem.tag in self.PRESERVE_WHITESPACE
+                or next(elem.iterancestors(*self.PRESERVE_WHITESPACE), None) is not None)
+    
+    def _collapse(self, text, preserve):
+        if preserve or text.strip(self.ASCII_SPACES):
+            return text
+        return '\n' if '\n' in text else ' '
+    
+    def _iter_matches(self, names, attr, value, within, string):
+        if isinstance(names, str):
+            names = (names,)
+        if attr:
+            if within is None:
+                candidates = self._attr_xpath(attr, True)(self.root)
+            else:
+                candidates = self._attr_xpath(attr, False)(within)
+            if names:
+                candidates = (elem for elem in candidates if elem.tag in names)
+            candidates = (elem for elem in candidates if self._attr_matches(elem, attr, value))
+        elif within is None:
+            candidates = self.root.iter(*names)
+        else:
+            candidates = within.iterdescendants(*names)
+        if string is not None:
+            candidates = (elem for elem in candidates
+                          if (text := self._string(elem)) is not None and string.search(text))
+        return candidates
+    
+    def _iter_elements(self):
+        return (elem for elem in self.root.iter() if isinstance(elem.tag, str))
+    
+    def _search_first(self, names, attr, value, within, string):
+        return next(self._iter_matches(names, attr, value, within, string), None)
+    
+    def _search_all(self, names, attr, value, within, string):
+        return list(self._iter_matches(names, attr, value, within, string))
+    
+    def _text(self, elem):
+        # BeautifulSoup types each string by the nearest enclosing container
+        # (script, style, ...) and .text keeps only strings of the element's
+        # own type, so <script> text is left out of a div's .text.
+        own = elem.tag if elem.tag in self.STRING_CONTAINERS else None
+        outer = next((a.tag for a in elem.iterancestors(*self.STRING_CONTAINERS)), None)
+        preserve = self._preserves_whitespace(elem)
+        special = self.STRING_CONTAINERS + self.PRESERVE_WHITESPACE
+        if own is None and outer is None and next(elem.iterdescendants(*special), None) is None:
+            return ''.join(self._collapse(text, preserve) for text in elem.itertext())
+        return ''.join(self._strings(elem, outer, own, preserve))
+    
+    def _strings(self, elem, context, wanted, preserve):
+        if elem.tag in self.STRING_CONTAINERS:
+            context = elem.tag
+        inner_preserve = preserve or elem.tag in self.PRESERVE_WHITESPACE
+        if elem.text and isinstance(elem.tag, str) and context == wanted:
+            yield self._collapse(elem.text, inner_preserve)
+        for child in elem:
+            if isinstance(child.tag, str):
+                yield from self._strings(child, context, wanted, inner_preserve)
+            if child.tail and context == wanted:
+                yield self._collapse(child.tail, inner_preserve)
+    
+    def _tag(self, elem):
+        return elem.tag
+    
+    def _attr(self, elem, name):
+        return elem.get(name)
+    
+    def _classes(self, elem):
+        value = elem.get('class')
+        return value.split() if value is not None else None
+
+def difficulty_for_score(score):
+    """
+    Difficulty level for an extractability score.
+    
+    Args:
+        score (float): An extractability score (0-90), or an average of scores
+        
+    Returns:
+        str: "easy", "moderate", "challenging" or "difficult"
+    """
+    if score >= 80:
+        return "easy"
+    elif score >= 60:
+        return "moderate"
+    elif score >= 40:
+        return "challenging"
+    else:
+        return "difficult"
+
+def _lookup_key(names, attr, value, string):
+    """Hashable form of a lookup (a list of tag names becomes a tuple, a single name a 1-tuple)."""
+    if isinstance(names, str):
+        names = (names,)
+    elif names is not None:
+        names = tuple(names)
+    return names, attr, value, string
+
+def make_analyzer(html_content, url=None, backend=DEFAULT_BACKEND):
+    """
+    Create an analyzer for the given backend ("lxml" or "bs4").
+    
+    Falls back to the BeautifulSoup backend if lxml is unavailable or cannot
+    parse the page.
+    
+    Args:
+        html_content (str): The HTML content to analyze
+        url (str, optional): The URL the content was fetched from
+        backend (str, optional): "lxml" or "bs4"
+        
+    Returns:
+        HTMLAnalyzer: The analyzer
+    """
+    if backend == "lxml":
+        try:
+            return LxmlHTMLAnalyzer(html_content, url)
+        except (ValueError, etree.LxmlError if etree is not None else ValueError) as e:
+            logger.debug(f"Using the BeautifulSoup backend for {url}: {e}")
+    elif backend != "bs4":
+        raise ValueError(f"Unknown HTML analyzer backend: {backend}")
+    return HTMLAnalyzer(html_content, url)
+
+def analyze_html_sample(html_content, url=None, backend=DEFAULT_BACKEND):
     """
     Analyze a sample of HTML content.
     
     Args:
         html_content (str): The HTML content to analyze
         url (str, optional): The URL the content was fetched from
+        backend (str, optional): "lxml" or "bs4" (see make_analyzer)
         
     Returns:
         dict: Analysis results
     """
-    analyzer = HTMLAnalyzer(html_content, url)
+    analyzer = make_analyzer(html_content, url, backend)
     analysis = analyzer.analyze()
     recommendations = analyzer.get_extraction_recommendations()
     